@@ -0,0 +1,77 @@
+"""
+Compares per-item and batched throughput of the /predict handler against a
+stubbed sagemaker-runtime client.
+
+    python benchmarks/bench_batch_predict.py --reviews 2000 --call-latency 0.02 --item-latency 0.001
+"""
+import argparse
+import json
+import time
+
+from fakes import FakeAWS, FakeContext, api_event, install_fake_boto3, load_lambda
+
+SAMPLE_REVIEWS = [
+    "This is the best musical instrument I have ever owned. The quality is outstanding and the sound is perfect.",
+    "The guitar arrived with a huge crack in the body. It's unplayable and the support has been useless.",
+    "It's okay for the price, but the tuning pegs feel a little cheap and it doesn't stay in tune very well.",
+    "Wow, just wow! I am blown away by the rich tone of this piano.",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reviews", type=int, default=2000)
+    parser.add_argument("--call-latency", type=float, default=0.02, help="Seconds of fixed overhead per invoke_endpoint call")
+    parser.add_argument("--item-latency", type=float, default=0.001, help="Seconds of model time per review")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    aws = install_fake_boto3(FakeAWS())
+    runtime = aws.clients['sagemaker-runtime']
+    runtime.call_latency = args.call_latency
+    runtime.item_latency = args.item_latency
+    aws.tables['SentimentModelState'].items[('sentiment-model',)] = {
+        'modelId': 'sentiment-model', 'endpointStatus': 'IN_SERVICE', 'endpointName': 'bench-endpoint',
+    }
+
+    module = load_lambda('invoke-sagemaker-endpoint.py', env={
+        'DYNAMODB_TABLE_NAME': 'SentimentModelState',
+        'MODEL_ID': 'sentiment-model',
+        'ENDPOINT_BATCH_SIZE': args.batch_size,
+        'BATCH_MAX_WORKERS': args.workers,
+        'MAX_BATCH_ITEMS': max(args.reviews, 1000),
+    })
+    context = FakeContext()
+    reviews = [f"{SAMPLE_REVIEWS[i % len(SAMPLE_REVIEWS)]} #{i}" for i in range(args.reviews)]
+
+    # --- 1. One request per review ---
+    aws.counter.reset()
+    start = time.perf_counter()
+    per_item = []
+    for review in reviews:
+        response = module.lambda_handler(api_event({'text': review}), context)
+        per_item.append(json.loads(response['body'])[0])
+    per_item_seconds = time.perf_counter() - start
+    per_item_calls = aws.counter.summary().get('sagemaker-runtime.InvokeEndpoint', 0)
+
+    # --- 2. One batched request ---
+    # Empty the prediction cache so the batched run has to reach the endpoint too
+    module.prediction_cache.entries.clear()
+    aws.counter.reset()
+    start = time.perf_counter()
+    response = module.lambda_handler(api_event({'texts': reviews}), context)
+    batched_seconds = time.perf_counter() - start
+    batched = json.loads(response['body'])['results']
+    batched_calls = aws.counter.summary().get('sagemaker-runtime.InvokeEndpoint', 0)
+
+    assert [r['prediction'] for r in batched] == per_item, "Batched results differ from per-item results"
+
+    print(f"{'mode':<10}{'reviews':>10}{'seconds':>10}{'reviews/s':>12}{'endpoint calls':>16}")
+    print(f"{'per-item':<10}{args.reviews:>10}{per_item_seconds:>10.2f}{args.reviews / per_item_seconds:>12.1f}{per_item_calls:>16}")
+    print(f"{'batched':<10}{args.reviews:>10}{batched_seconds:>10.2f}{args.reviews / batched_seconds:>12.1f}{batched_calls:>16}")
+    print(f"Speedup: {per_item_seconds / batched_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
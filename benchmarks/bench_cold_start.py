@@ -0,0 +1,158 @@
+"""
+Cold-start cost of every Lambda handler: module import time and the first invocation.
+
+Each scenario runs in a fresh interpreter, so nothing is cached from a previous import. The
+child process imports the handler (and the shared modules it uses), then makes one
+representative first call. It reports the time of each step and the boto3 clients and
+resources built in it, and whether `requests` was imported.
+
+boto3 is the fake from fakes.py, so its own import time is not included, and building a client
+or resource costs a fixed --client-ms / --resource-ms. The defaults are rough figures for boto3
+in a small Lambda; set them to what your own init durations show.
+
+    python bench_cold_start.py --runs 5
+    python bench_cold_start.py --client-ms 80 --resource-ms 120 --output cold-start.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from fakes import FakeAWS, FakeContext, FakeTextbelt, install_fake_boto3, load_lambda, start_textbelt_server
+
+MODEL_ID = 'sentiment-model'
+ENDPOINT_NAME = 'sentiment-model-endpoint-1'
+SCHEDULE_NAME = f'shutdown-schedule-{ENDPOINT_NAME}'
+STOPPED = {'modelId': MODEL_ID, 'endpointStatus': 'STOPPED'}
+# The shutdown is a few minutes away, so a status poll has to look it up and extend it
+IN_SERVICE = {'modelId': MODEL_ID, 'endpointStatus': 'IN_SERVICE', 'endpointName': ENDPOINT_NAME,
+              'scheduleName': SCHEDULE_NAME}
+
+# name: (handler file, state item, first event)
+SCENARIOS = {
+    'status (stopped)': ('is-model-service-running.py', STOPPED, {'queryStringParameters': None}),
+    'status (running)': ('is-model-service-running.py', IN_SERVICE, {'queryStringParameters': None}),
+    'start': ('start-model-service.py', STOPPED, {'body': json.dumps({'name': 'Ann', 'phone': '5550000001'})}),
+    'predict (running)': ('invoke-sagemaker-endpoint.py', IN_SERVICE, {'body': json.dumps({'text': 'Great strings'})}),
+    'predict (stopped)': ('invoke-sagemaker-endpoint.py', STOPPED, {'body': json.dumps({'text': 'Great strings'})}),
+    'result': ('get-prediction-result.py', dict(STOPPED, endpointStatus='CREATING'), None),
+    'in-service': ('notification-and-shutdown-scheduler.py', dict(STOPPED, endpointStatus='CREATING'),
+                   {'resources': [f'arn:aws:sagemaker:us-east-1:123456789012:endpoint/{ENDPOINT_NAME}']}),
+    'extend-timer': ('extend-shutdown-timer.py', IN_SERVICE,
+                     {'schedule_name': SCHEDULE_NAME, 'model_id': MODEL_ID,
+                      'endpoint_arn': f'arn:aws:sagemaker:us-east-1:123456789012:endpoint/{ENDPOINT_NAME}'}),
+    'shutdown': ('shutdown-endpoint.py', IN_SERVICE, {'endpoint_name': ENDPOINT_NAME, 'model_id': MODEL_ID}),
+    'prewarm': ('prewarm-endpoint.py', STOPPED, {}),
+}
+
+
+def run_scenario(name, client_ms, resource_ms, workdir):
+    """Runs in the child process. Returns the timings of one cold start."""
+    file_name, state, event = SCENARIOS[name]
+    aws = install_fake_boto3(FakeAWS(client_latency=client_ms / 1000, resource_latency=resource_ms / 1000))
+    aws.tables['SentimentModelState'].items[(MODEL_ID,)] = dict(state)
+    if state.get('scheduleName'):
+        shutdown_at = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(time.time() + 5 * 60))
+        aws.clients['scheduler'].schedules[SCHEDULE_NAME] = {'Name': SCHEDULE_NAME, 'ScheduleExpression': f'at({shutdown_at})'}
+    aws.clients['sagemaker'].endpoints[ENDPOINT_NAME] = {'EndpointName': ENDPOINT_NAME, 'EndpointStatus': 'InService'}
+    server = start_textbelt_server(FakeTextbelt(latency=0.0, flaky=0.0))
+    env = {
+        'DYNAMODB_TABLE_NAME': 'SentimentModelState',
+        'MODEL_ID': MODEL_ID,
+        'SAGEMAKER_MODEL_NAME': 'sentiment-model-v1',
+        'INSTANCE_TYPE': 'ml.m5.large',
+        'TIMER_LAMBDA_ARN': 'extend-shutdown-timer',
+        'SHUTDOWN_LAMBDA_ARN': 'shutdown-endpoint',
+        'SCHEDULER_ROLE_ARN': 'arn:aws:iam::123456789012:role/scheduler',
+        'APP_URL': 'https://example.com',
+        'TEXTBELT_API_KEY': 'bench',
+        'TEXTBELT_URL': f'http://127.0.0.1:{server.server_address[1]}/text',
+        'PREDICTION_QUEUE_SQLITE_PATH': os.path.join(workdir, 'queue.db'),
+    }
+    modules_before = set(sys.modules)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        module = load_lambda(file_name, env)
+        import_ms = (time.perf_counter() - started) * 1000
+        constructed_at_import = len(aws.constructed)
+        requests_at_import = 'requests' in sys.modules
+
+        # Untimed setup that needs the handler's own modules
+        if name == 'result':
+            event = {'pathParameters': {'id': module.prediction_queue.enqueue(['Great strings'], False, queue_key=MODEL_ID)}}
+        if name in ('in-service', 'start'):
+            sys.modules['model_state'].add_subscriber(aws.tables['SentimentModelState'], MODEL_ID, 'Bob', '5550000002')
+
+        started = time.perf_counter()
+        response = module.lambda_handler(event, FakeContext())
+        first_call_ms = (time.perf_counter() - started) * 1000
+    server.shutdown()
+
+    return {
+        'importMs': round(import_ms, 1),
+        'firstCallMs': round(first_call_ms, 1),
+        'totalMs': round(import_ms + first_call_ms, 1),
+        'modulesImported': len(set(sys.modules) - modules_before),
+        'constructedAtImport': aws.constructed[:constructed_at_import],
+        'constructedOnFirstCall': aws.constructed[constructed_at_import:],
+        'requestsAtImport': requests_at_import,
+        'statusCode': response.get('statusCode') if isinstance(response, dict) else None,
+    }
+
+
+def measure(name, runs, client_ms, resource_ms):
+    """Median timings of `runs` cold starts, each in a new interpreter."""
+    results = []
+    for _ in range(runs):
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', name,
+             '--client-ms', str(client_ms), '--resource-ms', str(resource_ms)],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        if child.returncode:
+            raise RuntimeError(f"Scenario '{name}' failed:\n{child.stderr}")
+        results.append(json.loads(child.stdout.strip().splitlines()[-1]))
+    summary = dict(results[-1])
+    for key in ('importMs', 'firstCallMs', 'totalMs'):
+        summary[key] = round(statistics.median(r[key] for r in results), 1)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5, help="cold starts per scenario; the median is reported")
+    parser.add_argument("--client-ms", type=float, default=50, help="cost of building one boto3 client")
+    parser.add_argument("--resource-ms", type=float, default=80, help="cost of building one boto3 resource")
+    parser.add_argument("--scenario", action='append', choices=sorted(SCENARIOS), help="limit to these scenarios")
+    parser.add_argument("--output", type=str, default=None, help="write the results as JSON")
+    parser.add_argument("--child", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        with tempfile.TemporaryDirectory() as workdir:
+            print(json.dumps(run_scenario(args.child, args.client_ms, args.resource_ms, workdir)))
+        return
+
+    print(f"Median of {args.runs} cold starts; a boto3 client costs {args.client_ms:g} ms, a resource {args.resource_ms:g} ms")
+    print(f"{'scenario':<20}{'import ms':>10}{'1st call ms':>12}{'total ms':>10}{'modules':>9}"
+          f"{'built at import':>16}{'built on call':>14}{'requests':>10}")
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        r = results[name] = measure(name, args.runs, args.client_ms, args.resource_ms)
+        print(f"{name:<20}{r['importMs']:>10.1f}{r['firstCallMs']:>12.1f}{r['totalMs']:>10.1f}{r['modulesImported']:>9}"
+              f"{len(r['constructedAtImport']):>16}{len(r['constructedOnFirstCall']):>14}"
+              f"{'import' if r['requestsAtImport'] else '-':>10}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""
+End-to-end run of the whole serverless flow against the fakes, for tracking hot-path regressions.
+
+Every Lambda is imported with its own copy of the shared modules, like separate execution
+environments, and driven through one endpoint lifecycle with mixed concurrent traffic:
+
+    idle          status polls while the model is STOPPED
+    start-burst   /start requests from many users, mixed with status polls and predictions
+    creating      predictions while the endpoint is CREATING, which are queued
+    in-service    the EventBridge InService event: schedule, SMS and queue drain
+    results       polling /result for every queued job
+    storm         single and batch predictions with status polls; keep-alives reach extend-shutdown-timer
+    shutdown      the shutdown schedule fires
+    stopped       status polls and predictions after the shutdown
+    prewarm       one run of the pre-warm schedule
+
+Between phases, the cached state snapshots are dropped, as if the minutes between them had passed.
+It reports latency and AWS calls per request for every handler, and checks the state machine:
+one endpoint created and deleted, STOPPED -> CREATING -> IN_SERVICE -> STOPPED, one SMS per
+subscriber, every queued job scored and every request answered with the expected status.
+
+--output writes the numbers as JSON. --baseline compares against such a file and exits non-zero
+when a handler makes more AWS calls per request, or its p95 latency grows beyond
+--latency-tolerance.
+
+    python bench_end_to_end.py --output e2e.json
+    python bench_end_to_end.py --baseline e2e.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from fakes import FakeAWS, FakeContext, FakeTextbelt, install_fake_boto3, load_lambda, start_textbelt_server
+
+MODEL_ID = 'sentiment-model'
+SHARED_MODULES = ('model_registry', 'model_state', 'start_strategies', 'prediction_cache', 'prediction_queue',
+                  'idle_policy', 'instrumentation', 'aws_clients')
+HANDLERS = {
+    'status': 'is-model-service-running.py',
+    'start': 'start-model-service.py',
+    'predict': 'invoke-sagemaker-endpoint.py',
+    'result': 'get-prediction-result.py',
+    'in-service': 'notification-and-shutdown-scheduler.py',
+    'extend-timer': 'extend-shutdown-timer.py',
+    'shutdown': 'shutdown-endpoint.py',
+    'prewarm': 'prewarm-endpoint.py',
+}
+WORDS = ["great", "sound", "guitar", "broken", "string", "love", "cheap", "tone", "piano", "perfect",
+         "terrible", "tuning", "quality", "returned", "amazing", "noise"]
+
+
+class Harness:
+    """Loads every handler and records the latency and AWS calls of each invocation, per handler."""
+
+    def __init__(self, latency, workdir):
+        self.aws = install_fake_boto3(FakeAWS(latency=latency))
+        self.table = self.aws.tables['SentimentModelState']
+        self.textbelt = FakeTextbelt(latency=0.01, flaky=0.0)
+        self.server = start_textbelt_server(self.textbelt)
+        env = {
+            'DYNAMODB_TABLE_NAME': 'SentimentModelState',
+            'MODEL_ID': MODEL_ID,
+            'SAGEMAKER_MODEL_NAME': 'sentiment-model-v1',
+            'INSTANCE_TYPE': 'ml.m5.large',
+            'TIMER_LAMBDA_ARN': 'extend-shutdown-timer',
+            'SHUTDOWN_LAMBDA_ARN': 'shutdown-endpoint',
+            'SCHEDULER_ROLE_ARN': 'arn:aws:iam::123456789012:role/scheduler',
+            'APP_URL': 'https://example.com',
+            'TEXTBELT_API_KEY': 'bench',
+            'TEXTBELT_URL': f'http://127.0.0.1:{self.server.server_address[1]}/text',
+            'PREDICTION_QUEUE_SQLITE_PATH': os.path.join(workdir, 'queue.db'),
+        }
+
+        self.current = threading.local()
+        self.latencies = defaultdict(list)
+        self.calls = defaultdict(Counter)
+        record = self.aws.counter.record
+
+        def attributed_record(service, operation):
+            record(service, operation)
+            self.calls[getattr(self.current, 'handler', None) or 'unattributed'][f'{service}.{operation}'] += 1
+        self.aws.counter.record = attributed_record
+
+        self.modules, self.model_states = {}, []
+        for name, file_name in HANDLERS.items():
+            # Each Lambda gets its own module-level caches, as in its own execution environment
+            for shared in SHARED_MODULES:
+                sys.modules.pop(shared, None)
+            module = load_lambda(file_name, env)
+            self.modules[name] = module
+            if 'model_state' in sys.modules:
+                self.model_states.append(sys.modules['model_state'])
+            for value in list(vars(module).values()):
+                if isinstance(value, ThreadPoolExecutor):
+                    self._propagate_handler(value)
+        self.delivered_invocations = 0
+
+    def _propagate_handler(self, executor):
+        """AWS calls made on a handler's worker threads still count towards that handler."""
+        submit = executor.submit
+
+        def attributed_submit(fn, *args, **kwargs):
+            handler = getattr(self.current, 'handler', None)
+
+            def run(*a, **k):
+                self.current.handler = handler
+                try:
+                    return fn(*a, **k)
+                finally:
+                    self.current.handler = None
+            return submit(run, *args, **kwargs)
+        executor.submit = attributed_submit
+
+    def call(self, name, event):
+        self.current.handler = name
+        started = time.perf_counter()
+        try:
+            return self.modules[name].lambda_handler(event, FakeContext())
+        finally:
+            self.latencies[name].append(time.perf_counter() - started)
+            self.current.handler = None
+
+    def advance(self):
+        """Drops every cached state snapshot, as if minutes had passed since the last phase."""
+        for model_state in self.model_states:
+            model_state.invalidate_model_state()
+
+    def deliver_invocations(self):
+        """Runs the asynchronous Lambda invocations (keep-alives) made since the last delivery."""
+        invocations = self.aws.clients['lambda'].invocations
+        pending, self.delivered_invocations = invocations[self.delivered_invocations:], len(invocations)
+        for function_name, payload in pending:
+            assert function_name == 'extend-shutdown-timer', f"Unexpected invocation of {function_name}"
+            self.call('extend-timer', json.loads(payload))
+        return len(pending)
+
+    def status(self):
+        return self.table.get_item(Key={'modelId': MODEL_ID}).get('Item', {}).get('endpointStatus', 'STOPPED')
+
+
+def status_event():
+    return {'queryStringParameters': None}
+
+
+def predict_event(text=None, texts=None):
+    return {'body': json.dumps({'texts': texts} if texts is not None else {'text': text})}
+
+
+def run_concurrently(harness, requests, threads):
+    """Runs (handler, event) pairs on a thread pool. Returns the responses in order."""
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(lambda request: harness.call(*request), requests))
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    reviews = [' '.join(rng.choices(WORDS, k=rng.randint(5, 40))) for _ in range(args.distinct_reviews)]
+    checks = []
+
+    def check(name, condition, detail=''):
+        checks.append((name, bool(condition), detail))
+
+    with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(io.StringIO()):
+        harness = Harness(args.latency, workdir)
+        sagemaker = harness.aws.clients['sagemaker']
+        scheduler = harness.aws.clients['scheduler']
+        statuses = [harness.status()]
+
+        # --- idle ---
+        responses = run_concurrently(harness, [('status', status_event())] * args.polls, args.threads)
+        check('idle: status polls report not running',
+              all(json.loads(r['body']) == {'is_running': False} for r in responses))
+
+        # --- start-burst ---
+        phones = [f'555{(i - 1 if i % 10 == 9 else i):07d}' for i in range(args.starts)]
+        requests = [('start', {'body': json.dumps({'name': f'user{i}', 'phone': phone})}) for i, phone in enumerate(phones)]
+        requests += [('status', status_event())] * (args.starts // 2)
+        requests += [('predict', predict_event(rng.choice(reviews))) for _ in range(args.starts // 2)]
+        rng.shuffle(requests)
+        responses = run_concurrently(harness, requests, args.threads)
+        starts = [r for (name, _), r in zip(requests, responses) if name == 'start']
+        check('start-burst: every /start answered 200', all(r['statusCode'] == 200 for r in starts))
+        check('start-burst: exactly one endpoint created', len(sagemaker.endpoints) == 1, f"{len(sagemaker.endpoints)} endpoints")
+        check('start-burst: predictions answered 202 or 404',
+              all(r['statusCode'] in (202, 404) for (name, _), r in zip(requests, responses) if name == 'predict'))
+        statuses.append(harness.status())
+        harness.advance()
+
+        # --- creating ---
+        requests = [('predict', predict_event(rng.choice(reviews))) for _ in range(args.queued)]
+        requests += [('predict', predict_event(texts=rng.sample(reviews, 4))) for _ in range(args.queued // 4)]
+        responses = run_concurrently(harness, requests, args.threads)
+        check('creating: predictions are queued (202)', all(r['statusCode'] == 202 for r in responses))
+        job_ids = [json.loads(r['body'])['jobId'] for r in responses if r['statusCode'] == 202]
+
+        # --- in-service ---
+        endpoint_name = next(iter(sagemaker.endpoints))
+        tags = {tag['Key']: tag['Value'] for tag in sagemaker.endpoints[endpoint_name]['Tags']}
+        harness.call('in-service', {
+            'resources': [f'arn:aws:sagemaker:us-east-1:123456789012:endpoint/{endpoint_name}'],
+            'detail': {'EndpointStatus': 'IN_SERVICE', 'Tags': tags},
+        })
+        statuses.append(harness.status())
+        check('in-service: shutdown scheduled', len(scheduler.schedules) == 1)
+        check('in-service: one SMS per subscriber',
+              sorted(harness.textbelt.delivered) == sorted(set(phones)) and set(harness.textbelt.delivered.values()) == {1},
+              f"{len(harness.textbelt.delivered)} of {len(set(phones))} phones")
+        harness.advance()
+
+        # --- results ---
+        responses = run_concurrently(harness, [('result', {'pathParameters': {'id': job_id}}) for job_id in job_ids], args.threads)
+        check('results: every queued job is DONE',
+              all(r['statusCode'] == 200 and json.loads(r['body'])['status'] == 'DONE' for r in responses))
+
+        # --- storm ---
+        requests = []
+        for _ in range(args.predictions):
+            kind = rng.random()
+            if kind < 0.1:
+                requests.append(('status', status_event()))
+            elif kind < 0.3:
+                requests.append(('predict', predict_event(texts=rng.sample(reviews, args.batch_size))))
+            else:
+                requests.append(('predict', predict_event(rng.choice(reviews))))
+        responses = run_concurrently(harness, requests, args.threads)
+        check('storm: every request answered 200', all(r['statusCode'] == 200 for r in responses),
+              str(Counter(r['statusCode'] for r in responses)))
+        check('storm: keep-alive reached the extend-timer helper', harness.deliver_invocations() >= 1)
+        check('storm: schedule still present', len(scheduler.schedules) == 1)
+
+        # --- shutdown ---
+        schedule = next(iter(scheduler.schedules.values()))
+        scheduler.schedules.clear()  # ActionAfterCompletion=DELETE
+        harness.call('shutdown', json.loads(schedule['Target']['Input']))
+        statuses.append(harness.status())
+        check('shutdown: endpoint deleted', not sagemaker.endpoints)
+        harness.advance()
+
+        # --- stopped ---
+        requests = [('status', status_event())] * 10 + [('predict', predict_event(f'never seen before {i}')) for i in range(10)]
+        responses = run_concurrently(harness, requests, args.threads)
+        check('stopped: status not running, predictions 404',
+              all(r['statusCode'] == (200 if name == 'status' else 404) for (name, _), r in zip(requests, responses)))
+
+        # --- prewarm ---
+        harness.call('prewarm', {})
+        check('prewarm: one week of history does not start the endpoint', not sagemaker.endpoints)
+
+        counts = harness.aws.counter.summary()
+        check('lifecycle: STOPPED -> CREATING -> IN_SERVICE -> STOPPED',
+              statuses == ['STOPPED', 'CREATING', 'IN_SERVICE', 'STOPPED'], ' -> '.join(statuses))
+        check('lifecycle: one CreateEndpoint and one DeleteEndpoint',
+              counts.get('sagemaker.CreateEndpoint') == 1 and counts.get('sagemaker.DeleteEndpoint') == 1)
+        harness.server.shutdown()
+
+    handlers = {}
+    for name in HANDLERS:
+        latencies = sorted(harness.latencies[name])
+        if not latencies:
+            continue
+        calls = harness.calls[name]
+        handlers[name] = {
+            'requests': len(latencies),
+            'p50_ms': round(latencies[len(latencies) // 2] * 1000, 2),
+            'p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+            'max_ms': round(latencies[-1] * 1000, 2),
+            'aws_calls_per_request': round(sum(calls.values()) / len(latencies), 3),
+            'aws_calls': dict(calls),
+        }
+    return {'handlers': handlers, 'checks': [{'name': n, 'passed': p, 'detail': d} for n, p, d in checks]}
+
+
+def compare(result, baseline, latency_tolerance):
+    """Returns the regressions of result against baseline."""
+    regressions = []
+    for name, current in result['handlers'].items():
+        previous = baseline['handlers'].get(name)
+        if not previous:
+            continue
+        if current['aws_calls_per_request'] > previous['aws_calls_per_request'] * 1.1 + 0.05:
+            regressions.append(f"{name}: {previous['aws_calls_per_request']} -> {current['aws_calls_per_request']} AWS calls per request")
+        if current['p95_ms'] > previous['p95_ms'] * (1 + latency_tolerance) + 1:
+            regressions.append(f"{name}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--starts", type=int, default=200, help="/start requests in the burst")
+    parser.add_argument("--polls", type=int, default=200, help="status polls while idle")
+    parser.add_argument("--queued", type=int, default=100, help="predictions while the endpoint is starting")
+    parser.add_argument("--predictions", type=int, default=2000, help="requests in the prediction storm")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--distinct-reviews", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.002, help="fake AWS round trip in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=None, help="write the results to this JSON file")
+    parser.add_argument("--baseline", type=str, default=None, help="compare against a previous --output file")
+    parser.add_argument("--latency-tolerance", type=float, default=0.5, help="allowed p95 growth, 0.5 = +50%%")
+    args = parser.parse_args()
+
+    result = run(args)
+    print(f"{'handler':<14}{'requests':>9}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'AWS calls/req':>15}  top calls")
+    for name, h in result['handlers'].items():
+        top = ', '.join(f"{op} {n / h['requests']:.2f}" for op, n in Counter(h['aws_calls']).most_common(3))
+        print(f"{name:<14}{h['requests']:>9}{h['p50_ms']:>9.1f}{h['p95_ms']:>9.1f}{h['max_ms']:>9.1f}"
+              f"{h['aws_calls_per_request']:>15.2f}  {top}")
+    print()
+    for check in result['checks']:
+        detail = f" ({check['detail']})" if check['detail'] and not check['passed'] else ''
+        print(f"{'PASS' if check['passed'] else 'FAIL'}  {check['name']}{detail}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    failed = not all(check['passed'] for check in result['checks'])
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.latency_tolerance)
+        print()
+        print('\n'.join(f"REGRESSION  {r}" for r in regressions) or "No regressions against the baseline.")
+        failed = failed or bool(regressions)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
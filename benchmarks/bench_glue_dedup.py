@@ -0,0 +1,88 @@
+"""
+Local PySpark harness (no Glue) for deduplicate_reviews() in glue-etl/sentiment_transforms.py.
+
+Generates synthetic reviews where a known share are exact copies (with case, punctuation and
+whitespace changes) or near copies (a few words replaced) of another review, runs the dedup
+stage at several row counts and reports runtime, rows per second and how many rows were removed.
+Every original and its copies form a cluster, so the result is right when exactly one review per
+cluster survives: "missed" counts clusters with extra survivors, "lost" clusters with none.
+
+    pip install pyspark
+    python benchmarks/bench_glue_dedup.py --rows 25000 50000 100000 200000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+from pyspark.sql import SparkSession
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'glue-etl'))
+from sentiment_transforms import deduplicate_reviews
+
+WORDS = ["great", "sound", "guitar", "broken", "string", "love", "cheap", "tone", "piano", "perfect",
+         "terrible", "tuning", "quality", "returned", "amazing", "noise", "case", "strap", "pedal", "drum",
+         "bought", "gift", "son", "daughter", "beginner", "worth", "price", "shipping", "arrived", "sturdy"]
+
+
+def synthetic_reviews(rows, exact_share, near_share, seed=0):
+    """Returns [(id, text, cluster)], where cluster is the id of the original a review was copied from."""
+    rng = random.Random(seed)
+    reviews, originals = [], []
+    for i in range(rows):
+        roll = rng.random()
+        if originals and roll < exact_share:
+            cluster, text = rng.choice(originals)
+            text = rng.choice([text.upper(), text + "!!", "  " + text.replace(" ", "  "), text])
+            reviews.append((i, text, cluster))
+        elif originals and roll < exact_share + near_share:
+            cluster, text = rng.choice(originals)
+            words = text.split()
+            for _ in range(max(1, len(words) // 30)):
+                words[rng.randrange(len(words))] = rng.choice(WORDS)
+            reviews.append((i, ' '.join(words), cluster))
+        else:
+            # Long enough random reviews that two unrelated ones share almost no 3-grams
+            text = ' '.join(rng.choices(WORDS, k=rng.randint(40, 120))) + f" order {i}"
+            originals.append((i, text))
+            reviews.append((i, text, i))
+    return reviews
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[25000, 50000, 100000, 200000])
+    parser.add_argument("--exact-share", type=float, default=0.1)
+    parser.add_argument("--near-share", type=float, default=0.1)
+    parser.add_argument("--partitions", type=int, default=8)
+    args = parser.parse_args()
+
+    spark = (SparkSession.builder.master("local[*]").appName("dedup-benchmark")
+             .config("spark.sql.shuffle.partitions", args.partitions).getOrCreate())
+    spark.sparkContext.setLogLevel("ERROR")
+
+    print(f"{'rows':>9}{'seconds':>9}{'rows/s':>10}{'exact rm':>10}{'near rm':>9}{'clusters':>10}{'missed':>8}{'lost':>6}")
+    for rows in args.rows:
+        reviews = synthetic_reviews(rows, args.exact_share, args.near_share)
+        df = spark.createDataFrame(reviews, ["id", "text", "cluster"]).repartition(args.partitions).cache()
+        df.count()
+
+        start = time.perf_counter()
+        result, stats = deduplicate_reviews(df)
+        survivors = Counter(row["cluster"] for row in result.select("cluster").collect())
+        elapsed = time.perf_counter() - start
+
+        clusters = {cluster for _, _, cluster in reviews}
+        missed = sum(1 for cluster in clusters if survivors[cluster] > 1)
+        lost = sum(1 for cluster in clusters if survivors[cluster] == 0)
+        print(f"{rows:>9}{elapsed:>9.1f}{rows / elapsed:>10.0f}{stats['exact_duplicates']:>10}"
+              f"{stats['near_duplicates']:>9}{len(clusters):>10}{missed:>8}{lost:>6}")
+        df.unpersist()
+
+    spark.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Local PySpark harness (no Glue) for the null-column scan in glue-etl/sentiment-data-cleaner.py.
+
+Generates synthetic nested review JSON, then runs the original per-column
+distinct().collect() scan and the single-pass find_null_columns() from
+glue-etl/sentiment_transforms.py, checks they agree and reports timings.
+
+    pip install pyspark
+    python benchmarks/bench_glue_null_scan.py --rows 200000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from pyspark.sql import SparkSession
+from pyspark.sql.types import StructType, ArrayType, NullType, StringType, IntegerType, LongType, DoubleType
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'glue-etl'))
+from sentiment_transforms import find_null_columns
+
+
+def original_find_null_fields(schema, path, output, nullStringSet, nullIntegerSet, df):
+    """The original _find_null_fields, ported from Glue types to PySpark types for comparison."""
+    if isinstance(schema, StructType):
+        for field in schema:
+            new_path = path + "." if path != "" else path
+            output = original_find_null_fields(field.dataType, new_path + field.name, output, nullStringSet, nullIntegerSet, df)
+    elif isinstance(schema, ArrayType):
+        if isinstance(schema.elementType, StructType):
+            output = original_find_null_fields(schema.elementType, path, output, nullStringSet, nullIntegerSet, df)
+    elif isinstance(schema, NullType):
+        output.append(path)
+    else:
+        distinct_set = set()
+        for i in df.select(path).distinct().collect():
+            distinct_ = i[path.split('.')[-1]]
+            if isinstance(distinct_, list):
+                distinct_set |= set([item.strip() if isinstance(item, str) else item for item in distinct_])
+            elif isinstance(distinct_, str):
+                distinct_set.add(distinct_.strip())
+            else:
+                distinct_set.add(distinct_)
+        if isinstance(schema, StringType):
+            if distinct_set.issubset(nullStringSet):
+                output.append(path)
+        elif isinstance(schema, (IntegerType, LongType, DoubleType)):
+            if distinct_set.issubset(nullIntegerSet):
+                output.append(path)
+    return output
+
+
+def write_synthetic_reviews(path, rows, seed=0):
+    """Nested review JSON resembling the raw dump, with a few columns that are always null or blank."""
+    rng = random.Random(seed)
+    words = ["great", "sound", "guitar", "broken", "string", "love", "cheap", "tone", "piano", "perfect"]
+    with open(path, 'w') as f:
+        for i in range(rows):
+            record = {
+                'rating': rng.randint(1, 5),
+                'title': ' '.join(rng.choices(words, k=3)),
+                'text': ' '.join(rng.choices(words, k=rng.randint(5, 40))),
+                'helpful_vote': rng.randint(0, 50),
+                'verified_purchase': rng.random() < 0.8,
+                'unused_note': '   ',                 # blank only
+                'always_null': None,                  # null only
+                'legacy_score': 0,                    # numeric "null" marker only
+                'details': {'asin': f"B{i:09d}", 'store': None, 'color': rng.choice(['red', 'blue', ''])},
+                'images': [{'url': f"https://example.com/{i}.jpg", 'caption': ''} for _ in range(rng.randint(0, 2))],
+            }
+            f.write(json.dumps(record) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--partitions", type=int, default=8)
+    args = parser.parse_args()
+
+    spark = (SparkSession.builder.master("local[*]").appName("null-scan-benchmark")
+             .config("spark.sql.shuffle.partitions", args.partitions).getOrCreate())
+    spark.sparkContext.setLogLevel("ERROR")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        data_path = os.path.join(workdir, 'reviews.json')
+        write_synthetic_reviews(data_path, args.rows)
+        df = spark.read.json(data_path).repartition(args.partitions).cache()
+        df.count()
+
+        # The job itself passes empty sets; the second case exercises blank-string and zero markers
+        cases = {
+            'job defaults ({}, {})': ({}, {}),
+            'blank/zero markers': ({'', None}, {0, None}),
+        }
+        print(f"{args.rows} rows, {len(df.columns)} top-level columns")
+        print(f"{'case':<24}{'original s':>12}{'single-pass s':>15}{'speedup':>9}  null columns")
+        for name, (null_strings, null_numbers) in cases.items():
+            start = time.perf_counter()
+            expected = original_find_null_fields(df.schema, "", [], null_strings, null_numbers, df)
+            original_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            actual = find_null_columns(df, null_strings, null_numbers)
+            new_seconds = time.perf_counter() - start
+
+            assert sorted(actual) == sorted(expected), f"{name}: expected {sorted(expected)}, got {sorted(actual)}"
+            print(f"{name:<24}{original_seconds:>12.2f}{new_seconds:>15.2f}{original_seconds / new_seconds:>8.1f}x  {sorted(actual)}")
+
+    spark.stop()
+
+
+if __name__ == "__main__":
+    main()
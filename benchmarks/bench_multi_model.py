@@ -0,0 +1,144 @@
+"""
+Routing by model key, and per-model residency on a multi-model endpoint.
+
+First checks the routing: /start for two category models on the multi-model endpoint brings up
+one shared endpoint, while a model with its own SageMaker model gets a second one; an A/B key
+splits reviews between its variants by weight, and a batch sent to it review by review.
+
+Then sends --requests single-review /predict calls, spread over --models category models with
+Zipf-distributed popularity, to the multi-model endpoint. The fake endpoint keeps
+--resident models loaded and charges --load-latency to load any other. For each residency size
+it reports p50/p95 latency, the endpoint's real loads and evictions, and the estimate from the
+Lambda's residency mirror (model_registry.ModelResidency).
+
+    python bench_multi_model.py --requests 2000 --models 8 --resident 2 4 8
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import sys
+import time
+from collections import Counter
+
+from fakes import FakeAWS, FakeContext, install_fake_boto3, load_lambda
+
+SHARED_MODULES = ('model_registry', 'model_state', 'start_strategies', 'prediction_cache', 'prediction_queue', 'idle_policy',
+                  'instrumentation', 'aws_clients')
+
+
+def registry(models):
+    config = {f'category-{i}': {'multiModel': True} for i in range(models)}
+    config['category-0-v2'] = {'multiModel': True}
+    config['category-0-ab'] = {'variants': {'category-0': 90, 'category-0-v2': 10}}
+    config['guitars'] = {'sagemakerModelName': 'sentiment-guitars-v1'}
+    return json.dumps(config)
+
+
+def load(file_name, models, resident):
+    for name in SHARED_MODULES:
+        sys.modules.pop(name, None)
+    return load_lambda(file_name, {
+        'DYNAMODB_TABLE_NAME': 'SentimentModelState',
+        'MODEL_ID': 'sentiment-model',
+        'SAGEMAKER_MODEL_NAME': 'sentiment-model-v1',
+        'MODEL_REGISTRY': registry(models),
+        'DEFAULT_MODEL_KEY': 'category-0',
+        'MULTI_MODEL_SAGEMAKER_MODEL_NAME': 'sentiment-multi-model',
+        'MULTI_MODEL_RESIDENT_MODELS': resident,
+        'INSTANCE_TYPE': 'ml.m5.large',
+        'PREDICTION_CACHE_SIZE': 0,
+        'STATE_CACHE_TTL_SECONDS': 60,
+    })
+
+
+def check_routing(models):
+    aws = install_fake_boto3(FakeAWS())
+    start = load('start-model-service.py', models, 4)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i, model in enumerate(['category-1', 'category-2', 'guitars', 'category-0-ab']):
+            body = json.dumps({'name': f'user{i}', 'phone': f'555000{i}', 'model': model})
+            assert start.lambda_handler({'body': body}, FakeContext())['statusCode'] == 200
+        unknown = start.lambda_handler({'body': json.dumps({'name': 'x', 'phone': '1', 'model': 'nope'})}, FakeContext())
+    assert unknown['statusCode'] == 404
+
+    endpoints = aws.clients['sagemaker'].endpoints
+    tags = sorted(endpoint['Tags'][0]['Value'] for endpoint in endpoints.values())
+    assert tags == ['guitars', 'multi-model-endpoint'], f"Unexpected endpoints: {tags}"
+
+    registry_module = sys.modules['model_registry']
+    split = Counter(registry_module.resolve_model('category-0-ab', f"review {i}")['modelKey'] for i in range(10000))
+
+    # A batch for the A/B key reaches both variants, each review the one it is routed to alone
+    endpoint_name = next(name for name, endpoint in endpoints.items() if endpoint['Tags'][0]['Value'] == 'multi-model-endpoint')
+    aws.tables['SentimentModelState'].update_item(
+        Key={'modelId': 'multi-model-endpoint'}, UpdateExpression="SET endpointStatus = :s, endpointName = :n",
+        ExpressionAttributeValues={':s': 'IN_SERVICE', ':n': endpoint_name},
+    )
+    predict = load('invoke-sagemaker-endpoint.py', models, 4)
+    texts = [f"review {i}" for i in range(200)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = predict.lambda_handler({'body': json.dumps({'texts': texts, 'model': 'category-0-ab'})}, FakeContext())
+    assert response['statusCode'] == 200, response
+    loaded = {model for model, kind in aws.clients['sagemaker-runtime'].model_events if kind == 'load'}
+    assert loaded == {'category-0.tar.gz', 'category-0-v2.tar.gz'}, f"Batch reached {sorted(loaded)}"
+
+    print(f"Routing: 4 /start calls over 3 keys -> {len(endpoints)} endpoints ({', '.join(tags)}); "
+          f"A/B split 90/10 -> {split['category-0'] / 100:.1f}/{split['category-0-v2'] / 100:.1f}; "
+          f"a batch of {len(texts)} reached both variants")
+
+
+def run(requests, models, resident, load_latency, call_latency, seed=0):
+    aws = install_fake_boto3(FakeAWS())
+    runtime = aws.clients['sagemaker-runtime']
+    runtime.call_latency, runtime.load_latency, runtime.resident_models = call_latency, load_latency, resident
+    aws.tables['SentimentModelState'].put_item(Item={
+        'modelId': 'multi-model-endpoint', 'endpointStatus': 'IN_SERVICE', 'endpointName': 'multi-model-endpoint-1',
+    })
+    predict = load('invoke-sagemaker-endpoint.py', models, resident)
+
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) ** 1.1 for rank in range(models)]
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(requests):
+            model = rng.choices(range(models), weights)[0]
+            body = json.dumps({'text': f'review {i} is great', 'model': f'category-{model}'})
+            started = time.perf_counter()
+            response = predict.lambda_handler({'body': body}, FakeContext())
+            latencies.append(time.perf_counter() - started)
+            assert response['statusCode'] == 200, response
+
+    latencies.sort()
+    mirror = sys.modules['model_registry'].multi_model_residency.snapshot_stats()['models']
+    events = runtime.model_events
+    return {
+        'p50': latencies[len(latencies) // 2] * 1000,
+        'p95': latencies[int(len(latencies) * 0.95)] * 1000,
+        'loads': sum(n for (_, kind), n in events.items() if kind == 'load'),
+        'evictions': sum(n for (_, kind), n in events.items() if kind == 'eviction'),
+        'mirror_loads': sum(stats['loads'] for stats in mirror.values()),
+        'mirror_evictions': sum(stats['evictions'] for stats in mirror.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--models", type=int, default=8)
+    parser.add_argument("--resident", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--load-latency", type=float, default=0.05, help="seconds to load a model that is not resident")
+    parser.add_argument("--call-latency", type=float, default=0.001)
+    args = parser.parse_args()
+
+    check_routing(args.models)
+    print(f"{'resident':>9}{'p50 ms':>9}{'p95 ms':>9}{'loads':>7}{'evictions':>11}{'mirror loads':>14}{'mirror evictions':>18}")
+    for resident in args.resident:
+        r = run(args.requests, args.models, resident, args.load_latency, args.call_latency)
+        print(f"{resident:>9}{r['p50']:>9.1f}{r['p95']:>9.1f}{r['loads']:>7}{r['evictions']:>11}"
+              f"{r['mirror_loads']:>14}{r['mirror_evictions']:>18}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Counts the downstream AWS calls made per 1,000 /predict requests, before and after
+the state snapshot and debounced keep-alive in lambda/model_state.py.
+
+"before" disables both (STATE_CACHE_TTL_SECONDS=0, KEEP_ALIVE_WINDOW_SECONDS=0), which
+reproduces the original one-GetItem-plus-one-Invoke-per-request behaviour.
+Requests are replayed on a simulated clock at --rate requests per second.
+
+    python benchmarks/bench_predict_hot_path.py --requests 1000 --rate 10
+"""
+import argparse
+
+from fakes import FakeAWS, FakeContext, api_event, install_fake_boto3, load_lambda
+
+
+class SimulatedClock:
+    """Stands in for the `time` module inside model_state so TTLs expire without waiting."""
+
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def run(module, model_state, aws, requests, rate, state_ttl, keep_alive_window):
+    model_state.STATE_CACHE_TTL_SECONDS = state_ttl
+    model_state.KEEP_ALIVE_WINDOW_SECONDS = keep_alive_window
+    model_state.invalidate_model_state()
+    model_state._last_keep_alive.clear()
+    module.prediction_cache.entries.clear()
+    aws.tables['SentimentModelState'].items[('sentiment-model',)].pop('lastKeepAliveAt', None)
+
+    clock = SimulatedClock()
+    model_state.time = clock
+    context = FakeContext()
+    aws.counter.reset()
+    for i in range(requests):
+        # Unique texts so the prediction cache does not hide the hot path
+        response = module.lambda_handler(api_event({'text': f"Great strings, review #{i}"}), context)
+        assert response['statusCode'] == 200, response
+        clock.advance(1.0 / rate)
+    return aws.counter.summary()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=10.0, help="Simulated requests per second")
+    parser.add_argument("--state-ttl", type=float, default=5.0)
+    parser.add_argument("--keep-alive-window", type=float, default=300.0)
+    args = parser.parse_args()
+
+    aws = install_fake_boto3(FakeAWS())
+    aws.tables['SentimentModelState'].items[('sentiment-model',)] = {
+        'modelId': 'sentiment-model', 'endpointStatus': 'IN_SERVICE',
+        'endpointName': 'bench-endpoint', 'scheduleName': 'shutdown-schedule-bench-endpoint',
+    }
+    module = load_lambda('invoke-sagemaker-endpoint.py', env={
+        'DYNAMODB_TABLE_NAME': 'SentimentModelState',
+        'MODEL_ID': 'sentiment-model',
+        'TIMER_LAMBDA_ARN': 'arn:aws:lambda:us-east-1:123456789012:function:extend-shutdown-timer',
+    })
+    import model_state
+    import instrumentation
+
+    # Silence the handler's per-request logging and metric lines
+    module.print = lambda *a, **k: None
+    model_state.print = lambda *a, **k: None
+    instrumentation.print = lambda *a, **k: None
+
+    before = run(module, model_state, aws, args.requests, args.rate, 0, 0)
+    after = run(module, model_state, aws, args.requests, args.rate, args.state_ttl, args.keep_alive_window)
+
+    print(f"{args.requests} predictions at {args.rate} req/s (simulated {args.requests / args.rate:.0f}s)")
+    print(f"{'call':<36}{'before':>10}{'after':>10}")
+    for call in sorted(set(before) | set(after)):
+        print(f"{call:<36}{before.get(call, 0):>10}{after.get(call, 0):>10}")
+    non_endpoint = lambda summary: sum(n for c, n in summary.items() if not c.startswith('sagemaker-runtime'))
+    print(f"{'AWS calls besides the endpoint':<36}{non_endpoint(before):>10}{non_endpoint(after):>10}")
+    print("Each lambda.Invoke of extend-shutdown-timer results in one scheduler.UpdateSchedule.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Wall time of notification-and-shutdown-scheduler.py for 1 and 500 subscribers, against a local
+fake Textbelt server instead of textbelt.com.
+
+The fake server answers after --latency seconds and fails a share of first attempts with
+HTTP 503 (--flaky), so retries are exercised. "sequential" runs the handler with
+SMS_MAX_WORKERS=1, which sends one SMS at a time like the original loop; "concurrent" uses
+the default pool. Each run checks that every subscriber got exactly one SMS, and reports when
+the shutdown schedule was created relative to the start of the handler.
+
+    pip install requests
+    python bench_sms_notifications.py --subscribers 1 500 --latency 0.1
+"""
+import argparse
+import contextlib
+import io
+import sys
+import time
+
+from fakes import FakeAWS, FakeContext, FakeTextbelt, install_fake_boto3, load_lambda, start_textbelt_server
+
+
+def run(subscribers, workers, latency, flaky):
+    aws = install_fake_boto3(FakeAWS())
+    table = aws.tables['SentimentModelState']
+    table.put_item(Item={'modelId': 'sentiment-model', 'endpointStatus': 'CREATING'})
+    textbelt = FakeTextbelt(latency, flaky)
+    server = start_textbelt_server(textbelt)
+
+    module = load_lambda('notification-and-shutdown-scheduler.py', {
+        'DYNAMODB_TABLE_NAME': 'SentimentModelState',
+        'MODEL_ID': 'sentiment-model',
+        'SHUTDOWN_LAMBDA_ARN': 'arn:aws:lambda:us-east-1:123456789012:function:shutdown-endpoint',
+        'SCHEDULER_ROLE_ARN': 'arn:aws:iam::123456789012:role/scheduler',
+        'APP_URL': 'https://example.com',
+        'TEXTBELT_API_KEY': 'bench',
+        'TEXTBELT_URL': f'http://127.0.0.1:{server.server_address[1]}/text',
+        'SMS_MAX_WORKERS': workers,
+        'SMS_BACKOFF_SECONDS': 0.05,
+    })
+    model_state = sys.modules['model_state']
+    for i in range(subscribers):
+        model_state.add_subscriber(table, 'sentiment-model', f'user{i}', f'555{i:07d}')
+
+    # Note when the shutdown schedule is created
+    scheduled_at = []
+    scheduler = aws.clients['scheduler']
+    create_schedule = scheduler.create_schedule
+    def timed_create_schedule(**kwargs):
+        scheduled_at.append(time.perf_counter())
+        return create_schedule(**kwargs)
+    scheduler.create_schedule = timed_create_schedule
+
+    event = {'resources': ['arn:aws:sagemaker:us-east-1:123456789012:endpoint/sentiment-model-endpoint-1']}
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # the handler logs every SMS
+        module.lambda_handler(event, FakeContext())
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    module.sms_executor.shutdown()
+
+    assert len(textbelt.delivered) == subscribers, f"{len(textbelt.delivered)} of {subscribers} subscribers notified"
+    assert all(count == 1 for count in textbelt.delivered.values()), "A subscriber received more than one SMS"
+    return elapsed, scheduled_at[0] - start, textbelt.requests
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1, 500])
+    parser.add_argument("--latency", type=float, default=0.1, help="fake Textbelt response time in seconds")
+    parser.add_argument("--flaky", type=float, default=0.05, help="share of first attempts answered with HTTP 503")
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+
+    print(f"{'mode':<12}{'subscribers':>12}{'seconds':>10}{'schedule at s':>15}{'requests':>10}")
+    for subscribers in args.subscribers:
+        for mode, workers in (('sequential', 1), ('concurrent', args.workers)):
+            elapsed, scheduled, requests = run(subscribers, workers, args.latency, args.flaky)
+            print(f"{mode:<12}{subscribers:>12}{elapsed:>10.2f}{scheduled:>15.3f}{requests:>10}")
+
+
+if __name__ == "__main__":
+    main()
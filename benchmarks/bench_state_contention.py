@@ -0,0 +1,110 @@
+"""
+Concurrency stress test for the SentimentModelState transitions in lambda/model_state.py.
+
+A burst of /start requests hits start-model-service.py from many threads while the model is
+STOPPED. Halfway through, the scheduler's pop_subscribers() runs, as it would when the
+endpoint reaches InService mid-burst. The fake table serializes writes to the same item for
+--key-write-latency seconds each, like a hot partition key. The test checks:
+
+* exactly one request wins the STOPPED -> CREATING transition and creates an endpoint
+* every subscriber is either returned by the pop or still waiting in a shard, none lost
+* a phone that calls /start twice gets one entry per pop, not two
+
+and reports the burst's wall time and DynamoDB calls per request for several shard counts.
+SUBSCRIBER_SHARDS=1 puts every subscriber write on one item, as the old subscriber list did.
+
+    python bench_state_contention.py --requests 500 --shards 1 8 32
+"""
+import argparse
+import contextlib
+import io
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fakes import FakeAWS, FakeContext, install_fake_boto3, load_lambda
+
+MODEL_ID = 'sentiment-model'
+
+
+def run(requests, shards, threads, latency, key_write_latency):
+    aws = install_fake_boto3(FakeAWS(latency=latency))
+    table = aws.tables['SentimentModelState']
+    table.key_write_latency = key_write_latency
+    table.put_item(Item={'modelId': MODEL_ID, 'endpointStatus': 'STOPPED'})
+
+    # Shared modules read their settings at import time
+    for name in ('model_state', 'start_strategies'):
+        sys.modules.pop(name, None)
+    module = load_lambda('start-model-service.py', {
+        'DYNAMODB_TABLE_NAME': 'SentimentModelState',
+        'MODEL_ID': MODEL_ID,
+        'SAGEMAKER_MODEL_NAME': 'sentiment-model-v1',
+        'INSTANCE_TYPE': 'ml.m5.large',
+        'SUBSCRIBER_SHARDS': shards,
+    })
+    model_state = sys.modules['model_state']
+
+    # Every 10th request repeats an earlier phone number
+    phones = [f'555{(i - 1 if i % 10 == 9 else i):07d}' for i in range(requests)]
+    events = [{'body': json.dumps({'name': f'user{i}', 'phone': phone})} for i, phone in enumerate(phones)]
+    aws.counter.reset()
+
+    popped = []
+    started = threading.Semaphore(0)
+
+    def start(event):
+        started.release()
+        return module.lambda_handler(event, FakeContext())
+
+    def pop_midway():
+        for _ in range(requests // 2):
+            started.acquire()
+        popped.extend(model_state.pop_subscribers(table, MODEL_ID))
+
+    begin = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=threads + 1) as executor:
+        popper = executor.submit(pop_midway)
+        responses = list(executor.map(start, events))
+        popper.result()
+    elapsed = time.perf_counter() - begin
+
+    counts = aws.counter.summary()
+    statuses = [r['statusCode'] for r in responses]
+    assert statuses.count(200) == requests, f"Unexpected responses: {set(statuses)}"
+    winners = sum('deployment started' in r['body'] for r in responses)
+    assert winners == 1, f"{winners} requests won the start"
+    assert counts.get('sagemaker.CreateEndpoint') == 1, "More than one endpoint was created"
+    assert table.get_item(Key={'modelId': MODEL_ID})['Item']['endpointStatus'] == 'CREATING'
+
+    remaining = model_state.pop_subscribers(table, MODEL_ID)
+    received = [s['phone'] for s in popped + remaining]
+    assert sorted(set(received)) == sorted(set(phones)), f"{len(set(phones) - set(received))} subscribers lost"
+    for batch in (popped, remaining):
+        assert len(batch) == len({s['phone'] for s in batch}), "A subscriber was recorded twice"
+
+    dynamo_calls = sum(n for op, n in counts.items() if op.startswith('dynamodb.')) - shards  # minus the midway pop
+    return elapsed, dynamo_calls / requests, len(popped), len(remaining)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.002, help="fake DynamoDB round trip in seconds")
+    parser.add_argument("--key-write-latency", type=float, default=0.002,
+                        help="time each write holds its item, serializing writes to one key")
+    args = parser.parse_args()
+
+    print(f"{'shards':>7}{'seconds':>10}{'requests/s':>12}{'dynamo calls/req':>18}{'popped':>8}{'left':>6}")
+    for shards in args.shards:
+        elapsed, calls, popped, remaining = run(args.requests, shards, args.threads, args.latency, args.key_write_latency)
+        print(f"{shards:>7}{elapsed:>10.2f}{args.requests / elapsed:>12.0f}{calls:>18.2f}{popped:>8}{remaining:>6}")
+    print("All invariants held: one winner, one endpoint, no lost or duplicate subscribers.")
+
+
+if __name__ == "__main__":
+    main()
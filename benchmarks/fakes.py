@@ -0,0 +1,712 @@
+"""
+Local stand-ins for the AWS services the Lambda functions talk to.
+
+install_fake_boto3() puts a fake `boto3` / `botocore.exceptions` into sys.modules
+so the handlers in ../lambda can be imported and driven without AWS credentials.
+Every fake records its calls in a shared CallCounter so benchmarks can report
+AWS calls per request. FakeTextbelt and start_textbelt_server stand in for the SMS provider.
+"""
+import io
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import types
+import importlib.util
+from collections import Counter, OrderedDict
+from copy import deepcopy
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda')
+
+
+class ClientError(Exception):
+    """Mirrors botocore.exceptions.ClientError closely enough for the handlers."""
+
+    def __init__(self, error_response, operation_name):
+        self.response = error_response
+        self.operation_name = operation_name
+        code = error_response.get('Error', {}).get('Code')
+        super().__init__(f"An error occurred ({code}) when calling the {operation_name} operation")
+
+
+def client_error(code, operation_name):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, operation_name)
+
+
+class CallCounter:
+    """Thread-safe counter of (service, operation) calls."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = Counter()
+
+    def record(self, service, operation):
+        with self._lock:
+            self.calls[(service, operation)] += 1
+
+    def total(self, service=None):
+        with self._lock:
+            return sum(n for (s, _), n in self.calls.items() if service is None or s == service)
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+
+    def summary(self):
+        with self._lock:
+            return {f"{s}.{op}": n for (s, op), n in sorted(self.calls.items())}
+
+
+# --- DynamoDB ---
+
+def _split_top_level(expression, separator=','):
+    """Splits on separator, ignoring separators nested inside parentheses."""
+    parts, depth, current = [], 0, ''
+    for char in expression:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        if char == separator and depth == 0:
+            parts.append(current.strip())
+            current = ''
+        else:
+            current += char
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def _split_keyword(expression, keyword):
+    """Splits a condition on a top-level AND/OR, leaving parenthesized groups intact."""
+    parts, depth, start = [], 0, 0
+    token = f' {keyword} '
+    i = 0
+    while i < len(expression):
+        char = expression[i]
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif depth == 0 and expression.startswith(token, i):
+            parts.append(expression[start:i].strip())
+            i += len(token)
+            start = i
+            continue
+        i += 1
+    parts.append(expression[start:].strip())
+    return parts
+
+
+class FakeTable:
+    """
+    In-memory DynamoDB table supporting the subset of expressions used in this repo:
+    SET (plain values, list_append, if_not_exists, a + :v), REMOVE, ADD, simple
+    conditions joined by AND/OR, ReturnValues and ReturnValuesOnConditionCheckFailure.
+    """
+
+    def __init__(self, name, key_names=('modelId',), counter=None, latency=0.0, key_write_latency=0.0):
+        self.name = name
+        self.key_names = key_names
+        self.counter = counter or CallCounter()
+        self.latency = latency
+        # Writes to the same item are serialized for this long each, like a hot partition key
+        self.key_write_latency = key_write_latency
+        self.items = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _key(self, key):
+        return tuple(key[k] for k in self.key_names)
+
+    def _hold_key(self, key):
+        """Sleeps for key_write_latency while holding the item's lock."""
+        if not self.key_write_latency:
+            return
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            time.sleep(self.key_write_latency)
+
+    def _record(self, operation):
+        self.counter.record('dynamodb', operation)
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_item(self, Key, ConsistentRead=False, **kwargs):
+        self._record('GetItem')
+        with self._lock:
+            item = self.items.get(self._key(Key))
+            return {'Item': deepcopy(item)} if item is not None else {}
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeValues=None,
+                 ExpressionAttributeNames=None, **kwargs):
+        self._record('PutItem')
+        self._hold_key(self._key(Item))
+        with self._lock:
+            key = self._key(Item)
+            current = self.items.get(key)
+            if ConditionExpression and not self._evaluate(ConditionExpression, current or {},
+                                                          ExpressionAttributeValues or {},
+                                                          ExpressionAttributeNames or {}):
+                raise client_error('ConditionalCheckFailedException', 'PutItem')
+            self.items[key] = deepcopy(Item)
+            return {}
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeValues=None,
+                    ExpressionAttributeNames=None, ReturnValues='NONE', **kwargs):
+        self._record('DeleteItem')
+        self._hold_key(self._key(Key))
+        with self._lock:
+            key = self._key(Key)
+            current = self.items.get(key)
+            if ConditionExpression and not self._evaluate(ConditionExpression, current or {},
+                                                          ExpressionAttributeValues or {},
+                                                          ExpressionAttributeNames or {}):
+                raise client_error('ConditionalCheckFailedException', 'DeleteItem')
+            self.items.pop(key, None)
+            return {'Attributes': deepcopy(current)} if ReturnValues == 'ALL_OLD' and current else {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues=None,
+                    ExpressionAttributeNames=None, ConditionExpression=None,
+                    ReturnValues='NONE', ReturnValuesOnConditionCheckFailure='NONE', **kwargs):
+        self._record('UpdateItem')
+        values = ExpressionAttributeValues or {}
+        names = ExpressionAttributeNames or {}
+        self._hold_key(self._key(Key))
+        with self._lock:
+            key = self._key(Key)
+            old = self.items.get(key)
+            item = deepcopy(old) if old is not None else dict(Key)
+            if ConditionExpression and not self._evaluate(ConditionExpression, old or {}, values, names):
+                error = client_error('ConditionalCheckFailedException', 'UpdateItem')
+                if ReturnValuesOnConditionCheckFailure == 'ALL_OLD' and old:
+                    error.response['Item'] = {k: _serialize(v) for k, v in old.items()}
+                raise error
+            updated = self._apply_update(item, UpdateExpression, values, names)
+            self.items[key] = item
+
+        if ReturnValues == 'ALL_NEW':
+            return {'Attributes': deepcopy(item)}
+        if ReturnValues == 'ALL_OLD':
+            return {'Attributes': deepcopy(old)} if old else {}
+        if ReturnValues == 'UPDATED_NEW':
+            return {'Attributes': {k: deepcopy(item.get(k)) for k in updated if k in item}}
+        return {}
+
+    def query(self, KeyConditionExpression=None, ExpressionAttributeValues=None, **kwargs):
+        """Supports only `<keyName> = :v` conditions, which is all this repo needs."""
+        self._record('Query')
+        values = ExpressionAttributeValues or {}
+        names = kwargs.get('ExpressionAttributeNames') or {}
+        with self._lock:
+            items = [deepcopy(i) for i in self.items.values()
+                     if self._evaluate(KeyConditionExpression, i, values, names)]
+        return {'Items': items, 'Count': len(items)}
+
+    def batch_writer(self, **kwargs):
+        return FakeBatchWriter(self)
+
+    def scan(self, **kwargs):
+        self._record('Scan')
+        with self._lock:
+            items = [deepcopy(i) for i in self.items.values()]
+        return {'Items': items, 'Count': len(items)}
+
+    # --- expression helpers ---
+
+    @staticmethod
+    def _name(token, names):
+        return names.get(token, token)
+
+    def _operand(self, token, item, values, names):
+        token = token.strip()
+        if token.startswith(':'):
+            return deepcopy(values[token])
+        match = re.match(r'^(list_append|if_not_exists)\((.*)\)$', token)
+        if match:
+            first, second = _split_top_level(match.group(2))
+            if match.group(1) == 'list_append':
+                return (self._operand(first, item, values, names) or []) + (self._operand(second, item, values, names) or [])
+            existing = item.get(self._name(first, names))
+            return existing if existing is not None else self._operand(second, item, values, names)
+        if ' + ' in token or ' - ' in token:
+            op = '+' if ' + ' in token else '-'
+            left, right = [t.strip() for t in token.split(f' {op} ', 1)]
+            left_value = self._operand(left, item, values, names)
+            right_value = self._operand(right, item, values, names)
+            return left_value + right_value if op == '+' else left_value - right_value
+        return item.get(self._name(token, names))
+
+    def _apply_update(self, item, expression, values, names):
+        updated = []
+        sections = re.split(r'\b(SET|REMOVE|ADD|DELETE)\b', expression)
+        for i in range(1, len(sections), 2):
+            action, body = sections[i], sections[i + 1]
+            for clause in _split_top_level(body):
+                if action == 'SET':
+                    target, value = clause.split('=', 1)
+                    attribute = self._name(target.strip(), names)
+                    item[attribute] = self._operand(value, item, values, names)
+                    updated.append(attribute)
+                elif action == 'REMOVE':
+                    attribute = self._name(clause.strip(), names)
+                    item.pop(attribute, None)
+                elif action == 'ADD':
+                    target, value = clause.split(None, 1)
+                    attribute = self._name(target.strip(), names)
+                    increment = self._operand(value, item, values, names)
+                    if isinstance(increment, set):
+                        item[attribute] = set(item.get(attribute) or set()) | increment
+                    else:
+                        item[attribute] = (item.get(attribute) or 0) + increment
+                    updated.append(attribute)
+                elif action == 'DELETE':
+                    target, value = clause.split(None, 1)
+                    attribute = self._name(target.strip(), names)
+                    item[attribute] = set(item.get(attribute) or set()) - self._operand(value, item, values, names)
+                    updated.append(attribute)
+        return updated
+
+    def _evaluate(self, expression, item, values, names):
+        expression = expression.strip()
+        for keyword, combine in (('OR', any), ('AND', all)):
+            parts = _split_keyword(expression, keyword)
+            if len(parts) > 1:
+                return combine(self._evaluate(p, item, values, names) for p in parts)
+        if expression.startswith('(') and expression.endswith(')') and len(_split_top_level(expression, ' ')) == 1:
+            return self._evaluate(expression[1:-1], item, values, names)
+        match = re.match(r'^attribute_(not_)?exists\((.*)\)$', expression)
+        if match:
+            exists = item.get(self._name(match.group(2).strip(), names)) is not None
+            return not exists if match.group(1) else exists
+        for op in ('<>', '<=', '>=', '=', '<', '>'):
+            if op in expression:
+                left, right = [t.strip() for t in expression.split(op, 1)]
+                a = self._operand(left, item, values, names)
+                b = self._operand(right, item, values, names)
+                if op == '=':
+                    return a == b
+                if op == '<>':
+                    return a != b
+                if a is None or b is None:
+                    return False
+                return {'<': a < b, '>': a > b, '<=': a <= b, '>=': a >= b}[op]
+        raise ValueError(f"Unsupported condition expression: {expression}")
+
+
+def _serialize(value):
+    """Python value -> DynamoDB wire format, as found in ClientError responses."""
+    if value is None:
+        return {'NULL': True}
+    if isinstance(value, bool):
+        return {'BOOL': value}
+    if isinstance(value, (int, float, Decimal)):
+        return {'N': str(value)}
+    if isinstance(value, dict):
+        return {'M': {k: _serialize(v) for k, v in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return {'L': [_serialize(v) for v in value]}
+    return {'S': str(value)}
+
+
+class TypeDeserializer:
+    """Mirrors boto3.dynamodb.types.TypeDeserializer for the types _serialize produces."""
+
+    def deserialize(self, value):
+        (kind, data), = value.items()
+        if kind == 'NULL':
+            return None
+        if kind == 'N':
+            return Decimal(data)
+        if kind == 'M':
+            return {k: self.deserialize(v) for k, v in data.items()}
+        if kind == 'L':
+            return [self.deserialize(v) for v in data]
+        return data
+
+
+class FakeBatchWriter:
+    """Buffers puts and flushes them in groups of 25, like boto3's batch_writer."""
+
+    def __init__(self, table):
+        self.table = table
+        self.pending = []
+
+    def put_item(self, Item):
+        self.pending.append(Item)
+        if len(self.pending) >= 25:
+            self._flush()
+
+    def _flush(self):
+        if self.pending:
+            self.table.counter.record('dynamodb', 'BatchWriteItem')
+            with self.table._lock:
+                for item in self.pending:
+                    self.table.items[self.table._key(item)] = deepcopy(item)
+            self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._flush()
+
+
+class FakeDynamoResource:
+    def __init__(self, tables):
+        self.tables = tables
+
+    def Table(self, name):
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems):
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.tables[name]
+            table.counter.record('dynamodb', 'BatchGetItem')
+            with table._lock:
+                found = [table.items.get(table._key(key)) for key in request['Keys']]
+            responses[name] = [deepcopy(item) for item in found if item is not None]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+
+# --- SageMaker runtime ---
+
+class FakeStreamingBody:
+    def __init__(self, payload):
+        self._stream = io.BytesIO(payload)
+
+    def read(self):
+        return self._stream.read()
+
+
+def fake_sentiment(text):
+    """Deterministic stand-in for the model: texts with more 'bad' words score negative."""
+    lowered = text.lower()
+    negative = sum(lowered.count(w) for w in ('bad', 'broken', 'crack', 'useless', 'cheap', 'terrible'))
+    positive = sum(lowered.count(w) for w in ('good', 'great', 'love', 'best', 'perfect', 'rich'))
+    label = 'LABEL_1' if positive >= negative else 'LABEL_0'
+    return {'label': label, 'score': 0.5 + min(abs(positive - negative), 4) / 8.5}
+
+
+class FakeSageMakerRuntime:
+    """
+    Simulates the Hugging Face inference container: a fixed per-call overhead plus a
+    per-item cost, answering {"inputs": str} with [pred] and {"inputs": [str]} with [pred, ...].
+    Calls with a TargetModel behave like a multi-model endpoint: a model that is not loaded
+    costs load_latency first, and at most resident_models stay loaded per endpoint (LRU).
+    """
+
+    def __init__(self, counter=None, call_latency=0.0, item_latency=0.0, fail_endpoints=(),
+                 load_latency=0.0, resident_models=4):
+        self.counter = counter or CallCounter()
+        self.call_latency = call_latency
+        self.item_latency = item_latency
+        self.fail_endpoints = set(fail_endpoints)
+        self.load_latency = load_latency
+        self.resident_models = resident_models
+        self.loaded = {}  # endpoint -> OrderedDict of loaded target models
+        self.model_events = Counter()  # (target model, 'load' | 'eviction') -> count
+        self._lock = threading.Lock()
+
+    def _load(self, endpoint_name, target_model):
+        """Returns True if the target model had to be loaded."""
+        with self._lock:
+            loaded = self.loaded.setdefault(endpoint_name, OrderedDict())
+            if target_model in loaded:
+                loaded.move_to_end(target_model)
+                return False
+            loaded[target_model] = True
+            self.model_events[(target_model, 'load')] += 1
+            while len(loaded) > self.resident_models:
+                evicted, _ = loaded.popitem(last=False)
+                self.model_events[(evicted, 'eviction')] += 1
+            return True
+
+    def invoke_endpoint(self, EndpointName, Body, ContentType='application/json', TargetModel=None, **kwargs):
+        self.counter.record('sagemaker-runtime', 'InvokeEndpoint')
+        if EndpointName in self.fail_endpoints:
+            raise client_error('ValidationException', 'InvokeEndpoint')
+        if TargetModel and self._load(EndpointName, TargetModel):
+            time.sleep(self.load_latency)
+        inputs = json.loads(Body)['inputs']
+        texts = inputs if isinstance(inputs, list) else [inputs]
+        time.sleep(self.call_latency + self.item_latency * len(texts))
+        return {'Body': FakeStreamingBody(json.dumps([fake_sentiment(t) for t in texts]).encode())}
+
+
+# --- Lambda, Scheduler, SageMaker control plane ---
+
+class FakeLambda:
+    def __init__(self, counter=None, latency=0.0):
+        self.counter = counter or CallCounter()
+        self.latency = latency
+        self.invocations = []
+
+    def invoke(self, FunctionName, Payload=None, InvocationType='RequestResponse', **kwargs):
+        self.counter.record('lambda', 'Invoke')
+        if self.latency:
+            time.sleep(self.latency)
+        self.invocations.append((FunctionName, Payload))
+        return {'StatusCode': 202 if InvocationType == 'Event' else 200}
+
+
+class FakeScheduler:
+    def __init__(self, counter=None, latency=0.0):
+        self.counter = counter or CallCounter()
+        self.latency = latency
+        self.schedules = {}
+        self._lock = threading.Lock()
+
+    def _record(self, operation):
+        self.counter.record('scheduler', operation)
+        if self.latency:
+            time.sleep(self.latency)
+
+    def create_schedule(self, Name, **kwargs):
+        self._record('CreateSchedule')
+        with self._lock:
+            if Name in self.schedules:
+                raise client_error('ConflictException', 'CreateSchedule')
+            self.schedules[Name] = dict(kwargs, Name=Name)
+        return {'ScheduleArn': f'arn:aws:scheduler:us-east-1:123456789012:schedule/default/{Name}'}
+
+    def update_schedule(self, Name, **kwargs):
+        self._record('UpdateSchedule')
+        with self._lock:
+            if Name not in self.schedules:
+                raise client_error('ResourceNotFoundException', 'UpdateSchedule')
+            self.schedules[Name] = dict(kwargs, Name=Name)
+        return {'ScheduleArn': f'arn:aws:scheduler:us-east-1:123456789012:schedule/default/{Name}'}
+
+    def get_schedule(self, Name, GroupName='default', **kwargs):
+        self._record('GetSchedule')
+        with self._lock:
+            if Name not in self.schedules:
+                raise client_error('ResourceNotFoundException', 'GetSchedule')
+            return deepcopy(self.schedules[Name])
+
+    def delete_schedule(self, Name, **kwargs):
+        self._record('DeleteSchedule')
+        with self._lock:
+            if self.schedules.pop(Name, None) is None:
+                raise client_error('ResourceNotFoundException', 'DeleteSchedule')
+        return {}
+
+
+class FakeSageMaker:
+    def __init__(self, counter=None, latency=0.0):
+        self.counter = counter or CallCounter()
+        self.latency = latency
+        self.endpoint_configs = {}
+        self.endpoints = {}
+        self._lock = threading.Lock()
+
+    def _record(self, operation):
+        self.counter.record('sagemaker', operation)
+        if self.latency:
+            time.sleep(self.latency)
+
+    def create_endpoint_config(self, EndpointConfigName, **kwargs):
+        self._record('CreateEndpointConfig')
+        with self._lock:
+            if EndpointConfigName in self.endpoint_configs:
+                raise client_error('ValidationException', 'CreateEndpointConfig')
+            self.endpoint_configs[EndpointConfigName] = kwargs
+        return {}
+
+    def describe_endpoint_config(self, EndpointConfigName, **kwargs):
+        self._record('DescribeEndpointConfig')
+        with self._lock:
+            if EndpointConfigName not in self.endpoint_configs:
+                raise client_error('ValidationException', 'DescribeEndpointConfig')
+            return dict(self.endpoint_configs[EndpointConfigName], EndpointConfigName=EndpointConfigName)
+
+    def create_endpoint(self, EndpointName, EndpointConfigName, **kwargs):
+        self._record('CreateEndpoint')
+        with self._lock:
+            if EndpointName in self.endpoints:
+                raise client_error('ValidationException', 'CreateEndpoint')
+            self.endpoints[EndpointName] = {'EndpointConfigName': EndpointConfigName, 'EndpointStatus': 'Creating',
+                                            'Tags': kwargs.get('Tags', [])}
+        return {}
+
+    def describe_endpoint(self, EndpointName, **kwargs):
+        self._record('DescribeEndpoint')
+        with self._lock:
+            if EndpointName not in self.endpoints:
+                raise client_error('ValidationException', 'DescribeEndpoint')
+            return dict(self.endpoints[EndpointName], EndpointName=EndpointName)
+
+    def delete_endpoint(self, EndpointName, **kwargs):
+        self._record('DeleteEndpoint')
+        with self._lock:
+            if self.endpoints.pop(EndpointName, None) is None:
+                raise client_error('ValidationException', 'DeleteEndpoint')
+        return {}
+
+
+# --- SMS provider ---
+
+class FakeTextbelt:
+    """
+    Stands in for textbelt.com: answers after `latency` seconds, fails a share (`flaky`) of first
+    attempts per phone with HTTP 503, and counts accepted messages per phone number.
+    """
+
+    def __init__(self, latency, flaky, seed=0):
+        self.latency = latency
+        self.flaky = flaky
+        self.rng = random.Random(seed)
+        self.delivered = {}
+        self.failed_once = set()
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def handle(self, form):
+        phone = form.get('phone', [''])[0]
+        time.sleep(self.latency)
+        with self.lock:
+            self.requests += 1
+            if phone not in self.failed_once and self.rng.random() < self.flaky:
+                self.failed_once.add(phone)
+                return 503, b'{"success": false, "error": "temporarily unavailable"}'
+            self.delivered[phone] = self.delivered.get(phone, 0) + 1
+        return 200, b'{"success": true, "quotaRemaining": 1000}'
+
+
+def start_textbelt_server(textbelt):
+    """Serves `textbelt` on a free local port in a daemon thread. Returns the server."""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so the Lambda's pooled session can reuse connections
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            status, body = textbelt.handle(parse_qs(self.rfile.read(length).decode()))
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --- boto3 shim ---
+
+class FakeAWS:
+    """Holds one instance of every fake service, sharing a single CallCounter."""
+
+    def __init__(self, table_names=('SentimentModelState',), latency=0.0, client_latency=0.0, resource_latency=0.0):
+        self.counter = CallCounter()
+        # boto3 client and resource construction is not an AWS call; it is timed and listed separately
+        self.client_latency = client_latency
+        self.resource_latency = resource_latency
+        self.constructed = []
+        self.tables = {name: FakeTable(name, counter=self.counter, latency=latency) for name in table_names}
+        self.clients = {
+            'sagemaker-runtime': FakeSageMakerRuntime(self.counter),
+            'lambda': FakeLambda(self.counter, latency),
+            'scheduler': FakeScheduler(self.counter, latency),
+            'sagemaker': FakeSageMaker(self.counter, latency),
+        }
+
+    def add_table(self, name, key_names=('modelId',), **kwargs):
+        self.tables[name] = FakeTable(name, key_names=key_names, counter=self.counter, **kwargs)
+        return self.tables[name]
+
+    def client(self, service_name, *args, **kwargs):
+        time.sleep(self.client_latency)
+        self.constructed.append(f"client({service_name})")
+        return self.clients[service_name]
+
+    def resource(self, service_name, *args, **kwargs):
+        if service_name != 'dynamodb':
+            raise ValueError(f"No fake resource for {service_name}")
+        time.sleep(self.resource_latency)
+        self.constructed.append(f"resource({service_name})")
+        return FakeDynamoResource(self.tables)
+
+
+def install_fake_boto3(aws):
+    """Registers fake boto3/botocore modules backed by `aws` in sys.modules."""
+    boto3 = types.ModuleType('boto3')
+    boto3.client = aws.client
+    boto3.resource = aws.resource
+    dynamodb = types.ModuleType('boto3.dynamodb')
+    dynamodb_types = types.ModuleType('boto3.dynamodb.types')
+    dynamodb_types.TypeDeserializer = TypeDeserializer
+    dynamodb.types = dynamodb_types
+    boto3.dynamodb = dynamodb
+
+    botocore = types.ModuleType('botocore')
+    exceptions = types.ModuleType('botocore.exceptions')
+    exceptions.ClientError = ClientError
+    config = types.ModuleType('botocore.config')
+
+    class Config:
+        def __init__(self, **kwargs):
+            self.kwargs = kwargs
+
+    config.Config = Config
+    botocore.exceptions = exceptions
+    botocore.config = config
+
+    sys.modules['boto3'] = boto3
+    sys.modules['boto3.dynamodb'] = dynamodb
+    sys.modules['boto3.dynamodb.types'] = dynamodb_types
+    sys.modules['botocore'] = botocore
+    sys.modules['botocore.exceptions'] = exceptions
+    sys.modules['botocore.config'] = config
+    # aws_clients caches the clients it built from the previous boto3; the next handler import starts afresh
+    sys.modules.pop('aws_clients', None)
+    return aws
+
+
+def load_lambda(file_name, env=None):
+    """
+    Imports one of the hyphen-named Lambda modules from ../lambda as a fresh module,
+    after applying `env` to os.environ (the handlers read configuration at import time).
+    """
+    os.environ.setdefault('AWS_REGION', 'us-east-1')
+    for key, value in (env or {}).items():
+        os.environ[key] = str(value)
+    lambda_dir = os.path.abspath(LAMBDA_DIR)
+    if lambda_dir not in sys.path:
+        sys.path.insert(0, lambda_dir)
+    path = os.path.join(lambda_dir, file_name)
+    module_name = file_name[:-3].replace('-', '_')
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeContext:
+    """Minimal Lambda context object."""
+    invoked_function_arn = 'arn:aws:lambda:us-east-1:123456789012:function:bench'
+    function_name = 'bench'
+    aws_request_id = 'bench-request'
+
+    def get_remaining_time_in_millis(self):
+        return 900000
+
+
+def api_event(body=None, path=None, method='POST'):
+    event = {'httpMethod': method, 'body': json.dumps(body) if body is not None else None}
+    if path:
+        event['path'] = path
+    return event
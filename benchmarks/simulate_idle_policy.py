@@ -0,0 +1,157 @@
+"""
+Offline replay of request traffic against idle-shutdown policies (lambda/idle_policy.py).
+
+Replays a trace of /predict and /status requests and reports, per policy, endpoint-hours,
+cold starts, the predictions that had to wait for one, and the total cost in endpoint-hours with
+each cold start charged at --cold-start-cost minutes. The adaptive policy learns as it goes: its
+predictions go through idle_policy.record_request into a fake table, and its timeout comes from
+load_gap_histogram and choose_idle_minutes, as in the Lambdas.
+
+A prediction that arrives while the endpoint is stopped starts it. The endpoint is billed from
+then on, is ready --cold-start-minutes later, and the shutdown is scheduled at InService. A
+prediction while it is up pushes the shutdown back, at most once per keep-alive window. Under the
+original policy ("fixed 30 min + status polls"), a status poll does the same when fewer than 15
+minutes remain, as is-model-service-running.py does with IDLE_POLICY=fixed. "oracle" knows each next gap and shuts down straight away
+unless the next prediction is worth waiting for. It is the lower bound.
+
+The trace is a CSV of `timestamp,kind` rows, with epoch seconds and kind `predict` or `status`,
+e.g. exported from API Gateway access logs. Without --trace, a synthetic trace is generated:
+bursty sessions of predictions during the day, plus a dashboard polling /status on weekdays.
+
+    python simulate_idle_policy.py --days 28
+    python simulate_idle_policy.py --trace requests.csv --cold-start-cost 30
+"""
+import argparse
+import csv
+import random
+import sys
+from datetime import datetime, timezone
+
+from fakes import FakeAWS, FakeTable, install_fake_boto3, load_lambda
+
+KEEP_ALIVE_WINDOW_SECONDS = 300
+STATUS_EXTEND_BELOW_SECONDS = 15 * 60
+
+
+def synthetic_trace(days, sessions_per_day, poll_interval_minutes, seed=0):
+    """Sessions of predictions during the day, and a status poll every few minutes during office hours on weekdays."""
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 5, tzinfo=timezone.utc).timestamp()  # a Monday
+    events = []
+    for day in range(days):
+        midnight = start + day * 86400
+        for _ in range(rng.randint(max(0, sessions_per_day - 3), sessions_per_day + 3)):
+            t = midnight + rng.uniform(8, 22) * 3600
+            for _ in range(int(rng.expovariate(1 / 15)) + 1):
+                events.append((t, 'predict'))
+                # Mostly quick follow-ups, sometimes a pause to read or come back later
+                t += rng.expovariate(1 / 40) if rng.random() < 0.85 else rng.uniform(180, 1500)
+        if day % 7 < 5 and poll_interval_minutes:
+            t = midnight + 8 * 3600
+            while t < midnight + 18 * 3600:
+                events.append((t, 'status'))
+                t += poll_interval_minutes * 60
+    return sorted(events)
+
+
+def read_trace(path):
+    with open(path) as f:
+        return sorted((float(row['timestamp']), row['kind']) for row in csv.DictReader(f))
+
+
+def simulate(events, policy, idle_policy, cold_start_minutes, cold_start_cost, fixed_minutes=30):
+    """Replays the trace under one policy. Returns endpoint-hours, cold starts and delayed predictions."""
+    table = FakeTable('SimulatedTraffic')
+    model_id = f"simulated-{policy}"
+    predictions = [t for t, kind in events if kind == 'predict']
+    next_gap = {t: later - t for t, later in zip(predictions, predictions[1:])}
+
+    up_since = shutdown_at = ready_at = None
+    last_extension = timeout_computed_at = -float('inf')
+    timeout = fixed_minutes
+    endpoint_seconds, cold_starts, delayed, timeouts = 0.0, 0, 0, []
+
+    def current_timeout(t):
+        nonlocal timeout, timeout_computed_at
+        if policy == 'adaptive' and t - timeout_computed_at >= idle_policy.IDLE_POLICY_CACHE_SECONDS:
+            histogram = idle_policy.load_gap_histogram(table, model_id, now=t)
+            timeout = idle_policy.choose_idle_minutes(histogram, cold_start_cost, fallback=fixed_minutes)
+            timeout_computed_at = t
+        return timeout
+
+    for t, kind in events:
+        if shutdown_at is not None and t > shutdown_at:
+            endpoint_seconds += shutdown_at - up_since
+            up_since = shutdown_at = None
+
+        if kind == 'status':
+            # Only the original policy lets a status poll keep the endpoint alive
+            if (policy == 'fixed-polls' and shutdown_at is not None
+                    and t >= ready_at and shutdown_at - t < STATUS_EXTEND_BELOW_SECONDS
+                    and t - last_extension >= KEEP_ALIVE_WINDOW_SECONDS):
+                shutdown_at, last_extension = t + current_timeout(t) * 60, t
+            continue
+
+        if policy == 'adaptive':
+            idle_policy.record_request(table, model_id, 'predict', now=t)
+        if policy == 'oracle':
+            # Stay up through the next gap only if idling costs less than a cold start
+            gap = next_gap.get(t, float('inf'))
+            timeout = gap / 60 if gap <= cold_start_cost * 60 else 0
+
+        if up_since is None:
+            cold_starts += 1
+            delayed += 1
+            up_since, ready_at = t, t + cold_start_minutes * 60
+            shutdown_at = ready_at + current_timeout(t) * 60
+            last_extension = ready_at
+        elif t < ready_at:
+            delayed += 1
+        elif policy == 'oracle' or t - last_extension >= KEEP_ALIVE_WINDOW_SECONDS:
+            shutdown_at, last_extension = max(shutdown_at, t + current_timeout(t) * 60), t
+        if policy != 'oracle':
+            timeouts.append(timeout)
+
+    if up_since is not None:
+        endpoint_seconds += shutdown_at - up_since
+    return {
+        'endpoint_hours': endpoint_seconds / 3600,
+        'cold_starts': cold_starts,
+        'delayed': delayed,
+        'cost_hours': endpoint_seconds / 3600 + cold_starts * cold_start_cost / 60,
+        'mean_timeout': f"{sum(timeouts) / len(timeouts):.1f}" if timeouts else '-',
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trace", type=str, default=None, help="CSV of timestamp,kind; synthetic if omitted")
+    parser.add_argument("--days", type=int, default=28)
+    parser.add_argument("--sessions-per-day", type=int, default=6)
+    parser.add_argument("--poll-interval", type=float, default=5, help="minutes between dashboard status polls")
+    parser.add_argument("--cold-start-minutes", type=float, default=8, help="time from /start to InService")
+    parser.add_argument("--cold-start-cost", type=float, default=15, help="endpoint-minutes one cold start is worth")
+    args = parser.parse_args()
+
+    install_fake_boto3(FakeAWS())
+    load_lambda('is-model-service-running.py', {'DYNAMODB_TABLE_NAME': 'SentimentModelState', 'MODEL_ID': 'sentiment-model'})
+    idle_policy = sys.modules['idle_policy']
+
+    events = read_trace(args.trace) if args.trace else synthetic_trace(args.days, args.sessions_per_day, args.poll_interval)
+    predictions = sum(kind == 'predict' for _, kind in events)
+    days = (events[-1][0] - events[0][0]) / 86400 if events else 0
+    print(f"{len(events)} requests over {days:.1f} days: {predictions} predictions, {len(events) - predictions} status polls")
+    print(f"Cold start {args.cold_start_minutes:g} min, charged as {args.cold_start_cost:g} endpoint-minutes")
+    print(f"{'policy':<28}{'endpoint h':>11}{'cold starts':>13}{'delayed':>9}{'cost h':>9}{'mean T min':>12}")
+
+    policies = [('fixed 30 min + status polls', 'fixed-polls', 30), ('fixed 30 min', 'fixed', 30),
+                ('fixed 10 min', 'fixed', 10), ('fixed 60 min', 'fixed', 60),
+                ('adaptive', 'adaptive', idle_policy.IDLE_TIMEOUT_MINUTES), ('oracle', 'oracle', 0)]
+    for name, policy, minutes in policies:
+        r = simulate(events, policy, idle_policy, args.cold_start_minutes, args.cold_start_cost, minutes)
+        print(f"{name:<28}{r['endpoint_hours']:>11.1f}{r['cold_starts']:>13}{r['delayed']:>9}"
+              f"{r['cost_hours']:>9.1f}{r['mean_timeout']:>12}")
+
+
+if __name__ == "__main__":
+    main()
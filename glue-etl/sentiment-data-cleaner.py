@@ -1,4 +1,5 @@
 import sys
+from datetime import datetime, timezone
 from awsglue.transforms import *
 from awsglue.utils import getResolvedOptions
 from pyspark.context import SparkContext
@@ -7,46 +8,45 @@ from awsglue.job import Job
 from awsglue.gluetypes import *
 from awsgluedq.transforms import EvaluateDataQuality
 from awsglue import DynamicFrame
-
-def _find_null_fields(ctx, schema, path, output, nullStringSet, nullIntegerSet, frame):
-    if isinstance(schema, StructType):
-        for field in schema:
-            new_path = path + "." if path != "" else path
-            output = _find_null_fields(ctx, field.dataType, new_path + field.name, output, nullStringSet, nullIntegerSet, frame)
-    elif isinstance(schema, ArrayType):
-        if isinstance(schema.elementType, StructType):
-            output = _find_null_fields(ctx, schema.elementType, path, output, nullStringSet, nullIntegerSet, frame)
-    elif isinstance(schema, NullType):
-        output.append(path)
-    else:
-        x, distinct_set = frame.toDF(), set()
-        for i in x.select(path).distinct().collect():
-            distinct_ = i[path.split('.')[-1]]
-            if isinstance(distinct_, list):
-                distinct_set |= set([item.strip() if isinstance(item, str) else item for item in distinct_])
-            elif isinstance(distinct_, str) :
-                distinct_set.add(distinct_.strip())
-            else:
-                distinct_set.add(distinct_)
-        if isinstance(schema, StringType):
-            if distinct_set.issubset(nullStringSet):
-                output.append(path)
-        elif isinstance(schema, IntegerType) or isinstance(schema, LongType) or isinstance(schema, DoubleType):
-            if distinct_set.issubset(nullIntegerSet):
-                output.append(path)
-    return output
+# Shipped with the job via --extra-py-files
+from sentiment_transforms import find_null_columns, add_training_columns, assign_split_and_bucket, write_partitioned, stratified_sample, with_ingest_date, compact_partitions, deduplicate_reviews
 
 def drop_nulls(glueContext, frame, nullStringSet, nullIntegerSet, transformation_ctx) -> DynamicFrame:
-    nullColumns = _find_null_fields(frame.glue_ctx, frame.schema(), "", [], nullStringSet, nullIntegerSet, frame)
+    # One distributed aggregation decides every column, instead of a distinct().collect() per column
+    nullColumns = find_null_columns(frame.toDF(), nullStringSet, nullIntegerSet)
     return DropFields.apply(frame=frame, paths=nullColumns, transformation_ctx=transformation_ctx)
 
-args = getResolvedOptions(sys.argv, ['JOB_NAME'])
+# Optional job parameters: getResolvedOptions fails on names that weren't passed, so only ask for those present
+optional_args = [name for name in ('INCREMENTAL', 'COMPACT') if f'--{name}' in sys.argv]
+args = getResolvedOptions(sys.argv, ['JOB_NAME'] + optional_args)
 sc = SparkContext()
 glueContext = GlueContext(sc)
 spark = glueContext.spark_session
 job = Job(glueContext)
 job.init(args['JOB_NAME'], args)
 
+# Incremental mode (--INCREMENTAL true, with --job-bookmark-option job-bookmark-enable) reads only the raw files the
+# job bookmark hasn't seen, keyed on the source's transformation_ctx, and appends them as a new ingest_date partition.
+INCREMENTAL = args.get('INCREMENTAL', 'false').lower() == 'true'
+# --COMPACT true is a standalone run: it only compacts every partition split into more than one file, reading no
+# raw data, so it is safe with bookmarks on. Incremental runs compact partitions with COMPACTION_MIN_FILES or more.
+COMPACT = args.get('COMPACT', 'false').lower() == 'true'
+COMPACTION_MIN_FILES = 2 if COMPACT else 8
+# With bookmarks on, the source only returns files added since the last run. --job-bookmark-option is reserved, so
+# it can't be requested by name, but getResolvedOptions fills it in whenever Glue passes it.
+BOOKMARKS_ENABLED = args.get('job_bookmark_option') == 'job-bookmark-enable'
+INGEST_DATE = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+PROCESSED_DATA_PATH = "s3://recproject-recdata/processed-data/"
+
+# Training data settings
+TRAINING_DATA_PATH = "s3://recproject-recdata/training-data/"
+SAMPLE_DATA_PATH = "s3://recproject-recdata/training-data-sample/"
+EVAL_FRACTION = 0.1
+NUM_BUCKETS = 16
+MAX_RECORDS_PER_FILE = 500000    # Keeps files around 100-200 MB of snappy parquet
+SAMPLE_ROWS_PER_CLASS = 75000    # Matches the 150k-row sample previously drawn in Data-Exploration.ipynb
+NEAR_DUPLICATE_THRESHOLD = 0.8   # Estimated Jaccard similarity of word 3-grams above which a review is a near duplicate
+
 # Default ruleset used by all target nodes with data quality enabled
 DEFAULT_DATA_QUALITY_RULESET = """
     Rules = [
@@ -54,17 +54,65 @@ DEFAULT_DATA_QUALITY_RULESET = """
     ]
 """
 
+if COMPACT:
+    for path in (PROCESSED_DATA_PATH, TRAINING_DATA_PATH):
+        compacted = compact_partitions(spark, path, MAX_RECORDS_PER_FILE, min_files=COMPACTION_MIN_FILES)
+        print(f"Compacted {len(compacted)} partitions under {path}")
+    job.commit()
+    sys.exit(0)
+
+if not INCREMENTAL and BOOKMARKS_ENABLED:
+    # A full run purges and overwrites its outputs; from a bookmarked source that would keep only the newest reviews
+    raise ValueError("A full run must read every raw file. Run it with --job-bookmark-option job-bookmark-disable, "
+                     "or reset the job bookmark first, or pass --INCREMENTAL true.")
+if INCREMENTAL and not BOOKMARKS_ENABLED:
+    # Without a bookmark every raw file is read again and appended, duplicating the whole corpus on each run
+    raise ValueError("An incremental run needs --job-bookmark-option job-bookmark-enable.")
+
 # Script generated for node Amazon S3
 AmazonS3_node1750092568209 = glueContext.create_dynamic_frame.from_options(format_options={"multiLine": "false"}, connection_type="s3", format="json", connection_options={"paths": ["s3://recproject-recdata/raw-data/"], "recurse": True}, transformation_ctx="AmazonS3_node1750092568209")
 
+if INCREMENTAL and AmazonS3_node1750092568209.toDF().rdd.isEmpty():
+    # Nothing new since the last bookmark; with no columns the null scan would drop everything
+    print("No new raw files since the last run.")
+    job.commit()
+    sys.exit(0)
+
 # Script generated for node Select Fields
 SelectFields_node1750093037024 = SelectFields.apply(frame=AmazonS3_node1750092568209, paths=["rating", "title", "text"], transformation_ctx="SelectFields_node1750093037024")
 
 # Script generated for node Drop Null Fields
 DropNullFields_node1750093183791 = drop_nulls(glueContext, frame=SelectFields_node1750093037024, nullStringSet={}, nullIntegerSet={}, transformation_ctx="DropNullFields_node1750093183791")
 
+# Deduplication: exact and near-duplicate reviews waste training compute and leak between the train and eval splits
+deduplicated_df, dedup_stats = deduplicate_reviews(DropNullFields_node1750093183791.toDF(), threshold=NEAR_DUPLICATE_THRESHOLD)
+print(f"Deduplication: {dedup_stats['input_rows']} rows in, removed {dedup_stats['exact_duplicates']} exact and {dedup_stats['near_duplicates']} near duplicates")
+Deduplicated_node = DynamicFrame.fromDF(deduplicated_df, glueContext, "Deduplicated_node")
+
 # Script generated for node Amazon S3
-EvaluateDataQuality().process_rows(frame=DropNullFields_node1750093183791, ruleset=DEFAULT_DATA_QUALITY_RULESET, publishing_options={"dataQualityEvaluationContext": "EvaluateDataQuality_node1750092528648", "enableDataQualityResultsPublishing": True}, additional_options={"dataQualityResultsPublishing.strategy": "BEST_EFFORT", "observations.scope": "ALL"})
-AmazonS3_node1750093316301 = glueContext.write_dynamic_frame.from_options(frame=DropNullFields_node1750093183791, connection_type="s3", format="glueparquet", connection_options={"path": "s3://recproject-recdata/processed-data/", "partitionKeys": []}, format_options={"compression": "snappy"}, transformation_ctx="AmazonS3_node1750093316301")
+EvaluateDataQuality().process_rows(frame=Deduplicated_node, ruleset=DEFAULT_DATA_QUALITY_RULESET, publishing_options={"dataQualityEvaluationContext": "EvaluateDataQuality_node1750092528648", "enableDataQualityResultsPublishing": True}, additional_options={"dataQualityResultsPublishing.strategy": "BEST_EFFORT", "observations.scope": "ALL"})
+if not INCREMENTAL:
+    # A full run rebuilds the output rather than appending a second copy of every review
+    glueContext.purge_s3_path(PROCESSED_DATA_PATH, {"retentionPeriod": 0})
+ProcessedData_node = DynamicFrame.fromDF(with_ingest_date(deduplicated_df, INGEST_DATE), glueContext, "ProcessedData_node")
+AmazonS3_node1750093316301 = glueContext.write_dynamic_frame.from_options(frame=ProcessedData_node, connection_type="s3", format="glueparquet", connection_options={"path": PROCESSED_DATA_PATH, "partitionKeys": ["ingest_date"]}, format_options={"compression": "snappy"}, transformation_ctx="AmazonS3_node1750093316301")
+
+# Training data: labelling, text cleaning and the train/eval split used to happen in pandas in Data-Exploration.ipynb.
+# The hash-based split keeps every review in the same split on every run.
+training_df = assign_split_and_bucket(add_training_columns(deduplicated_df), EVAL_FRACTION, NUM_BUCKETS)
+training_df.persist()
+write_partitioned(training_df, TRAINING_DATA_PATH, MAX_RECORDS_PER_FILE, mode="append" if INCREMENTAL else "overwrite")
+
+# Stratified sample: a class-balanced sample, in the same layout, for fast experiments.
+# It's drawn from the whole dataset, so incremental runs leave it to the next full run.
+if not INCREMENTAL:
+    write_partitioned(stratified_sample(training_df, SAMPLE_ROWS_PER_CLASS), SAMPLE_DATA_PATH, MAX_RECORDS_PER_FILE)
+training_df.unpersist()
+
+# Compaction: merge the small files that incremental appends leave in each partition
+if INCREMENTAL:
+    for path in (PROCESSED_DATA_PATH, TRAINING_DATA_PATH):
+        compacted = compact_partitions(spark, path, MAX_RECORDS_PER_FILE, min_files=COMPACTION_MIN_FILES)
+        print(f"Compacted {len(compacted)} partitions under {path}")
 
 job.commit()
\ No newline at end of file
@@ -0,0 +1,272 @@
+"""
+Pure PySpark transforms used by sentiment-data-cleaner.py.
+
+They are kept out of the Glue script so they can be imported and tested with a local
+SparkSession (no awsglue). Ship this file to the job with --extra-py-files.
+"""
+from pyspark.sql import functions as F
+from pyspark.sql.types import StructType, ArrayType, NullType, StringType, IntegerType, LongType, DoubleType
+
+NUMERIC_TYPES = (IntegerType, LongType, DoubleType)
+
+
+def _leaf_columns(schema, path="", in_array=False):
+    """
+    Yields (path, dataType, in_array) for every leaf the null scan checks, walking structs and
+    arrays of structs the same way the original _find_null_fields did. Leaves reached through
+    an array of structs select as arrays, so in_array is True for them.
+    """
+    if isinstance(schema, StructType):
+        for field in schema:
+            new_path = path + "." if path != "" else path
+            yield from _leaf_columns(field.dataType, new_path + field.name, in_array)
+    elif isinstance(schema, ArrayType):
+        if isinstance(schema.elementType, StructType):
+            yield from _leaf_columns(schema.elementType, path, True)
+    else:
+        yield path, schema, in_array
+
+
+def _is_null_like(value, null_values, is_string):
+    """Column expression: value is in null_values (strings are compared after trimming)."""
+    non_none = [v for v in null_values if v is not None]
+    compared = F.trim(value) if is_string else value
+    member = F.coalesce(compared.isin(non_none), F.lit(False)) if non_none else F.lit(False)
+    if None in null_values:
+        return member | value.isNull()
+    return member
+
+
+def find_null_columns(df, null_string_set, null_numeric_set):
+    """
+    Returns the paths of columns whose every value is in the matching null set
+    (null_string_set for strings, null_numeric_set for int/long/double), plus NullType columns.
+
+    All columns are decided by a single distributed aggregation: each column contributes a
+    max() over a 0/1 "this row has a real value" flag, so only one row ever reaches the driver.
+    """
+    null_columns, flags = [], []
+    for i, (path, data_type, in_array) in enumerate(_leaf_columns(df.schema)):
+        if isinstance(data_type, NullType):
+            null_columns.append(path)
+            continue
+        if isinstance(data_type, StringType):
+            null_values, is_string = set(null_string_set), True
+        elif isinstance(data_type, NUMERIC_TYPES):
+            null_values, is_string = set(null_numeric_set), False
+        else:
+            continue
+
+        column = F.col(path)
+        if in_array:
+            # A null array counts as one null value; otherwise every element is checked
+            has_value = F.when(
+                column.isNull(), F.lit(None not in null_values)
+            ).otherwise(F.exists(column, lambda x: ~_is_null_like(x, null_values, is_string)))
+        else:
+            has_value = ~_is_null_like(column, null_values, is_string)
+        flags.append((path, F.max(F.when(has_value, 1).otherwise(0)).alias(f"c{i}")))
+
+    if flags:
+        row = df.agg(*[flag for _, flag in flags]).collect()[0]
+        # max() over an empty frame is null: no values at all, so the column is null-only
+        null_columns += [path for (path, _), value in zip(flags, row) if not value]
+    return null_columns
+
+
+def add_training_columns(df):
+    """
+    Builds the model inputs that Data-Exploration.ipynb used to build in pandas:
+    a binary sentiment label (ratings 1-3 negative, 4-5 positive) and a cleaned
+    review_full_text of "<title>. <text>". Rows without a rating or any text are dropped.
+    """
+    def clean(column):
+        # Amazon review text carries HTML line breaks; collapse them and runs of whitespace
+        column = F.regexp_replace(F.coalesce(column, F.lit("")), r"(?i)<br\s*/?>", " ")
+        return F.trim(F.regexp_replace(column, r"\s+", " "))
+
+    title, text = clean(F.col("title")), clean(F.col("text"))
+    rating = F.col("rating").cast("double")
+    return (
+        df.where(rating.isNotNull() & ((title != "") | (text != "")))
+        .select(
+            rating.cast("int").alias("rating"),
+            F.when(rating <= 3, 0).otherwise(1).alias("label"),
+            F.concat(title, F.lit(". "), text).alias("review_full_text"),
+        )
+    )
+
+
+def assign_split_and_bucket(df, eval_fraction, num_buckets, seed=42):
+    """
+    Adds split ('train' / 'eval') and bucket columns from hashes of the review text, so a review
+    always lands in the same split and bucket no matter how often or incrementally the job runs.
+    The label is duplicated into a `sentiment` partition column because Spark drops partition
+    columns from the files themselves, and train.py reads the files directly.
+    """
+    split_hash = F.pmod(F.xxhash64(F.col("review_full_text"), F.lit(seed)), F.lit(10000))
+    return (
+        df.withColumn("split", F.when(split_hash < int(eval_fraction * 10000), "eval").otherwise("train"))
+        .withColumn("bucket", F.pmod(F.xxhash64(F.col("review_full_text")), F.lit(num_buckets)).cast("int"))
+        .withColumn("sentiment", F.col("label"))
+    )
+
+
+def write_partitioned(df, path, max_records_per_file, mode="overwrite"):
+    """
+    Writes split/sentiment/bucket partitions with one file per partition directory
+    (capped at max_records_per_file rows), instead of one small file per Spark task.
+    """
+    (
+        df.repartition("split", "sentiment", "bucket")
+        .write.mode(mode)
+        .option("maxRecordsPerFile", max_records_per_file)
+        .option("compression", "snappy")
+        .partitionBy("split", "sentiment", "bucket")
+        .parquet(path)
+    )
+
+
+def stratified_sample(df, rows_per_class, seed=42):
+    """Samples about rows_per_class reviews of each label, preserving the train/eval split."""
+    counts = {row["label"]: row["count"] for row in df.groupBy("label").count().collect()}
+    fractions = {label: min(1.0, rows_per_class / count) for label, count in counts.items() if count}
+    return df.sampleBy("label", fractions=fractions, seed=seed)
+
+
+def with_ingest_date(df, ingest_date):
+    """Adds the ingest_date partition column, so each run's output lands in its own partition."""
+    return df.withColumn("ingest_date", F.lit(ingest_date))
+
+
+def _hadoop_fs(spark, path):
+    # Goes through Hadoop's FileSystem so the same code works on s3:// in Glue and on a local directory
+    jvm = spark.sparkContext._jvm
+    hadoop_path = jvm.org.apache.hadoop.fs.Path(path)
+    return hadoop_path.getFileSystem(spark.sparkContext._jsc.hadoopConfiguration()), hadoop_path
+
+
+def _partition_dirs(fs, directory):
+    """Yields (dir, parquet file statuses) for each directory holding data, skipping _ and . names like Spark does."""
+    files, subdirs = [], []
+    for status in fs.listStatus(directory):
+        name = status.getPath().getName()
+        if name.startswith("_") or name.startswith("."):
+            continue
+        if status.isDirectory():
+            subdirs.append(status.getPath())
+        elif name.endswith(".parquet"):
+            files.append(status)
+    if files:
+        yield directory, files
+    for subdir in subdirs:
+        yield from _partition_dirs(fs, subdir)
+
+
+def compact_partitions(spark, path, max_records_per_file, min_files=8):
+    """
+    Rewrites every partition directory under path that has at least min_files parquet files
+    (the small files left behind by incremental appends) into files of up to max_records_per_file
+    rows. Returns the compacted directories.
+
+    New files are staged under path/_compaction/ and moved in before the old ones are deleted,
+    so a failed run can leave duplicate rows in a partition but never lose any. Don't run it while
+    a training job is reading the same prefix.
+    """
+    Path = spark.sparkContext._jvm.org.apache.hadoop.fs.Path
+    fs, root = _hadoop_fs(spark, path)
+    if not fs.exists(root):
+        return []
+    root_uri = root.toUri().getPath().rstrip("/")
+    staging_root = Path(root, "_compaction")
+    compacted = []
+    for directory, files in list(_partition_dirs(fs, root)):
+        if len(files) < min_files:
+            continue
+        old_paths = [status.getPath() for status in files]
+        df = spark.read.parquet(*[p.toString() for p in old_paths])
+        num_files = max(1, -(-df.count() // max_records_per_file))
+        relative = directory.toUri().getPath()[len(root_uri):].lstrip("/") or "root"
+        staging = Path(staging_root, relative)
+        df.repartition(num_files).write.mode("overwrite").option("compression", "snappy").parquet(staging.toString())
+
+        for status in fs.listStatus(staging):
+            if status.getPath().getName().endswith(".parquet"):
+                fs.rename(status.getPath(), Path(directory, status.getPath().getName()))
+        for old_path in old_paths:
+            fs.delete(old_path, False)
+        fs.delete(staging, True)
+        compacted.append(directory.toString())
+    fs.delete(staging_root, True)
+    return compacted
+
+
+def _normalized_text(column):
+    """Lowercased text with punctuation removed and whitespace collapsed, so trivial edits hash the same."""
+    column = F.regexp_replace(F.lower(F.coalesce(column, F.lit(""))), r"[^\p{L}\p{N}\s]", " ")
+    return F.trim(F.regexp_replace(column, r"\s+", " "))
+
+
+def _minhash_signature(shingles, num_hashes):
+    # One seeded 64-bit hash per signature slot; the slot keeps the smallest hash over all shingles
+    return F.array(*[F.expr(f"array_min(transform({shingles}, s -> xxhash64(s, {i})))") for i in range(num_hashes)])
+
+
+def deduplicate_reviews(df, text_column="text", num_hashes=64, num_bands=16, threshold=0.8, shingle_size=3):
+    """
+    Removes exact and near-duplicate reviews by text. Returns (deduplicated df, stats).
+
+    Exact duplicates share the hash of their normalized text. Near duplicates are found with
+    MinHash over word shingles and banded LSH: each band's hash buckets similar texts together,
+    every review in a bucket is compared with the bucket's smallest-hash member, and it is dropped
+    when their signatures agree on at least `threshold` (the estimated Jaccard similarity).
+    Comparing with one representative per bucket keeps the work linear in the number of rows;
+    no candidate pairs are enumerated. Reviews with no text are never treated as duplicates.
+
+    stats holds the input row count and the rows removed as exact and as near duplicates.
+    The exact-deduplicated frame and the near-duplicate ids are cached, since the counts and the result both read them.
+    """
+    if num_hashes % num_bands:
+        raise ValueError(f"num_hashes ({num_hashes}) must be a multiple of num_bands ({num_bands})")
+    rows_per_band = num_hashes // num_bands
+
+    df = df.withColumn("_norm", _normalized_text(F.col(text_column)))
+    no_text = df.where(F.col("_norm") == "")
+    exact = (
+        df.where(F.col("_norm") != "")
+        .withColumn("_id", F.xxhash64("_norm"))
+        .dropDuplicates(["_id"])
+        .persist()
+    )
+    input_rows = df.count()
+    exact_rows = exact.count() + no_text.count()
+
+    tokens = F.split(F.col("_norm"), " ")
+    signatures = (
+        exact.select("_id", tokens.alias("_tokens"))
+        .withColumn("_shingles", F.expr(
+            f"array_distinct(transform(sequence(0, greatest(size(_tokens) - {shingle_size}, 0)), "
+            f"i -> concat_ws(' ', slice(_tokens, i + 1, {shingle_size}))))"))
+        .select("_id", _minhash_signature("_shingles", num_hashes).alias("_sig"))
+        .persist()  # read for the bands and both sides of the candidate comparison
+    )
+    bands = signatures.select("_id", F.explode(F.array(*[
+        F.struct(F.lit(b).alias("band"), F.xxhash64(*[F.col("_sig")[j] for j in range(b * rows_per_band, (b + 1) * rows_per_band)]).alias("key"))
+        for b in range(num_bands)
+    ])).alias("_bucket")).select("_id", "_bucket.band", "_bucket.key")
+
+    representatives = bands.groupBy("band", "key").agg(F.min("_id").alias("_rep"), F.count("*").alias("_size")).where(F.col("_size") > 1)
+    candidates = bands.join(representatives, ["band", "key"]).where(F.col("_id") != F.col("_rep")).select("_id", "_rep").distinct()
+    rep_signatures = signatures.select(F.col("_id").alias("_rep"), F.col("_sig").alias("_rep_sig"))
+    near_duplicates = (
+        candidates.join(signatures, "_id").join(rep_signatures, "_rep")
+        .where(F.expr(f"size(filter(zip_with(_sig, _rep_sig, (x, y) -> x = y), m -> m)) >= {threshold * num_hashes}"))
+        .select("_id").distinct()
+        .persist()
+    )
+
+    near_rows = near_duplicates.count()
+    signatures.unpersist()
+    result = exact.join(near_duplicates, "_id", "left_anti").drop("_id").unionByName(no_text).drop("_norm")
+    stats = {"input_rows": input_rows, "exact_duplicates": input_rows - exact_rows, "near_duplicates": near_rows}
+    return result, stats
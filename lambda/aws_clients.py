@@ -0,0 +1,47 @@
+import os
+import threading
+import boto3
+from botocore.config import Config
+
+# Clients and resources are built on first use rather than at import, so a cold start only pays
+# for the ones its path needs, and are then kept for every warm invocation of the environment.
+# The pool is sized for the thread pools that share a client (BATCH_MAX_WORKERS, SMS_MAX_WORKERS),
+# and TCP keep-alive stops idle pooled connections from being dropped between invocations.
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '16'))
+CLIENT_CONFIG = Config(max_pool_connections=AWS_MAX_POOL_CONNECTIONS, tcp_keepalive=True)
+
+# Building a client is not thread-safe on the shared default session
+_lock = threading.Lock()
+_clients = {}
+_resources = {}
+_tables = {}
+
+
+def get_client(service_name):
+    """The environment's boto3 client for service_name, e.g. 'scheduler' or 'sagemaker-runtime'."""
+    client = _clients.get(service_name)
+    if client is None:
+        with _lock:
+            client = _clients.get(service_name)
+            if client is None:
+                client = _clients[service_name] = boto3.client(service_name, config=CLIENT_CONFIG)
+    return client
+
+
+def get_resource(service_name='dynamodb'):
+    """The environment's boto3 resource for service_name."""
+    resource = _resources.get(service_name)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(service_name)
+            if resource is None:
+                resource = _resources[service_name] = boto3.resource(service_name, config=CLIENT_CONFIG)
+    return resource
+
+
+def get_table(table_name):
+    """The DynamoDB Table for table_name, sharing one resource and connection pool across tables."""
+    table = _tables.get(table_name)
+    if table is None:
+        table = _tables[table_name] = get_resource('dynamodb').Table(table_name)
+    return table
@@ -1,22 +1,26 @@
 import os
 import json
-import boto3
 from datetime import datetime, timedelta
 from botocore.exceptions import ClientError
+from instrumentation import instrumented, span
+from aws_clients import get_client
 
-# Initialize clients and get environment variables
-scheduler_client = boto3.client('scheduler')
+# Get environment variables (the scheduler client is built on first use by aws_clients)
 SHUTDOWN_LAMBDA_ARN = os.environ.get('SHUTDOWN_LAMBDA_ARN')
 SCHEDULER_ROLE_ARN = os.environ.get('SCHEDULER_ROLE_ARN')
+IDLE_TIMEOUT_MINUTES = float(os.environ.get('IDLE_TIMEOUT_MINUTES', '30'))
 
+@instrumented('extend-timer')
 def lambda_handler(event, context):
     """
     This is a helper function. It receives a schedule_name and endpoint_info,
-    and extends the schedule by 30 minutes from now.
+    and extends the schedule to idle_minutes (from the idle policy) from now.
     """
     schedule_name = event.get('schedule_name')
     endpoint_arn = event.get('endpoint_arn')
     endpoint_name = endpoint_arn.split('/')[-1]
+    model_id = event.get('model_id')
+    idle_minutes = float(event.get('idle_minutes') or IDLE_TIMEOUT_MINUTES)
 
     if not all([schedule_name, endpoint_arn]):
         print("ERROR: schedule_name and endpoint_arn are required.")
@@ -24,21 +28,23 @@ def lambda_handler(event, context):
 
     try:
         print(f"Attempting to extend schedule: {schedule_name}")
-        new_shutdown_time = datetime.utcnow() + timedelta(minutes=30)
+        new_shutdown_time = datetime.utcnow() + timedelta(minutes=idle_minutes)
         new_schedule_time_str = new_shutdown_time.strftime('%Y-%m-%dT%H:%M:%S')
 
-        scheduler_client.update_schedule(
-            Name=schedule_name,
-            GroupName='default',
-            ActionAfterCompletion='DELETE',
-            ScheduleExpression=f'at({new_schedule_time_str})',
-            FlexibleTimeWindow={'Mode': 'OFF'},
-            Target={
-                'Arn': SHUTDOWN_LAMBDA_ARN,
-                'RoleArn': SCHEDULER_ROLE_ARN,
-                'Input': json.dumps({'endpoint_name': endpoint_name})
-            }
-        )
+        with span('updateSchedule'):
+            get_client('scheduler').update_schedule(
+                Name=schedule_name,
+                GroupName='default',
+                ActionAfterCompletion='DELETE',
+                ScheduleExpression=f'at({new_schedule_time_str})',
+                FlexibleTimeWindow={'Mode': 'OFF'},
+                Target={
+                    'Arn': SHUTDOWN_LAMBDA_ARN,
+                    'RoleArn': SCHEDULER_ROLE_ARN,
+                    # Keep the model_id, so the shutdown marks the right state item STOPPED
+                    'Input': json.dumps({'endpoint_name': endpoint_name, 'model_id': model_id})
+                }
+            )
         print(f"Successfully extended schedule {schedule_name} to {new_schedule_time_str} UTC.")
         return {'status': 'success', 'message': f'Schedule extended to {new_schedule_time_str} UTC.'}
 
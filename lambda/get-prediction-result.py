@@ -0,0 +1,82 @@
+import os
+import json
+from prediction_queue import get_prediction_queue, endpoint_scorer, score_jobs
+from prediction_cache import prediction_cache
+from instrumentation import instrumented, span
+from aws_clients import get_client, get_table
+
+# Get environment variables
+TABLE_NAME = os.environ.get('DYNAMODB_TABLE_NAME')
+MODEL_ID = os.environ.get('MODEL_ID')
+ENDPOINT_BATCH_SIZE = int(os.environ.get('ENDPOINT_BATCH_SIZE', '32'))
+
+# AWS clients are built on first use by aws_clients
+prediction_queue = get_prediction_queue()
+
+@instrumented('result')
+def lambda_handler(event, context):
+    """
+    Returns the status, and once scored the results, of a prediction queued by /predict
+    while the endpoint was starting: GET /result/{id}.
+    """
+    try:
+        job_id = (event.get('pathParameters') or {}).get('id')
+        if not job_id:
+            return api_gateway_response(400, {'error': 'A job ID is required.'})
+        if not prediction_queue:
+            return api_gateway_response(404, {'error': 'Prediction queueing is not enabled.'})
+
+        with span('queueRead'):
+            job = prediction_queue.get(job_id)
+        if not job:
+            return api_gateway_response(404, {'error': f'No prediction job {job_id}.'})
+
+        # A job queued just after the drain finished would wait forever, so score it here instead
+        if job['status'] == 'QUEUED':
+            # The job's queue is the modelId of the state item of the endpoint that serves it
+            state = get_table(TABLE_NAME).get_item(Key={'modelId': job.get('queueKey') or MODEL_ID}).get('Item', {})
+            if state.get('endpointStatus') == 'IN_SERVICE' and state.get('endpointName') and prediction_queue.claim(job_id):
+                print(f"Scoring late job {job_id} directly.")
+                with span('lateScore'):
+                    score_jobs(prediction_queue, [job], endpoint_scorer(get_client('sagemaker-runtime'), state['endpointName']),
+                               ENDPOINT_BATCH_SIZE, cache=prediction_cache)
+                job = prediction_queue.get(job_id)
+
+        if job['status'] in ('QUEUED', 'RUNNING'):
+            return api_gateway_response(202, {'jobId': job_id, 'status': job['status']})
+        if job['status'] == 'FAILED':
+            return api_gateway_response(200, {'jobId': job_id, 'status': 'FAILED', 'error': job['error']})
+
+        # Same shapes as a direct /predict response
+        if job['isBatch']:
+            results = {'results': merge_answered_results(job)}
+        else:
+            results = job['results']
+        return api_gateway_response(200, {'jobId': job_id, 'status': 'DONE', 'results': results})
+
+    except Exception as e:
+        print(f"ERROR: {str(e)}")
+        return api_gateway_response(500, {'error': 'Could not retrieve the prediction result.'})
+
+def merge_answered_results(job):
+    """
+    The results of a queued batch in request order: those /predict gave straight away (cache
+    hits and per-item errors), and the queued ones in the order they were scored.
+    """
+    scored = iter(job['results'])
+    return [
+        result if result is not None else {'status': 'ok', 'prediction': next(scored)}
+        for result in job.get('answered') or [None] * len(job['results'])
+    ]
+
+def api_gateway_response(status_code, body_object):
+    """Helper function to format the response for API Gateway"""
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Content-Type',
+            'Access-Control-Allow-Methods': 'OPTIONS,GET'
+        },
+        'body': json.dumps(body_object)
+    }
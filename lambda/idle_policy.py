@@ -0,0 +1,177 @@
+import os
+import time
+import threading
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+# How long an idle endpoint is kept before the shutdown schedule fires:
+#   fixed     IDLE_TIMEOUT_MINUTES after the last keep-alive, and status polls keep the endpoint alive (the original behaviour)
+#   adaptive  the timeout that minimizes the expected cost of the observed gaps between predictions.
+#             Only predictions keep the endpoint alive; status polls are counted but never extend the timer
+IDLE_POLICY = os.environ.get('IDLE_POLICY', 'fixed')
+POLICIES = ('fixed', 'adaptive')
+IDLE_TIMEOUT_MINUTES = float(os.environ.get('IDLE_TIMEOUT_MINUTES', '30'))
+
+# The cost budget: how many endpoint-minutes one avoided cold start is worth. It covers the instance
+# time spent creating the endpoint and the users' wait. Higher values keep the endpoint up longer.
+COLD_START_COST_MINUTES = float(os.environ.get('COLD_START_COST_MINUTES', '15'))
+# Bounds on the adaptive timeout. The keep-alive is debounced (KEEP_ALIVE_WINDOW_SECONDS), so
+# the endpoint may shut down that much earlier than the timeout; keep the minimum well above it.
+MIN_IDLE_MINUTES = float(os.environ.get('MIN_IDLE_MINUTES', '10'))
+MAX_IDLE_MINUTES = float(os.environ.get('MAX_IDLE_MINUTES', '60'))
+# Below this many recorded gaps the adaptive policy falls back to IDLE_TIMEOUT_MINUTES
+MIN_GAP_SAMPLES = int(os.environ.get('MIN_GAP_SAMPLES', '20'))
+
+# Gaps shorter than this are not recorded; they never decide a shutdown. It also bounds the writes:
+# each execution environment writes the traffic items at most once per resolution per model.
+TRAFFIC_RESOLUTION_SECONDS = float(os.environ.get('TRAFFIC_RESOLUTION_SECONDS', '60'))
+# Gaps are kept per week, and the policy uses the last TRAFFIC_HISTORY_WEEKS of them
+TRAFFIC_HISTORY_WEEKS = int(os.environ.get('TRAFFIC_HISTORY_WEEKS', '2'))
+# How long a warm Lambda reuses the timeout it computed
+IDLE_POLICY_CACHE_SECONDS = float(os.environ.get('IDLE_POLICY_CACHE_SECONDS', '300'))
+
+WEEK_SECONDS = 7 * 24 * 3600
+# Upper bounds, in minutes, of the gap histogram buckets. The adaptive timeout is one of them.
+GAP_BUCKETS_MINUTES = (1, 2, 3, 5, 7, 10, 15, 20, 30, 45, 60, 90, 120, 240, 480, 1440, float('inf'))
+
+_deserializer = TypeDeserializer()
+
+# Module-level state survives between warm invocations of the same execution environment
+_lock = threading.Lock()
+_last_recorded = {}  # (modelId, kind) -> time of the last request recorded for it
+_unrecorded_polls = {}  # modelId -> status polls not yet written
+_timeouts = {}  # modelId -> (computed_at, minutes)
+
+
+def gap_bucket(gap_seconds):
+    """The upper bound, in minutes, of the histogram bucket a gap falls in."""
+    minutes = gap_seconds / 60
+    return next(bound for bound in GAP_BUCKETS_MINUTES if minutes <= bound)
+
+
+def _traffic_key(model_id, week=None):
+    if week is None:
+        return {'modelId': f"{model_id}#traffic"}
+    return {'modelId': f"{model_id}#traffic#{week}"}
+
+
+def record_request(table, model_id, kind='predict', now=None):
+    """
+    Records a request for the idle policy. kind is 'predict' for traffic that needs the endpoint,
+    or 'status' for a status poll. A prediction updates lastPredictionAt on the <MODEL_ID>#traffic
+    item, and the gap since the previous one is counted in the week's <MODEL_ID>#traffic#<week>
+    item. Writes happen at most once per TRAFFIC_RESOLUTION_SECONDS; returns True if this call wrote.
+    """
+    now = time.time() if now is None else now
+    with _lock:
+        last = _last_recorded.get((model_id, kind))
+        if last is not None and now - last < TRAFFIC_RESOLUTION_SECONDS:
+            if kind == 'status':
+                _unrecorded_polls[model_id] = _unrecorded_polls.get(model_id, 0) + 1
+            return False
+        _last_recorded[(model_id, kind)] = now
+        polls = _unrecorded_polls.pop(model_id, 0) + 1 if kind == 'status' else 0
+    week = int(now // WEEK_SECONDS)
+
+    if kind == 'status':
+        # Polls are only counted, to show how much of the traffic they are
+        table.update_item(
+            Key=_traffic_key(model_id, week),
+            UpdateExpression="ADD statusPolls :n",
+            ExpressionAttributeValues={':n': polls},
+        )
+        return True
+
+    try:
+        response = table.update_item(
+            Key=_traffic_key(model_id),
+            UpdateExpression="SET lastPredictionAt = :now",
+            ConditionExpression="attribute_not_exists(lastPredictionAt) OR lastPredictionAt < :cutoff",
+            ExpressionAttributeValues={':now': int(now), ':cutoff': int(now - TRAFFIC_RESOLUTION_SECONDS)},
+            ReturnValues='ALL_OLD',
+            ReturnValuesOnConditionCheckFailure='ALL_OLD',
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        # Another environment recorded a prediction within the resolution; go quiet until it has passed
+        last = e.response.get('Item', {}).get('lastPredictionAt')
+        if last:
+            with _lock:
+                _last_recorded[(model_id, kind)] = float(_deserializer.deserialize(last))
+        return False
+
+    previous = response.get('Attributes', {}).get('lastPredictionAt')
+    if previous is not None:
+        table.update_item(
+            Key=_traffic_key(model_id, week),
+            UpdateExpression="ADD #bucket :one",
+            ExpressionAttributeNames={'#bucket': f"gap:{gap_bucket(now - float(previous)):g}"},
+            ExpressionAttributeValues={':one': 1},
+        )
+    return True
+
+
+def load_gap_histogram(table, model_id, now=None):
+    """Sums the gap histograms of the last TRAFFIC_HISTORY_WEEKS weeks: {bucket bound in minutes: count}."""
+    week = int((time.time() if now is None else now) // WEEK_SECONDS)
+    histogram = {}
+    for past_week in range(week - TRAFFIC_HISTORY_WEEKS + 1, week + 1):
+        item = table.get_item(Key=_traffic_key(model_id, past_week)).get('Item', {})
+        for key, count in item.items():
+            if key.startswith('gap:'):
+                bound = float(key[len('gap:'):])
+                histogram[bound] = histogram.get(bound, 0) + int(count)
+    return histogram
+
+
+def choose_idle_minutes(histogram, cold_start_cost=COLD_START_COST_MINUTES, min_minutes=MIN_IDLE_MINUTES,
+                        max_minutes=MAX_IDLE_MINUTES, min_samples=MIN_GAP_SAMPLES, fallback=IDLE_TIMEOUT_MINUTES):
+    """
+    Picks the idle timeout T that minimizes the expected cost of the next gap g, in endpoint-minutes:
+    g if the next prediction arrives within T (the endpoint idles through the gap), or
+    T + cold_start_cost if it arrives later (the endpoint idles for T, shuts down and has to
+    cold-start again). Gaps are taken at the middle of their bucket.
+    """
+    samples = sum(histogram.values())
+    if samples < min_samples:
+        return fallback
+
+    def expected_cost(timeout):
+        cost = 0
+        for index, bound in enumerate(GAP_BUCKETS_MINUTES):
+            count = histogram.get(bound, 0)
+            if bound <= timeout:
+                cost += count * (bound + (GAP_BUCKETS_MINUTES[index - 1] if index else 0)) / 2
+            else:
+                cost += count * (timeout + cold_start_cost)
+        return cost / samples
+
+    candidates = [min_minutes] + [b for b in GAP_BUCKETS_MINUTES if min_minutes < b < max_minutes] + [max_minutes]
+    return min(candidates, key=expected_cost)
+
+
+def idle_timeout_minutes(table, model_id, policy=None):
+    """The idle timeout for model_id under the policy (IDLE_POLICY by default), cached for IDLE_POLICY_CACHE_SECONDS."""
+    policy = policy or IDLE_POLICY
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown IDLE_POLICY '{policy}'. Expected one of {POLICIES}.")
+    if policy == 'fixed':
+        return IDLE_TIMEOUT_MINUTES
+
+    now = time.monotonic()
+    with _lock:
+        cached = _timeouts.get(model_id)
+        if cached and now - cached[0] < IDLE_POLICY_CACHE_SECONDS:
+            return cached[1]
+    histogram = load_gap_histogram(table, model_id)
+    minutes = choose_idle_minutes(histogram)
+    print(f"Idle timeout for {model_id}: {minutes:g} minutes from {sum(histogram.values())} recorded gaps.")
+    with _lock:
+        _timeouts[model_id] = (now, minutes)
+    return minutes
+
+
+def status_polls_keep_alive(policy=None):
+    """Whether a status poll may extend the shutdown timer. Under the adaptive policy only predictions do."""
+    return (policy or IDLE_POLICY) == 'fixed'
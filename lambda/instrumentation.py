@@ -0,0 +1,153 @@
+import os
+import json
+import time
+import random
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Handlers emit one structured metric line per sampled invocation, in the CloudWatch embedded
+# metric format (EMF): CloudWatch Logs turns the line into metrics, with no PutMetricData calls.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'SentimentAnalysis')
+# Share of invocations that emit metrics. A handler can set its own default; cold starts and errors always emit.
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', '1'))
+# Dumping the full event on every invocation costs a json.dumps of the whole request; off by default
+LOG_EVENTS = os.environ.get('LOG_EVENTS', 'false').lower() == 'true'
+
+# The first invocation in an execution environment is its cold start
+_cold_start = True
+_current = contextvars.ContextVar('invocation', default=None)
+
+
+class Invocation:
+    """Collects the spans, counts, sizes and properties of one handler invocation."""
+
+    def __init__(self, function, sampled, sample_rate, cold_start):
+        self.function = function
+        self.sampled = sampled
+        self.sample_rate = sample_rate
+        self.cold_start = cold_start
+        self.values = {}
+        self.units = {}
+        self.properties = {}
+        self.failed = False
+        self._lock = threading.Lock()
+
+    def add(self, name, value, unit):
+        with self._lock:
+            self.values[name] = self.values.get(name, 0) + value
+            self.units[name] = unit
+
+    def document(self, duration_ms):
+        """The EMF document for this invocation."""
+        values = dict(self.values, durationMs=duration_ms, coldStart=int(self.cold_start), errors=int(self.failed))
+        units = dict(self.units, durationMs='Milliseconds', coldStart='Count', errors='Count')
+        return {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': METRICS_NAMESPACE,
+                    'Dimensions': [['Function']],
+                    'Metrics': [{'Name': name, 'Unit': units[name]} for name in values],
+                }],
+            },
+            'Function': self.function,
+            'SampleRate': self.sample_rate,
+            **self.properties,
+            **{name: round(value, 3) for name, value in values.items()},
+        }
+
+
+def instrumented(function, sample_rate=None):
+    """
+    Decorates a lambda_handler. Times the invocation, notes cold starts, request and response
+    body sizes and the status code, and prints the EMF line if the invocation was sampled.
+    Spans and counts recorded anywhere during the invocation (span, count, size) are included.
+    """
+    rate = METRICS_SAMPLE_RATE if sample_rate is None else sample_rate
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            global _cold_start
+            cold_start, _cold_start = _cold_start, False
+            if not METRICS_ENABLED:
+                return handler(event, context)
+
+            invocation = Invocation(function, cold_start or random.random() < rate, rate, cold_start)
+            token = _current.set(invocation)
+            started = time.perf_counter()
+            try:
+                body = event.get('body') if isinstance(event, dict) else None
+                if isinstance(body, str):
+                    invocation.add('requestBytes', len(body), 'Bytes')
+                response = handler(event, context)
+                if isinstance(response, dict) and 'statusCode' in response:
+                    invocation.properties['StatusCode'] = response['statusCode']
+                    invocation.failed = response['statusCode'] >= 500
+                    if isinstance(response.get('body'), str):
+                        invocation.add('responseBytes', len(response['body']), 'Bytes')
+                return response
+            except Exception:
+                invocation.failed = True
+                raise
+            finally:
+                _current.reset(token)
+                if invocation.sampled or invocation.failed:
+                    print(json.dumps(invocation.document(round((time.perf_counter() - started) * 1000, 3))))
+        return wrapper
+    return decorator
+
+
+def _active():
+    invocation = _current.get()
+    return invocation if invocation is not None and invocation.sampled else None
+
+
+@contextmanager
+def span(name):
+    """Times a phase of the invocation as <name>Ms. Repeated spans of the same name add up."""
+    invocation = _active()
+    if invocation is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        invocation.add(f"{name}Ms", (time.perf_counter() - started) * 1000, 'Milliseconds')
+
+
+def count(name, value=1):
+    """Adds to a count, e.g. cache hits or keep-alive invocations."""
+    invocation = _active()
+    if invocation is not None:
+        invocation.add(name, value, 'Count')
+
+
+def size(name, value):
+    """Adds to a size in bytes, e.g. an endpoint payload."""
+    invocation = _active()
+    if invocation is not None:
+        invocation.add(name, value, 'Bytes')
+
+
+def set_property(name, value):
+    """Adds a searchable property (not a metric) to the metric line."""
+    invocation = _active()
+    if invocation is not None:
+        invocation.properties[name] = value
+
+
+def in_current_context(fn):
+    """Wraps fn so that, run on a worker thread, its spans and counts still reach this invocation."""
+    context = contextvars.copy_context()
+    return functools.partial(context.run, fn)
+
+
+def log_event(event):
+    """Prints the full event only when LOG_EVENTS is set."""
+    if LOG_EVENTS:
+        print(f"Received event: {json.dumps(event)}")
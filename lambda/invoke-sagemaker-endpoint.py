@@ -1,72 +1,320 @@
 import os
 import json
-import boto3
+import time
+from urllib.request import Request, urlopen
+from urllib.error import URLError
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
+from prediction_cache import prediction_cache
+from model_state import get_model_state, invalidate_model_state, recently_extended, extend_shutdown_timer, endpoint_arn_for
+from prediction_queue import get_prediction_queue, QueueFullError
+from model_registry import resolve_model, model_version, multi_model_residency, UnknownModelError
+from idle_policy import record_request, idle_timeout_minutes
+from instrumentation import instrumented, span, count, size, set_property, in_current_context, log_event
+from aws_clients import get_client, get_table
 
 # Get environment variables
 TABLE_NAME = os.environ.get('DYNAMODB_TABLE_NAME')
-MODEL_ID = os.environ.get('MODEL_ID')
 TIMER_LAMBDA_ARN = os.environ.get('TIMER_LAMBDA_ARN') # ARN for the helper function
+# Optional: base URL of a self-hosted inference server (local-inference/server.py) to use instead of SageMaker
+INFERENCE_BACKEND_URL = os.environ.get('INFERENCE_BACKEND_URL')
+BACKEND_TIMEOUT_SECONDS = float(os.environ.get('BACKEND_TIMEOUT_SECONDS', '30'))
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
-sagemaker_runtime = boto3.client('sagemaker-runtime')
-lambda_client = boto3.client('lambda')
-table = dynamodb.Table(TABLE_NAME)
+# Batch prediction settings. ENDPOINT_BATCH_SIZE should match the batch size the
+# endpoint's inference container handles in one forward pass.
+ENDPOINT_BATCH_SIZE = int(os.environ.get('ENDPOINT_BATCH_SIZE', '32'))
+MAX_BATCH_ITEMS = int(os.environ.get('MAX_BATCH_ITEMS', '1000'))
+MAX_CHUNK_BYTES = int(os.environ.get('MAX_CHUNK_BYTES', '5000000')) # invoke_endpoint payloads are capped at 6 MB
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', '8'))
+# /predict is the high-volume path, so only a sample of its invocations emit metrics
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', '0.1'))
+# Ways the endpoint's inference handler (sagemaker/long_text.py) can combine the windows of a long review
+AGGREGATIONS = ('mean', 'weighted', 'max', 'last')
 
+# AWS clients are built on first use by aws_clients: a fully cached request only needs the
+# state table, and the Lambda client is only needed when a keep-alive is due.
+
+# Kept at module level so warm invocations reuse the worker threads
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS)
+# Durable queue for predictions submitted while the endpoint is CREATING (None if not configured)
+prediction_queue = get_prediction_queue()
+
+@instrumented('predict', sample_rate=METRICS_SAMPLE_RATE)
 def lambda_handler(event, context):
     """
     Acts as a proxy to invoke the SageMaker endpoint, with keep-alive logic.
+    Accepts either a single review ({"text": ...}) or a batch ({"texts": [...]}),
+    plus an optional "model" key naming the model to score with, and optional
+    "aggregation" and "returnChunks" keys for reviews longer than one window.
+    """
+    try:
+        log_event(event)
+
+        # --- 1. Validate the request ---
+        body = json.loads(event.get('body') or '{}')
+        is_batch = 'texts' in body
+
+        if is_batch:
+            texts = body.get('texts')
+            if not isinstance(texts, list) or not texts:
+                return api_gateway_response(400, {'error': 'texts must be a non-empty list.'})
+            if len(texts) > MAX_BATCH_ITEMS:
+                return api_gateway_response(413, {'error': f'A batch may contain at most {MAX_BATCH_ITEMS} texts.'})
+        else:
+            review_text = body.get('text')
+            if not review_text:
+                return api_gateway_response(400, {'error': 'Input text is required.'})
+            texts = [review_text]
+
+        parameters = {}
+        if body.get('aggregation') is not None:
+            if body['aggregation'] not in AGGREGATIONS:
+                return api_gateway_response(400, {'error': f"aggregation must be one of {', '.join(AGGREGATIONS)}."})
+            parameters['aggregation'] = body['aggregation']
+        if body.get('returnChunks'):
+            parameters['return_chunks'] = True
+
+        try:
+            # An A/B key splits by review, so each text of a batch is routed to its own variant
+            routes = [resolve_model(body.get('model'), routing_text=text if isinstance(text, str) else None) for text in texts]
+        except UnknownModelError as e:
+            return api_gateway_response(404, {'error': str(e)})
+        # Every variant is on the same endpoint, so any route stands in for its state and shutdown timer
+        route = routes[0]
+        # Predictions made with different parameters are cached separately
+        suffix = ''.join(f"?{key}={value}" for key, value in sorted(parameters.items()))
+        groups = {}
+        for index, text_route in enumerate(routes):
+            groups.setdefault(text_route['modelKey'], []).append(index)
+        # The state item records the SageMaker model the endpoint was launched with, which is what the
+        # cache is keyed on: this Lambda's SAGEMAKER_MODEL_NAME can lag behind a redeploy.
+        # State is cached for a few seconds between warm invocations.
+        if INFERENCE_BACKEND_URL:
+            state = {}
+        else:
+            with span('stateRead'):
+                state = get_model_state(get_table(TABLE_NAME), route['stateId'])
+        versions = {
+            model_key: model_version(routes[indices[0]], state.get('sagemakerModelName')) + suffix
+            for model_key, indices in groups.items()
+        }
+
+        # --- 2. Serve what we can from the prediction cache ---
+        # This happens before the state check so cached reviews work even while the endpoint is STOPPED.
+        results = [None] * len(texts)
+        with span('cacheLookup'):
+            for model_key, indices in groups.items():
+                cached = prediction_cache.get_many([texts[index] for index in indices], versions[model_key])
+                for position, prediction in cached.items():
+                    results[indices[position]] = {'status': 'ok', 'prediction': prediction, 'cached': True}
+        pending = [index for index, result in enumerate(results) if result is None]
+        count('texts', len(texts))
+        count('cacheHits', len(texts) - len(pending))
+        set_property('Model', body.get('model') or route['modelKey'])
+
+        if pending:
+            # --- 3. Find the running endpoint and keep it alive ---
+            endpoint_name = get_running_endpoint(route, state, context)
+            if not endpoint_name:
+                # While the endpoint is starting, accept the work and score it once it is IN_SERVICE
+                if prediction_queue and state.get('endpointStatus') == 'CREATING':
+                    return queue_prediction(texts, is_batch, results, routes, parameters,
+                                            [versions[text_route['modelKey']] for text_route in routes])
+                return api_gateway_response(404, {'error': 'Model is not currently running or available.'})
+
+            # Requests the endpoint serves are the traffic the idle policy learns from. The
+            # self-hosted server has no shutdown timer, so there is nothing to learn for it.
+            if not INFERENCE_BACKEND_URL:
+                try:
+                    with span('trafficRecord'):
+                        record_request(get_table(TABLE_NAME), route['stateId'], 'predict')
+                except ClientError as e:
+                    print(f"Could not record request: {e}")
+
+            # --- 4. Invoke the SageMaker Endpoint for the cache misses ---
+            if is_batch:
+                with span('endpoint'):
+                    scored = predict_batch(endpoint_name, [texts[index] for index in pending], [routes[index] for index in pending], parameters)
+                for index, result in zip(pending, scored):
+                    results[index] = result
+            else:
+                try:
+                    with span('endpoint'):
+                        result = invoke_endpoint(endpoint_name, review_text, route['targetModel'], parameters)
+                except (ClientError, URLError):
+                    # The cached state may point at an endpoint that has just been deleted
+                    invalidate_model_state(route['stateId'])
+                    raise
+                print(f"Received successful prediction: {result}")
+                results[0] = {'status': 'ok', 'prediction': result[0]}
+
+            with span('cacheWrite'):
+                for model_key, indices in groups.items():
+                    prediction_cache.put_many({
+                        texts[index]: results[index]['prediction'] for index in indices
+                        if not results[index].get('cached') and results[index]['status'] == 'ok'
+                    }, versions[model_key])
+
+        if is_batch:
+            print(f"Scored batch of {len(texts)} texts ({len(texts) - len(pending)} from cache).")
+            return api_gateway_response(200, {'results': results})
+        return api_gateway_response(200, [results[0]['prediction']])
+
+    except Exception as e:
+        print(f"FATAL ERROR: {str(e)}")
+        return api_gateway_response(500, {'error': 'An internal server error occurred.'})
+
+def get_running_endpoint(route, item, context):
+    """
+    Returns the name of the endpoint serving the route, given its state item, or None if it is
+    not IN_SERVICE. Extends the shutdown timer as a side effect (debounced to once per
+    KEEP_ALIVE_WINDOW_SECONDS).
+    """
+    if INFERENCE_BACKEND_URL:
+        # The self-hosted server is always on, so there is no endpoint state or shutdown timer to manage
+        return INFERENCE_BACKEND_URL
+
+    table = get_table(TABLE_NAME)
+    status = item.get('endpointStatus')
+    endpoint_name = item.get('endpointName')
+    schedule_name = item.get('scheduleName')
+
+    if status != 'IN_SERVICE' or not endpoint_name:
+        return None
+
+    # --- "KEEP-ALIVE" LOGIC ---
+    if schedule_name and not recently_extended(schedule_name):
+        with span('keepAlive'):
+            extended = extend_shutdown_timer(table, get_client('lambda'), TIMER_LAMBDA_ARN, route['stateId'], schedule_name,
+                                             endpoint_arn_for(endpoint_name, context),
+                                             idle_minutes=idle_timeout_minutes(table, route['stateId']))
+        count('keepAliveInvoked', int(extended))
+    return endpoint_name
+
+def queue_prediction(texts, is_batch, results, routes, parameters, cache_versions):
+    """
+    Puts the texts that missed the cache on the prediction queue and returns 202 with the job ID to
+    poll at /result/{id}. results holds what the cache already answered, which /result merges back
+    in; routes and cache_versions hold the route and prediction cache version of each text.
     """
+    # Invalid texts get the same per-item errors predict_batch gives them on the running path
+    for index, text in enumerate(texts):
+        if results[index] is None and not (isinstance(text, str) and text.strip()):
+            results[index] = {'status': 'error', 'error': 'Input text is required.'}
+    pending = [index for index, result in enumerate(results) if result is None]
+    if not pending:
+        return api_gateway_response(400, {'error': 'At least one text must be a non-empty string.'})
+    queued = [texts[index] for index in pending]
+    target_models = [routes[index]['targetModel'] for index in pending]
     try:
-        print(f"Received event: {json.dumps(event)}")
-        
-        # --- 1. Get current state from DynamoDB ---
-        response = table.get_item(Key={'modelId': MODEL_ID})
-        item = response.get('Item', {})
-        status = item.get('endpointStatus')
-        endpoint_name = item.get('endpointName')
-        schedule_name = item.get('scheduleName')
-
-        if status != 'IN_SERVICE' or not endpoint_name:
-            return api_gateway_response(404, {'error': 'Model is not currently running or available.'})
-
-        # --- 2. "KEEP-ALIVE" LOGIC ---
-        # If a schedule exists, invoke the helper function to extend its time.
-        if schedule_name:
-            print(f"Invoking timer extension for schedule: {schedule_name}")
-            payload = {
-                'schedule_name': schedule_name,
-                'endpoint_arn': f"arn:aws:sagemaker:{os.environ['AWS_REGION']}:{context.invoked_function_arn.split(':')[4]}:endpoint/{endpoint_name}"
-            }
-            lambda_client.invoke(
-                FunctionName=TIMER_LAMBDA_ARN,
-                InvocationType='Event', # Fire and forget, no need to wait for response
-                Payload=json.dumps(payload)
+        with span('enqueue'):
+            job_id = prediction_queue.enqueue(
+                queued, is_batch, queue_key=routes[0]['stateId'], model=routes[0]['modelKey'],
+                target_model=target_models[0], target_models=target_models if len(set(target_models)) > 1 else None,
+                parameters=parameters, cache_versions=[cache_versions[index] for index in pending],
+                answered=results if len(pending) < len(texts) else None,
             )
-        
-        # --- 3. Invoke the SageMaker Endpoint (Original Logic) ---
-        body = json.loads(event.get('body', '{}'))
-        review_text = body.get('text')
+    except QueueFullError as e:
+        return api_gateway_response(413, {'error': str(e)})
+    print(f"Endpoint is starting. Queued {len(queued)} of {len(texts)} texts as job {job_id}.")
+    return api_gateway_response(202, {
+        'jobId': job_id,
+        'status': 'QUEUED',
+        'message': 'Model is starting up. Poll the result URL for the prediction.',
+        'resultUrl': f"/result/{job_id}",
+    })
 
-        if not review_text:
-            return api_gateway_response(400, {'error': 'Input text is required.'})
+def invoke_endpoint(endpoint_name, inputs, target_model=None, parameters=None):
+    """
+    Sends a single payload to the endpoint and returns the decoded JSON result.
+    target_model selects the artifact on a multi-model endpoint; parameters are passed to
+    the inference handler and left out when empty, so the stock container still works.
+    """
+    payload = json.dumps({"inputs": inputs, "parameters": parameters} if parameters else {"inputs": inputs})
+    count('endpointCalls')
+    size('endpointPayloadBytes', len(payload))
+    if INFERENCE_BACKEND_URL:
+        request = Request(
+            f"{INFERENCE_BACKEND_URL.rstrip('/')}/invocations",
+            data=payload.encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+        )
+        with urlopen(request, timeout=BACKEND_TIMEOUT_SECONDS) as response:
+            return json.loads(response.read().decode())
 
-        payload_for_sagemaker = {"inputs": review_text}
-        
-        sagemaker_response = sagemaker_runtime.invoke_endpoint(
+    if not target_model:
+        sagemaker_response = get_client('sagemaker-runtime').invoke_endpoint(
             EndpointName=endpoint_name,
             ContentType="application/json",
-            Body=json.dumps(payload_for_sagemaker),
+            Body=payload,
         )
-        
-        result = sagemaker_response["Body"].read().decode()
-        print(f"Received successful prediction: {result}")
-        return api_gateway_response(200, json.loads(result))
+        return json.loads(sagemaker_response["Body"].read().decode())
 
-    except Exception as e:
-        print(f"FATAL ERROR: {str(e)}")
-        return api_gateway_response(500, {'error': 'An internal server error occurred.'})
+    # The first call to a model that is not loaded includes its load time
+    loading = multi_model_residency.record(endpoint_name, target_model)
+    started = time.monotonic()
+    sagemaker_response = get_client('sagemaker-runtime').invoke_endpoint(
+        EndpointName=endpoint_name,
+        TargetModel=target_model,
+        ContentType="application/json",
+        Body=payload,
+    )
+    if loading:
+        multi_model_residency.record_load_time(target_model, (time.monotonic() - started) * 1000)
+        count('modelLoads')
+    return json.loads(sagemaker_response["Body"].read().decode())
+
+def chunk_texts(indexed_texts):
+    """
+    Splits (index, text) pairs into chunks of at most ENDPOINT_BATCH_SIZE items
+    and roughly MAX_CHUNK_BYTES of encoded text each.
+    """
+    chunks, current, current_bytes = [], [], 0
+    for index, text in indexed_texts:
+        text_bytes = len(text.encode('utf-8'))
+        if current and (len(current) >= ENDPOINT_BATCH_SIZE or current_bytes + text_bytes > MAX_CHUNK_BYTES):
+            chunks.append(current)
+            current, current_bytes = [], 0
+        current.append((index, text))
+        current_bytes += text_bytes
+    if current:
+        chunks.append(current)
+    return chunks
+
+def score_chunk(endpoint_name, chunk, route, parameters=None):
+    """Scores one chunk. Returns a list of (index, result) pairs, marking every item as failed on error."""
+    try:
+        predictions = invoke_endpoint(endpoint_name, [text for _, text in chunk], route['targetModel'], parameters)
+        if not isinstance(predictions, list) or len(predictions) != len(chunk):
+            raise ValueError(f"Expected {len(chunk)} predictions, received {len(predictions) if isinstance(predictions, list) else 'non-list'}.")
+        return [(index, {'status': 'ok', 'prediction': prediction}) for (index, _), prediction in zip(chunk, predictions)]
+    except (ClientError, URLError, ValueError) as e:
+        print(f"ERROR scoring chunk of {len(chunk)} texts: {str(e)}")
+        if not isinstance(e, ValueError):
+            invalidate_model_state(route['stateId'])
+        return [(index, {'status': 'error', 'error': str(e)}) for index, _ in chunk]
+
+def predict_batch(endpoint_name, texts, routes, parameters=None):
+    """
+    Scores a list of texts by sending size-bounded chunks to the endpoint in parallel.
+    routes holds the route of each text; texts for different target models go in different chunks.
+    Results come back in input order, each with its own status.
+    """
+    results = [None] * len(texts)
+    valid = {}
+    for index, (text, route) in enumerate(zip(texts, routes)):
+        if isinstance(text, str) and text.strip():
+            valid.setdefault(route['modelKey'], (route, []))[1].append((index, text))
+        else:
+            results[index] = {'status': 'error', 'error': 'Input text is required.'}
+
+    futures = [batch_executor.submit(in_current_context(score_chunk), endpoint_name, chunk, route, parameters)
+               for route, indexed_texts in valid.values() for chunk in chunk_texts(indexed_texts)]
+    for future in futures:
+        for index, result in future.result():
+            results[index] = result
+
+    return results
 
 def api_gateway_response(status_code, body_object):
     """Helper function to format the response for API Gateway"""
@@ -1,37 +1,53 @@
 import os
 import json
-import boto3
 from datetime import datetime, timezone
 from botocore.exceptions import ClientError
+from model_state import get_model_state, recently_extended, extend_shutdown_timer, endpoint_arn_for
+from model_registry import resolve_model, UnknownModelError
+from idle_policy import record_request, status_polls_keep_alive, idle_timeout_minutes
+from instrumentation import instrumented, span, count
+from aws_clients import get_client, get_table
 
 # Get environment variables
 TABLE_NAME = os.environ.get('DYNAMODB_TABLE_NAME')
-MODEL_ID = os.environ.get('MODEL_ID')
 TIMER_LAMBDA_ARN = os.environ.get('TIMER_LAMBDA_ARN') # ARN of the new helper function
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
-scheduler_client = boto3.client('scheduler')
-lambda_client = boto3.client('lambda')
-table = dynamodb.Table(TABLE_NAME)
-
+@instrumented('status')
 def lambda_handler(event, context):
     """
     Checks the model status and extends the shutdown timer if it's about to expire.
+    Under the adaptive idle policy a status poll is only counted and never extends the timer.
+    The model is chosen by the optional ?model= query parameter.
     """
     try:
-        response = table.get_item(Key={'modelId': MODEL_ID})
-        item = response.get('Item', {})
+        try:
+            route = resolve_model((event.get('queryStringParameters') or {}).get('model'))
+        except UnknownModelError as e:
+            return api_gateway_response(404, {'error': str(e)})
+        model_id = route['stateId']
+        # Built on first use and kept for warm invocations; a poll of a stopped model needs no other client
+        table = get_table(TABLE_NAME)
+
+        try:
+            with span('trafficRecord'):
+                record_request(table, model_id, 'status')
+        except ClientError as e:
+            print(f"Could not record status poll: {e}")
+
+        with span('stateRead'):
+            item = get_model_state(table, model_id)
         status = item.get('endpointStatus')
         schedule_name = item.get('scheduleName')
         endpoint_name = item.get('endpointName')
         
         is_running = (status == 'IN_SERVICE')
         
-        # --- NEW TIMER EXTENSION LOGIC ---
-        if is_running and schedule_name:
+        # --- TIMER EXTENSION LOGIC ---
+        # Skip the scheduler lookup entirely if the timer was extended within the keep-alive window.
+        if is_running and schedule_name and status_polls_keep_alive() and not recently_extended(schedule_name):
             try:
-                schedule_details = scheduler_client.get_schedule(Name=schedule_name, GroupName='default')
+                with span('scheduleLookup'):
+                    schedule_details = get_client('scheduler').get_schedule(Name=schedule_name, GroupName='default')
                 # The schedule expression is like 'at(2025-06-25T14:30:00)'
                 schedule_str = schedule_details['ScheduleExpression'][3:-1] 
                 scheduled_time = datetime.fromisoformat(schedule_str).replace(tzinfo=timezone.utc)
@@ -41,18 +57,14 @@ def lambda_handler(event, context):
                 
                 print(f"Time until shutdown: {minutes_remaining:.2f} minutes.")
 
-                # If less than 15 minutes remain, invoke the helper lambda to extend the timer
+                # If less than 15 minutes remain, extend the timer (shared, debounced keep-alive)
                 if minutes_remaining < 15:
                     print("Shutdown time is less than 15 minutes away. Invoking timer extension.")
-                    payload = {
-                        'schedule_name': schedule_name,
-                        'endpoint_arn': schedule_details['Target']['Arn'] # Pass the correct endpoint ARN
-                    }
-                    lambda_client.invoke(
-                        FunctionName=TIMER_LAMBDA_ARN,
-                        InvocationType='Event', # Fire and forget, we don't need to wait for the response
-                        Payload=json.dumps(payload)
-                    )
+                    with span('keepAlive'):
+                        extended = extend_shutdown_timer(table, get_client('lambda'), TIMER_LAMBDA_ARN, model_id, schedule_name,
+                                                         endpoint_arn_for(endpoint_name, context),
+                                                         idle_minutes=idle_timeout_minutes(table, model_id))
+                    count('keepAliveInvoked', int(extended))
                     
             except ClientError as e:
                 # This can happen if the schedule was just deleted. It's safe to ignore.
@@ -0,0 +1,178 @@
+import os
+import json
+import zlib
+import threading
+from collections import OrderedDict
+
+# The models this deployment serves, keyed by the `model` field of /status, /start and /predict:
+#   {"musical-instruments": {"sagemakerModelName": "sentiment-mi-v1"},
+#    "electronics": {"multiModel": true, "artifact": "electronics.tar.gz"},
+#    "electronics-v2": {"multiModel": true},
+#    "electronics-ab": {"variants": {"electronics": 90, "electronics-v2": 10}}}
+# A model with its own sagemakerModelName gets its own endpoint and state item (modelId = its key).
+# "multiModel" models share one multi-model endpoint, which loads each artifact on first use.
+# "variants" splits a key between other models by weight, for A/B tests. Without MODEL_REGISTRY,
+# the single MODEL_ID / SAGEMAKER_MODEL_NAME model is served exactly as before.
+MODEL_REGISTRY = os.environ.get('MODEL_REGISTRY')
+MODEL_ID = os.environ.get('MODEL_ID')
+SAGEMAKER_MODEL_NAME = os.environ.get('SAGEMAKER_MODEL_NAME')
+# The model used when a request names none
+DEFAULT_MODEL_KEY = os.environ.get('DEFAULT_MODEL_KEY') or MODEL_ID
+
+# The shared multi-model endpoint: its state item, and a SageMaker model created with
+# Mode=MultiModel whose ModelDataUrl is the S3 prefix holding every artifact
+MULTI_MODEL_ID = os.environ.get('MULTI_MODEL_ID', 'multi-model-endpoint')
+MULTI_MODEL_SAGEMAKER_MODEL_NAME = os.environ.get('MULTI_MODEL_SAGEMAKER_MODEL_NAME')
+# How many models one instance of the multi-model endpoint keeps loaded, for the residency metrics
+MULTI_MODEL_RESIDENT_MODELS = int(os.environ.get('MULTI_MODEL_RESIDENT_MODELS', '4'))
+
+# Endpoints of the default model keep their original names
+DEFAULT_NAME_PREFIX = 'sentiment-model'
+
+
+class UnknownModelError(ValueError):
+    """The request named a model that is not in the registry."""
+
+
+def load_registry(config=None):
+    """Parses and validates MODEL_REGISTRY. Raises ValueError on a broken configuration."""
+    config = MODEL_REGISTRY if config is None else config
+    if not config:
+        return {MODEL_ID: {'sagemakerModelName': SAGEMAKER_MODEL_NAME}}
+    registry = json.loads(config)
+    for key, spec in registry.items():
+        variants = spec.get('variants')
+        if not variants:
+            continue
+        if any(name not in registry or registry[name].get('variants') for name in variants):
+            raise ValueError(f"Variants of '{key}' must be registered models without variants of their own.")
+        if len({_state_id(name, registry[name]) for name in variants}) != 1:
+            # /start and /status act on one endpoint per key, so a split can't span endpoints
+            raise ValueError(f"Variants of '{key}' must all be served by the same endpoint.")
+    return registry
+
+
+def _state_id(key, spec):
+    return MULTI_MODEL_ID if spec.get('multiModel') else key
+
+
+REGISTRY = load_registry()
+
+
+def resolve_model(model_key=None, routing_text=None):
+    """
+    Returns the route for a request: a dict with the model key that serves it, the modelId of
+    its SentimentModelState item, the SageMaker model to deploy, the TargetModel to invoke on a
+    multi-model endpoint (None otherwise) and the prefix for endpoint names. A key with variants
+    is split by a stable hash of routing_text, so the same review always goes to the same variant.
+    """
+    model_key = model_key or DEFAULT_MODEL_KEY
+    spec = REGISTRY.get(model_key)
+    if spec is None:
+        raise UnknownModelError(f"Unknown model '{model_key}'. Available models: {', '.join(sorted(REGISTRY))}.")
+
+    variants = spec.get('variants')
+    if variants:
+        names = sorted(variants)
+        if routing_text is None:
+            # Every variant is on the same endpoint, so any of them can stand in for status and start
+            model_key = names[0]
+        else:
+            point = zlib.crc32(routing_text.encode('utf-8')) % sum(variants.values())
+            for name in names:
+                point -= variants[name]
+                if point < 0:
+                    model_key = name
+                    break
+        spec = REGISTRY[model_key]
+
+    if spec.get('multiModel'):
+        return {
+            'modelKey': model_key,
+            'stateId': MULTI_MODEL_ID,
+            'sagemakerModelName': MULTI_MODEL_SAGEMAKER_MODEL_NAME,
+            'targetModel': spec.get('artifact', f"{model_key}.tar.gz"),
+            'namePrefix': MULTI_MODEL_ID,
+        }
+    return {
+        'modelKey': model_key,
+        'stateId': model_key,
+        'sagemakerModelName': spec.get('sagemakerModelName', SAGEMAKER_MODEL_NAME),
+        'targetModel': None,
+        'namePrefix': DEFAULT_NAME_PREFIX if model_key == MODEL_ID else model_key,
+    }
+
+
+def all_routes():
+    """One route per endpoint (state item) in the registry."""
+    routes = {}
+    for key, spec in REGISTRY.items():
+        if not spec.get('variants'):
+            route = resolve_model(key)
+            routes.setdefault(route['stateId'], route)
+    return list(routes.values())
+
+
+def model_version(route, sagemaker_model_name=None):
+    """
+    Identifies the model behind a route, e.g. for prediction cache keys. sagemaker_model_name
+    overrides the route's, e.g. with the model its endpoint was launched with.
+    """
+    sagemaker_model_name = sagemaker_model_name or route['sagemakerModelName']
+    if route['targetModel']:
+        return f"{sagemaker_model_name}/{route['targetModel']}"
+    return sagemaker_model_name or 'default'
+
+
+class ModelResidency:
+    """
+    Mirrors the LRU a multi-model endpoint uses to decide which artifacts stay loaded, to count
+    per-model loads, hits and evictions. Each Lambda environment sees only its own share of the
+    traffic, so the counts are an estimate; SageMaker's own ModelCacheHit and ModelLoadingTime
+    CloudWatch metrics are the ground truth.
+    """
+
+    def __init__(self, capacity=MULTI_MODEL_RESIDENT_MODELS):
+        self.capacity = capacity
+        self.endpoint_name = None
+        self.resident = OrderedDict()
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def _model_stats(self, target_model):
+        return self.stats.setdefault(target_model, {'hits': 0, 'loads': 0, 'evictions': 0, 'load_ms': 0})
+
+    def record(self, endpoint_name, target_model):
+        """Notes an invocation of target_model. Returns True if it was (probably) loaded for it."""
+        with self._lock:
+            if endpoint_name != self.endpoint_name:
+                # A new endpoint starts with nothing loaded
+                self.endpoint_name = endpoint_name
+                self.resident.clear()
+            if target_model in self.resident:
+                self.resident.move_to_end(target_model)
+                self._model_stats(target_model)['hits'] += 1
+                return False
+            self.resident[target_model] = True
+            self._model_stats(target_model)['loads'] += 1
+            while len(self.resident) > self.capacity:
+                evicted, _ = self.resident.popitem(last=False)
+                self._model_stats(evicted)['evictions'] += 1
+                print(f"Multi-model endpoint {endpoint_name}: {target_model} loaded, {evicted} likely evicted.")
+            return True
+
+    def record_load_time(self, target_model, milliseconds):
+        with self._lock:
+            self._model_stats(target_model)['load_ms'] += int(milliseconds)
+
+    def snapshot_stats(self):
+        with self._lock:
+            return {
+                'endpoint': self.endpoint_name,
+                'resident': list(self.resident),
+                'models': {name: dict(stats) for name, stats in self.stats.items()},
+            }
+
+
+# Module-level instance so the residency survives warm invocations
+multi_model_residency = ModelResidency()
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import threading
+import zlib
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+# How long a warm Lambda may reuse the SentimentModelState item before reading it again
+STATE_CACHE_TTL_SECONDS = float(os.environ.get('STATE_CACHE_TTL_SECONDS', '5'))
+# Extend the shutdown schedule at most once per window. 0 disables debouncing.
+KEEP_ALIVE_WINDOW_SECONDS = float(os.environ.get('KEEP_ALIVE_WINDOW_SECONDS', '300'))
+
+# Module-level state survives between warm invocations of the same execution environment
+_lock = threading.Lock()
+_snapshots = {}       # modelId -> (fetched_at, item)
+_last_keep_alive = {} # scheduleName -> time of the last extension this environment knows about
+
+
+def get_model_state(table, model_id, max_age=None):
+    """
+    Returns the SentimentModelState item for model_id, re-reading DynamoDB only when
+    the cached snapshot is older than STATE_CACHE_TTL_SECONDS.
+    """
+    max_age = STATE_CACHE_TTL_SECONDS if max_age is None else max_age
+    now = time.monotonic()
+    with _lock:
+        snapshot = _snapshots.get(model_id)
+        if snapshot and now - snapshot[0] < max_age:
+            return snapshot[1]
+
+    response = table.get_item(Key={'modelId': model_id})
+    item = response.get('Item', {})
+    with _lock:
+        _snapshots[model_id] = (now, item)
+    return item
+
+
+def invalidate_model_state(model_id=None):
+    """Drops the cached snapshot, e.g. after an endpoint call shows it is stale."""
+    with _lock:
+        if model_id is None:
+            _snapshots.clear()
+        else:
+            _snapshots.pop(model_id, None)
+
+
+def endpoint_arn_for(endpoint_name, context):
+    account_id = context.invoked_function_arn.split(':')[4]
+    return f"arn:aws:sagemaker:{os.environ['AWS_REGION']}:{account_id}:endpoint/{endpoint_name}"
+
+
+def recently_extended(schedule_name):
+    """True if this environment extended (or saw another environment extend) the schedule within the window."""
+    if KEEP_ALIVE_WINDOW_SECONDS <= 0:
+        return False
+    with _lock:
+        last = _last_keep_alive.get(schedule_name)
+    return last is not None and time.time() - last < KEEP_ALIVE_WINDOW_SECONDS
+
+
+def extend_shutdown_timer(table, lambda_client, timer_lambda_arn, model_id, schedule_name, endpoint_arn, idle_minutes=None):
+    """
+    Debounced keep-alive. Invokes the extend-shutdown-timer helper, which moves the shutdown to
+    idle_minutes from now (its default if None), at most once per KEEP_ALIVE_WINDOW_SECONDS across all execution environments:
+    the in-process timestamp filters most calls without any AWS traffic, and a
+    conditional write on lastKeepAliveAt picks a single winner among concurrent Lambdas.
+    Returns True if this call triggered an extension.
+    """
+    if recently_extended(schedule_name):
+        return False
+
+    now = time.time()
+    if KEEP_ALIVE_WINDOW_SECONDS > 0:
+        try:
+            table.update_item(
+                Key={'modelId': model_id},
+                UpdateExpression="SET lastKeepAliveAt = :now",
+                ConditionExpression="scheduleName = :s_name AND (attribute_not_exists(lastKeepAliveAt) OR lastKeepAliveAt < :cutoff)",
+                ExpressionAttributeValues={
+                    ':now': int(now),
+                    ':s_name': schedule_name,
+                    ':cutoff': int(now - KEEP_ALIVE_WINDOW_SECONDS),
+                }
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                # Another environment extended the schedule recently (or it was replaced)
+                with _lock:
+                    _last_keep_alive[schedule_name] = now
+                return False
+            raise
+
+    print(f"Invoking timer extension for schedule: {schedule_name}")
+    lambda_client.invoke(
+        FunctionName=timer_lambda_arn,
+        InvocationType='Event', # Fire and forget, no need to wait for response
+        Payload=json.dumps({'schedule_name': schedule_name, 'endpoint_arn': endpoint_arn, 'model_id': model_id,
+                            'idle_minutes': idle_minutes})
+    )
+    with _lock:
+        _last_keep_alive[schedule_name] = now
+    return True
+
+
+# --- Atomic state transitions ---
+
+# Subscribers are spread over this many items, so a burst of /start calls does not write to one hot key
+SUBSCRIBER_SHARDS = int(os.environ.get('SUBSCRIBER_SHARDS', '8'))
+
+_deserializer = TypeDeserializer()
+
+
+def transition_state(table, model_id, to_status=None, from_status=None, **attributes):
+    """
+    Sets endpointStatus to to_status (if given) and the other attributes in a single
+    conditional update_item. from_status is a status or tuple of statuses the item must be in;
+    a missing endpointStatus counts as STOPPED. Returns (True, item after the write), or
+    (False, current item) if the condition failed, so the caller never needs a follow-up get_item.
+    """
+    if to_status is not None:
+        attributes['endpointStatus'] = to_status
+    names = {f'#a{i}': name for i, name in enumerate(attributes)}
+    values = {f':a{i}': value for i, value in enumerate(attributes.values())}
+    kwargs = {}
+    if from_status is not None:
+        statuses = (from_status,) if isinstance(from_status, str) else tuple(from_status)
+        conditions = [f"#status = :from{i}" for i in range(len(statuses))]
+        if 'STOPPED' in statuses:
+            conditions.append("attribute_not_exists(#status)")
+        names['#status'] = 'endpointStatus'
+        values.update({f':from{i}': status for i, status in enumerate(statuses)})
+        kwargs = {'ConditionExpression': ' OR '.join(conditions), 'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'}
+
+    try:
+        response = table.update_item(
+            Key={'modelId': model_id},
+            UpdateExpression="SET " + ", ".join(f"#a{i} = :a{i}" for i in range(len(attributes))),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnValues='ALL_NEW',
+            **kwargs
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        # The failed check returns the current item in DynamoDB's wire format
+        item = {key: _deserializer.deserialize(value) for key, value in e.response.get('Item', {}).items()}
+        won = False
+    else:
+        won, item = True, response.get('Attributes', {})
+
+    with _lock:
+        _snapshots[model_id] = (time.monotonic(), item)
+    return won, item
+
+
+def _subscriber_shard_key(model_id, shard):
+    return {'modelId': f"{model_id}#subscribers#{shard}"}
+
+
+def add_subscriber(table, model_id, name, phone):
+    """
+    Records a subscriber in the shard item picked by their phone number. Each subscriber is
+    its own attribute, so the write is independent of everyone else's and a repeated /start
+    from the same phone replaces its entry instead of adding a second SMS.
+    """
+    shard = zlib.crc32(phone.encode('utf-8')) % SUBSCRIBER_SHARDS
+    table.update_item(
+        Key=_subscriber_shard_key(model_id, shard),
+        UpdateExpression="SET #p = :s",
+        ExpressionAttributeNames={'#p': f"phone:{phone}"},
+        ExpressionAttributeValues={':s': {'name': name, 'phone': phone}},
+    )
+
+
+def pop_subscribers(table, model_id):
+    """
+    Returns every subscriber and clears them. Each shard is deleted with ReturnValues=ALL_OLD,
+    so reading and clearing is one atomic step per shard: a subscriber added concurrently is
+    either returned here or left for the next start, never dropped.
+    """
+    subscribers = []
+    for shard in range(SUBSCRIBER_SHARDS):
+        response = table.delete_item(Key=_subscriber_shard_key(model_id, shard), ReturnValues='ALL_OLD')
+        subscribers.extend(value for key, value in response.get('Attributes', {}).items() if key.startswith('phone:'))
+    return subscribers
@@ -1,8 +1,17 @@
 import os
 import json
-import requests  # We will use the requests library to call the Textbelt API
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-import boto3
+import time
+from start_strategies import record_time_to_in_service
+from prediction_queue import get_prediction_queue, endpoint_scorer, drain_queue
+from prediction_cache import prediction_cache
+from model_state import transition_state, pop_subscribers
+from idle_policy import idle_timeout_minutes
+from instrumentation import instrumented, span, count, log_event
+from aws_clients import get_client, get_table
 
 # Get environment variables
 TABLE_NAME = os.environ.get('DYNAMODB_TABLE_NAME')
@@ -11,116 +20,208 @@ SHUTDOWN_LAMBDA_ARN = os.environ.get('SHUTDOWN_LAMBDA_ARN')
 SCHEDULER_ROLE_ARN = os.environ.get('SCHEDULER_ROLE_ARN')
 APP_URL = os.environ.get('APP_URL')
 # We now get the Textbelt API key from an environment variable for security
-TEXTBELT_API_KEY = os.environ.get('TEXTBELT_API_KEY') 
+TEXTBELT_API_KEY = os.environ.get('TEXTBELT_API_KEY')
+TEXTBELT_URL = os.environ.get('TEXTBELT_URL', 'https://textbelt.com/text')
+ENDPOINT_BATCH_SIZE = int(os.environ.get('ENDPOINT_BATCH_SIZE', '32'))
+# Stop draining the prediction queue when less than this much Lambda time is left
+DRAIN_TIME_MARGIN_SECONDS = int(os.environ.get('DRAIN_TIME_MARGIN_SECONDS', '30'))
 
-# Initialize AWS clients (we no longer need SNS client)
-dynamodb = boto3.resource('dynamodb')
-scheduler_client = boto3.client('scheduler')
-table = dynamodb.Table(TABLE_NAME)
+# SMS delivery settings
+SMS_MAX_WORKERS = int(os.environ.get('SMS_MAX_WORKERS', '16'))
+SMS_CONNECT_TIMEOUT_SECONDS = float(os.environ.get('SMS_CONNECT_TIMEOUT_SECONDS', '3'))
+SMS_READ_TIMEOUT_SECONDS = float(os.environ.get('SMS_READ_TIMEOUT_SECONDS', '10'))
+SMS_MAX_ATTEMPTS = int(os.environ.get('SMS_MAX_ATTEMPTS', '3'))
+SMS_BACKOFF_SECONDS = float(os.environ.get('SMS_BACKOFF_SECONDS', '0.5'))
 
+# AWS clients are built on first use by aws_clients (we no longer need SNS client)
+prediction_queue = get_prediction_queue()
+
+# Kept at module level so warm invocations reuse the pooled connections and worker threads.
+# requests is only imported, and the session built, once there is an SMS to send.
+_http_session = None
+_http_session_lock = threading.Lock()
+sms_executor = ThreadPoolExecutor(max_workers=SMS_MAX_WORKERS)
+
+@instrumented('in-service')
 def lambda_handler(event, context):
     """
     Triggered by EventBridge when a SageMaker endpoint becomes IN_SERVICE.
-    Notifies subscribed users via Textbelt and schedules the endpoint shutdown.
+    Schedules the endpoint shutdown and notifies subscribed users via Textbelt.
     """
     try:
-        print(f"Received event: {json.dumps(event)}")
-        
+        log_event(event)
+
         endpoint_arn = event['resources'][0]
         endpoint_name = endpoint_arn.split('/')[-1]
-        print(f"Endpoint {endpoint_name} is now IN_SERVICE.")
+        # start_strategies.launch_endpoint tags each endpoint with the modelId of its state item
+        model_id = (event.get('detail', {}).get('Tags') or {}).get('modelId') or MODEL_ID
+        print(f"Endpoint {endpoint_name} ({model_id}) is now IN_SERVICE.")
 
-        # --- 1. Get User Info and update state ---
-        table.update_item(
-            Key={'modelId': MODEL_ID},
-            UpdateExpression="SET endpointStatus = :status",
-            ExpressionAttributeValues={':status': 'IN_SERVICE'}
-        )
-        
-        response = table.get_item(Key={'modelId': MODEL_ID})
-        item = response.get('Item', {})
-        subscribers = item.get('subscribers', [])
-        
+        # --- 1. Update state and get user info ---
+        # ReturnValues gives back the item as written, so no separate get_item is needed
+        table = get_table(TABLE_NAME)
+        with span('transition'):
+            _, item = transition_state(table, model_id, 'IN_SERVICE')
+        # Reading and clearing the subscriber shards is one atomic delete per shard
+        with span('subscribers'):
+            subscribers = pop_subscribers(table, model_id)
+        strategy = item.get('startStrategy', 'on-demand')
+
+        # Record how long this start took, so the start strategies can be compared
+        if item.get('startRequestedAt'):
+            try:
+                record_time_to_in_service(table, model_id, strategy, time.time() - float(item['startRequestedAt']),
+                                          prewarmed=bool(item.get('prewarmed')))
+            except Exception as e:
+                print(f"Could not record time to InService: {e}")
+
+        # --- 2. Schedule the shutdown after the idle policy's timeout ---
+        # Done before any SMS goes out, so a slow SMS provider can never leave the endpoint running unscheduled
+        if strategy == 'serverless':
+            # A serverless endpoint scales to zero on its own and is never deleted
+            print("Serverless endpoint: no shutdown schedule needed.")
+            idle_minutes = None
+        else:
+            with span('schedule'):
+                idle_minutes = schedule_shutdown(endpoint_name, model_id)
+
+        # --- 3. Send SMS Notifications via Textbelt API ---
         if not subscribers:
             print("No subscribers to notify.")
         else:
             print(f"Found {len(subscribers)} subscribers to notify.")
-        
-        # --- 2. Send SMS Notifications via Textbelt API ---
-        for subscriber in subscribers:
-            user_name = subscriber.get('name', 'there')
-            user_phone = subscriber.get('phone')
-            
-            if user_phone:
-                message = (
-                    f"Hi {user_name}. Bob Seamon's sentiment analysis model is now "
-                    f"available for use for the next 30 minutes "
-                    f"here: {APP_URL}"
-                )
-                try:
-                    # Make the POST request to the Textbelt API
-                    textbelt_response = requests.post('https://textbelt.com/text', {
-                        'phone': user_phone,
-                        'message': message,
-                        'key': TEXTBELT_API_KEY,
-                    })
-                    
-                    # Log the response from Textbelt for debugging
-                    print(f"Textbelt API response: {textbelt_response.json()}")
-
-                    if textbelt_response.json().get("success"):
-                        print(f"Successfully sent SMS to {user_phone} via Textbelt.")
-                    else:
-                        print(f"ERROR: Textbelt API indicated failure for {user_phone}.")
-
-                except requests.exceptions.RequestException as e:
-                    print(f"ERROR: Failed to call Textbelt API for {user_phone}. Reason: {str(e)}")
-
-        # --- 3. Clean up the subscribers list ---
-        table.update_item(
-            Key={'modelId': MODEL_ID},
-            UpdateExpression="SET subscribers = :empty_list",
-            ExpressionAttributeValues={':empty_list': []}
-        )
-        print("Subscribers list has been cleared.")
-
-        # --- 4. Schedule the 30-minute shutdown ---
-        shutdown_time = datetime.utcnow() + timedelta(minutes=30)
-        schedule_time_str = shutdown_time.strftime('%Y-%m-%dT%H:%M:%S')
-
-        print(f"Scheduling shutdown for {schedule_time_str} UTC.")
-        print(f"Scheduler details: ")
-        print(f"Arn:  {SHUTDOWN_LAMBDA_ARN}")
-        print(f"RoleArn: {SCHEDULER_ROLE_ARN}")
-        print(f"Endpoint Name: {endpoint_name}")
-
-        create_schedule_response = scheduler_client.create_schedule(
-            Name=f'shutdown-schedule-{endpoint_name}',
-            GroupName='default',
-            ActionAfterCompletion='DELETE',
-            ScheduleExpression=f'at({schedule_time_str})',
-            FlexibleTimeWindow={'Mode': 'OFF'},
-            Target={
-                'Arn': SHUTDOWN_LAMBDA_ARN,
-                'RoleArn': SCHEDULER_ROLE_ARN,
-                'Input': json.dumps({'endpoint_name': endpoint_name})
-            }
-        )
+            with span('sms'):
+                sent = sum(sms_executor.map(lambda subscriber: notify_subscriber(subscriber, idle_minutes), subscribers))
+            print(f"Sent {sent} of {len(subscribers)} SMS notifications.")
+            count('subscribers', len(subscribers))
+            count('smsSent', sent)
 
-        schedule_name = f'shutdown-schedule-{endpoint_name}'
-        # Save the name of the schedule to our state machine
-        table.update_item(
-            Key={'modelId': MODEL_ID},
-            UpdateExpression="SET scheduleName = :s_name",
-            ExpressionAttributeValues={':s_name': schedule_name}
-        )
-        print(f"Saved schedule name {schedule_name} to DynamoDB.")
+        # --- 4. Score predictions queued during the cold start ---
+        with span('drain'):
+            drain_prediction_queue(endpoint_name, model_id, context)
 
-        schedule_arn = create_schedule_response.get('ScheduleArn') # Get the ARN
-        print(f"Successfully created one-time shutdown schedule with ARN: {schedule_arn}")
-            
-        return {'statusCode': 200, 'body': json.dumps('Notification (via Textbelt) and shutdown scheduling complete.')}
+        return {'statusCode': 200, 'body': json.dumps('Shutdown scheduling and notification (via Textbelt) complete.')}
 
     except Exception as e:
         print(f"FATAL ERROR: {str(e)}")
-        raise e
\ No newline at end of file
+        raise e
+
+def schedule_shutdown(endpoint_name, model_id):
+    """
+    Creates the one-time shutdown schedule and saves its name to the state item.
+    Returns the idle timeout in minutes.
+    """
+    table = get_table(TABLE_NAME)
+    idle_minutes = idle_timeout_minutes(table, model_id)
+    shutdown_time = datetime.utcnow() + timedelta(minutes=idle_minutes)
+    schedule_time_str = shutdown_time.strftime('%Y-%m-%dT%H:%M:%S')
+
+    print(f"Scheduling shutdown for {schedule_time_str} UTC.")
+    print(f"Scheduler details: ")
+    print(f"Arn:  {SHUTDOWN_LAMBDA_ARN}")
+    print(f"RoleArn: {SCHEDULER_ROLE_ARN}")
+    print(f"Endpoint Name: {endpoint_name}")
+
+    schedule_name = f'shutdown-schedule-{endpoint_name}'
+    create_schedule_response = get_client('scheduler').create_schedule(
+        Name=schedule_name,
+        GroupName='default',
+        ActionAfterCompletion='DELETE',
+        ScheduleExpression=f'at({schedule_time_str})',
+        FlexibleTimeWindow={'Mode': 'OFF'},
+        Target={
+            'Arn': SHUTDOWN_LAMBDA_ARN,
+            'RoleArn': SCHEDULER_ROLE_ARN,
+            'Input': json.dumps({'endpoint_name': endpoint_name, 'model_id': model_id})
+        }
+    )
+
+    # Save the name of the schedule to our state machine
+    transition_state(table, model_id, scheduleName=schedule_name)
+    print(f"Saved schedule name {schedule_name} to DynamoDB.")
+
+    schedule_arn = create_schedule_response.get('ScheduleArn') # Get the ARN
+    print(f"Successfully created one-time shutdown schedule with ARN: {schedule_arn}")
+    return idle_minutes
+
+def get_http_session():
+    """The pooled session for the Textbelt API, built on first use."""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            import requests  # We will use the requests library to call the Textbelt API
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=SMS_MAX_WORKERS))
+            session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=SMS_MAX_WORKERS))
+            _http_session = session
+    return _http_session
+
+def notify_subscriber(subscriber, idle_minutes=None):
+    """
+    Sends one SMS through the pooled session. Connection failures, 429s and 5xx responses are
+    retried with exponential backoff and jitter. Read timeouts are not retried, since the
+    message may already have been sent. Returns True on success.
+    """
+    user_name = subscriber.get('name', 'there')
+    user_phone = subscriber.get('phone')
+    if not user_phone:
+        return False
+    http_session = get_http_session()
+    from requests.exceptions import ReadTimeout, RequestException
+
+    availability = f"for the next {idle_minutes:g} minutes " if idle_minutes else ""
+    message = (
+        f"Hi {user_name}. Bob Seamon's sentiment analysis model is now "
+        f"available for use {availability}"
+        f"here: {APP_URL}"
+    )
+    for attempt in range(1, SMS_MAX_ATTEMPTS + 1):
+        try:
+            # Make the POST request to the Textbelt API
+            textbelt_response = http_session.post(TEXTBELT_URL, {
+                'phone': user_phone,
+                'message': message,
+                'key': TEXTBELT_API_KEY,
+            }, timeout=(SMS_CONNECT_TIMEOUT_SECONDS, SMS_READ_TIMEOUT_SECONDS))
+
+            if textbelt_response.status_code == 429 or textbelt_response.status_code >= 500:
+                reason = f"HTTP {textbelt_response.status_code}"
+            else:
+                result = textbelt_response.json()
+                # Log the response from Textbelt for debugging
+                print(f"Textbelt API response for {user_phone}: {result}")
+                if result.get("success"):
+                    print(f"Successfully sent SMS to {user_phone} via Textbelt.")
+                    return True
+                print(f"ERROR: Textbelt API indicated failure for {user_phone}.")
+                return False
+
+        except ReadTimeout:
+            print(f"ERROR: Textbelt API timed out for {user_phone}. Not retrying in case it was sent.")
+            return False
+        except (RequestException, ValueError) as e:
+            reason = str(e)
+
+        if attempt < SMS_MAX_ATTEMPTS:
+            time.sleep(SMS_BACKOFF_SECONDS * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+    print(f"ERROR: Failed to call Textbelt API for {user_phone} after {SMS_MAX_ATTEMPTS} attempts. Reason: {reason}")
+    return False
+
+def drain_prediction_queue(endpoint_name, model_id, context):
+    """Scores the /predict jobs queued for this endpoint in endpoint-sized batches. Failures are logged, not raised."""
+    if not prediction_queue:
+        return
+    try:
+        completed, failed = drain_queue(
+            prediction_queue,
+            endpoint_scorer(get_client('sagemaker-runtime'), endpoint_name),
+            ENDPOINT_BATCH_SIZE,
+            should_continue=lambda: context.get_remaining_time_in_millis() > DRAIN_TIME_MARGIN_SECONDS * 1000,
+            queue_key=model_id,
+            cache=prediction_cache,
+        )
+        print(f"Drained prediction queue: {completed} jobs scored, {failed} failed.")
+    except Exception as e:
+        # Jobs left QUEUED are scored when their /result is polled
+        print(f"ERROR draining prediction queue: {str(e)}")
@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from botocore.exceptions import ClientError
+from aws_clients import get_resource
+
+# Get environment variables
+CACHE_TABLE_NAME = os.environ.get('PREDICTION_CACHE_TABLE') # Optional shared tier
+CACHE_MAX_ENTRIES = int(os.environ.get('PREDICTION_CACHE_SIZE', '4096'))
+CACHE_TTL_SECONDS = int(os.environ.get('PREDICTION_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+
+# DynamoDB's BatchGetItem accepts at most 100 keys per request
+BATCH_GET_LIMIT = 100
+
+
+def normalize_text(text):
+    """Normalizes a review so trivially different copies share a cache entry.
+    The model is uncased, so lower-casing does not change its prediction."""
+    text = unicodedata.normalize('NFC', text)
+    return ' '.join(text.split()).lower()
+
+
+def current_model_version():
+    """The model version is part of every cache key, so a new model never sees old predictions."""
+    return os.environ.get('SAGEMAKER_MODEL_NAME') or 'default'
+
+
+class PredictionCache:
+    """
+    Content-addressed prediction cache with two tiers:
+    an in-process LRU that survives warm Lambda invocations, and an optional
+    DynamoDB table (with a TTL attribute) shared by every execution environment.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, table_name=CACHE_TABLE_NAME, ttl_seconds=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.table_name = table_name
+        self.ttl_seconds = ttl_seconds
+        self.model_version = current_model_version()
+        self.entries = OrderedDict()
+        self.stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'invalidations': 0}
+        self._lock = threading.Lock()
+
+    def key_for(self, text, model_version=None):
+        digest = hashlib.sha256(f"{model_version or self.model_version}\x00{normalize_text(text)}".encode('utf-8'))
+        return digest.hexdigest()
+
+    def _check_model_version(self):
+        # Drop everything held in memory if the model behind the endpoint has changed
+        version = current_model_version()
+        if version != self.model_version:
+            print(f"Model version changed from {self.model_version} to {version}. Invalidating prediction cache.")
+            self.model_version = version
+            self.entries.clear()
+            self.stats['invalidations'] += 1
+
+    def get_many(self, texts, model_version=None):
+        """
+        Returns {index: prediction} for every text in `texts` found in either tier.
+        model_version overrides SAGEMAKER_MODEL_NAME for deployments serving several models.
+        """
+        found, keys = {}, {}
+        with self._lock:
+            self._check_model_version()
+            for index, text in enumerate(texts):
+                if not isinstance(text, str) or not text.strip():
+                    continue
+                key = self.key_for(text, model_version)
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    found[index] = self.entries[key]
+                    self.stats['local_hits'] += 1
+                else:
+                    keys.setdefault(key, []).append(index)
+
+        if keys and self.table_name:
+            for key, prediction in self._get_shared(list(keys)).items():
+                for index in keys.pop(key):
+                    found[index] = prediction
+                with self._lock:
+                    self._remember(key, prediction)
+                    self.stats['shared_hits'] += 1
+
+        with self._lock:
+            self.stats['misses'] += sum(len(indices) for indices in keys.values())
+        return found
+
+    def put_many(self, predictions, model_version=None):
+        """Stores {text: prediction} in both tiers."""
+        if not predictions:
+            return
+        keyed = {}
+        with self._lock:
+            self._check_model_version()
+            for text, prediction in predictions.items():
+                if not isinstance(text, str):
+                    continue
+                key = self.key_for(text, model_version)
+                self._remember(key, prediction)
+                keyed[key] = prediction
+
+        if self.table_name:
+            self._put_shared(keyed, model_version or self.model_version)
+
+    def _remember(self, key, prediction):
+        self.entries[key] = prediction
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _get_shared(self, keys):
+        found = {}
+        now = int(time.time())
+        try:
+            for start in range(0, len(keys), BATCH_GET_LIMIT):
+                request = {self.table_name: {'Keys': [{'cacheKey': k} for k in keys[start:start + BATCH_GET_LIMIT]]}}
+                response = get_resource('dynamodb').batch_get_item(RequestItems=request)
+                for item in response.get('Responses', {}).get(self.table_name, []):
+                    # DynamoDB TTL deletes lazily, so expired items can still be returned
+                    if int(item.get('expiresAt', 0)) > now:
+                        found[item['cacheKey']] = json.loads(item['prediction'])
+        except ClientError as e:
+            print(f"WARNING: Could not read shared prediction cache. Error: {e}")
+        return found
+
+    def _put_shared(self, keyed, model_version):
+        expires_at = int(time.time()) + self.ttl_seconds
+        try:
+            with get_resource('dynamodb').Table(self.table_name).batch_writer() as writer:
+                for key, prediction in keyed.items():
+                    writer.put_item(Item={
+                        'cacheKey': key,
+                        'modelVersion': model_version,
+                        # Stored as a JSON string so float scores don't need Decimal conversion
+                        'prediction': json.dumps(prediction),
+                        'expiresAt': expires_at,
+                    })
+        except ClientError as e:
+            print(f"WARNING: Could not write shared prediction cache. Error: {e}")
+
+    def snapshot_stats(self):
+        with self._lock:
+            stats = dict(self.stats, entries=len(self.entries), model_version=self.model_version)
+        lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['local_hits'] + stats['shared_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+# Module-level instance so the LRU tier is shared by warm invocations
+prediction_cache = PredictionCache()
@@ -0,0 +1,354 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import contextmanager
+from botocore.exceptions import ClientError
+from aws_clients import get_table
+
+# DynamoDB table holding queued prediction jobs (partition key `jobId`, TTL attribute `expiresAt`)
+# with a sparse GSI on queueStatus/createdAt, so draining reads only jobs that are still queued.
+PREDICTION_QUEUE_TABLE = os.environ.get('PREDICTION_QUEUE_TABLE')
+PREDICTION_QUEUE_INDEX = os.environ.get('PREDICTION_QUEUE_INDEX', 'queueStatus-createdAt-index')
+# Local stand-in for the table, e.g. for local-inference/ or benchmarks. Not shared between Lambdas.
+PREDICTION_QUEUE_SQLITE_PATH = os.environ.get('PREDICTION_QUEUE_SQLITE_PATH')
+PREDICTION_QUEUE_TTL_SECONDS = int(os.environ.get('PREDICTION_QUEUE_TTL_SECONDS', '86400'))
+# DynamoDB items are capped at 400 KB
+MAX_QUEUED_BYTES = int(os.environ.get('MAX_QUEUED_BYTES', '350000'))
+# Jobs are queued per endpoint (the modelId of its state item); the default model's jobs use the plain 'QUEUED' partition
+DEFAULT_QUEUE_KEY = os.environ.get('MODEL_ID')
+
+
+class QueueFullError(Exception):
+    """The job is too large to be stored in the queue."""
+
+
+def _queue_partition(queue_key):
+    return 'QUEUED' if queue_key in (None, DEFAULT_QUEUE_KEY) else f"QUEUED#{queue_key}"
+
+
+def _encode_extras(target_models, parameters, cache_versions, answered):
+    """The optional JSON fields of a job, checked against MAX_QUEUED_BYTES together with its texts."""
+    return {name: json.dumps(value) if value else None for name, value in (
+        ('targetModels', target_models), ('parameters', parameters), ('cacheVersions', cache_versions), ('answered', answered))}
+
+
+def _check_size(payload, extras):
+    if len(payload.encode('utf-8')) + sum(len(value.encode('utf-8')) for value in extras.values() if value) > MAX_QUEUED_BYTES:
+        raise QueueFullError(f"Queued texts are limited to {MAX_QUEUED_BYTES} bytes.")
+
+
+def _decode_extras(values):
+    return {name: json.loads(value) if value else None for name, value in values.items()}
+
+
+class DynamoPredictionQueue:
+    """
+    Job lifecycle: QUEUED -> RUNNING -> DONE or FAILED. queueStatus is only set while a job is
+    QUEUED, so the GSI holds exactly the backlog, partitioned by endpoint. Results are stored
+    as a JSON string because DynamoDB does not accept Python floats.
+    """
+
+    def __init__(self, table, index_name=PREDICTION_QUEUE_INDEX):
+        # A table name is resolved on first use, so importing a handler builds no DynamoDB resource
+        self._table = table
+        self.index_name = index_name
+
+    @property
+    def table(self):
+        if isinstance(self._table, str):
+            self._table = get_table(self._table)
+        return self._table
+
+    def enqueue(self, texts, is_batch, queue_key=None, model=None, target_model=None, target_models=None,
+                parameters=None, cache_versions=None, answered=None):
+        """
+        Queues texts for scoring and returns the job ID. target_models (one per text) splits a job
+        between A/B variants; parameters are passed to the endpoint; cache_versions (one per text)
+        are the prediction cache versions to store the results under; answered holds the results of
+        a batch that need no scoring (cache hits and per-item errors), with None for each queued
+        text, in request order.
+        """
+        payload = json.dumps(texts)
+        extras = _encode_extras(target_models, parameters, cache_versions, answered)
+        _check_size(payload, extras)
+        job_id = str(uuid.uuid4())
+        now = int(time.time() * 1000)
+        item = {
+            'jobId': job_id,
+            'jobStatus': 'QUEUED',
+            'queueStatus': _queue_partition(queue_key),
+            'textsJson': payload,
+            'isBatch': is_batch,
+            'createdAt': now,
+            'expiresAt': now // 1000 + PREDICTION_QUEUE_TTL_SECONDS,
+        }
+        for name, value in (('queueKey', queue_key), ('model', model), ('targetModel', target_model)):
+            if value:
+                item[name] = value
+        for name, value in extras.items():
+            if value:
+                item[f"{name}Json"] = value
+        self.table.put_item(Item=item)
+        return job_id
+
+    def get(self, job_id):
+        item = self.table.get_item(Key={'jobId': job_id}).get('Item')
+        return _job_from_item(item) if item else None
+
+    def list_queued(self, limit=100, queue_key=None):
+        response = self.table.query(
+            IndexName=self.index_name,
+            KeyConditionExpression="queueStatus = :q",
+            ExpressionAttributeValues={':q': _queue_partition(queue_key)},
+            Limit=limit,
+        )
+        return [_job_from_item(item) for item in response.get('Items', [])]
+
+    def claim(self, job_id):
+        """Moves a job from QUEUED to RUNNING. Returns False if another drainer got it first."""
+        try:
+            self.table.update_item(
+                Key={'jobId': job_id},
+                UpdateExpression="SET jobStatus = :running REMOVE queueStatus",
+                ConditionExpression="jobStatus = :queued",
+                ExpressionAttributeValues={':running': 'RUNNING', ':queued': 'QUEUED'},
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+
+    def complete(self, job_id, results):
+        self.table.update_item(
+            Key={'jobId': job_id},
+            UpdateExpression="SET jobStatus = :done, resultsJson = :r",
+            ExpressionAttributeValues={':done': 'DONE', ':r': json.dumps(results)},
+        )
+
+    def fail(self, job_id, error):
+        self.table.update_item(
+            Key={'jobId': job_id},
+            UpdateExpression="SET jobStatus = :failed, #err = :e",
+            ExpressionAttributeNames={'#err': 'error'},
+            ExpressionAttributeValues={':failed': 'FAILED', ':e': error},
+        )
+
+
+def _job_from_item(item):
+    return {
+        'jobId': item['jobId'],
+        'status': item['jobStatus'],
+        'texts': json.loads(item['textsJson']),
+        'isBatch': bool(item.get('isBatch')),
+        'createdAt': int(item['createdAt']),
+        'results': json.loads(item['resultsJson']) if item.get('resultsJson') else None,
+        'error': item.get('error'),
+        'queueKey': item.get('queueKey'),
+        'model': item.get('model'),
+        'targetModel': item.get('targetModel'),
+        **_decode_extras({name: item.get(f"{name}Json") for name in ('targetModels', 'parameters', 'cacheVersions', 'answered')}),
+    }
+
+
+# The optional JSON columns, in the order of _encode_extras
+EXTRA_COLUMNS = "target_models, parameters, cache_versions, answered"
+JOB_COLUMNS = f"job_id, status, texts, is_batch, created_at, results, error, queue_partition, model, target_model, {EXTRA_COLUMNS}"
+
+
+class SQLitePredictionQueue:
+    """The same queue on a local SQLite file, for running the Lambdas outside AWS."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, status TEXT NOT NULL, texts TEXT NOT NULL, "
+                "is_batch INTEGER NOT NULL, created_at INTEGER NOT NULL, results TEXT, error TEXT, "
+                "queue_partition TEXT NOT NULL DEFAULT 'QUEUED', model TEXT, target_model TEXT, target_models TEXT, "
+                "parameters TEXT, cache_versions TEXT, answered TEXT)"
+            )
+            # Files created by earlier versions lack the routing and caching columns
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(jobs)")}
+            for column, definition in (('queue_partition', "TEXT NOT NULL DEFAULT 'QUEUED'"), ('model', 'TEXT'),
+                                       ('target_model', 'TEXT'), ('target_models', 'TEXT'), ('parameters', 'TEXT'),
+                                       ('cache_versions', 'TEXT'), ('answered', 'TEXT')):
+                if column not in columns:
+                    connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+            connection.execute("DROP INDEX IF EXISTS jobs_queued")
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_queued_by_key ON jobs (status, queue_partition, created_at)")
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:  # commits, or rolls back on error
+                yield connection
+        finally:
+            connection.close()
+
+    def enqueue(self, texts, is_batch, queue_key=None, model=None, target_model=None, target_models=None,
+                parameters=None, cache_versions=None, answered=None):
+        payload = json.dumps(texts)
+        extras = _encode_extras(target_models, parameters, cache_versions, answered)
+        # Same limit as the DynamoDB backend, so a job that queues locally also queues in AWS
+        _check_size(payload, extras)
+        job_id = str(uuid.uuid4())
+        with self._lock, self._connect() as connection:
+            connection.execute(
+                f"INSERT INTO jobs (job_id, status, texts, is_batch, created_at, queue_partition, model, target_model, {EXTRA_COLUMNS}) "
+                "VALUES (?, 'QUEUED', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, payload, int(is_batch), int(time.time() * 1000),
+                 _queue_partition(queue_key), model, target_model, *extras.values()),
+            )
+        return job_id
+
+    def get(self, job_id):
+        with self._lock, self._connect() as connection:
+            row = connection.execute(
+                f"SELECT {JOB_COLUMNS} FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return _job_from_row(row) if row else None
+
+    def list_queued(self, limit=100, queue_key=None):
+        with self._lock, self._connect() as connection:
+            rows = connection.execute(
+                f"SELECT {JOB_COLUMNS} FROM jobs "
+                "WHERE status = 'QUEUED' AND queue_partition = ? ORDER BY created_at LIMIT ?", (_queue_partition(queue_key), limit)
+            ).fetchall()
+        return [_job_from_row(row) for row in rows]
+
+    def claim(self, job_id):
+        with self._lock, self._connect() as connection:
+            cursor = connection.execute("UPDATE jobs SET status = 'RUNNING' WHERE job_id = ? AND status = 'QUEUED'", (job_id,))
+            return cursor.rowcount == 1
+
+    def complete(self, job_id, results):
+        with self._lock, self._connect() as connection:
+            connection.execute("UPDATE jobs SET status = 'DONE', results = ? WHERE job_id = ?", (json.dumps(results), job_id))
+
+    def fail(self, job_id, error):
+        with self._lock, self._connect() as connection:
+            connection.execute("UPDATE jobs SET status = 'FAILED', error = ? WHERE job_id = ?", (error, job_id))
+
+
+def _job_from_row(row):
+    job_id, status, texts, is_batch, created_at, results, error, queue_partition, model, target_model, *extras = row
+    return {
+        'jobId': job_id,
+        'status': status,
+        'texts': json.loads(texts),
+        'isBatch': bool(is_batch),
+        'createdAt': created_at,
+        'results': json.loads(results) if results else None,
+        'error': error,
+        'queueKey': None if queue_partition == 'QUEUED' else queue_partition.split('#', 1)[1],
+        'model': model,
+        'targetModel': target_model,
+        **_decode_extras(dict(zip(('targetModels', 'parameters', 'cacheVersions', 'answered'), extras))),
+    }
+
+
+def get_prediction_queue():
+    """The configured queue backend, or None when queueing is disabled."""
+    if PREDICTION_QUEUE_TABLE:
+        return DynamoPredictionQueue(PREDICTION_QUEUE_TABLE)
+    if PREDICTION_QUEUE_SQLITE_PATH:
+        return SQLitePredictionQueue(PREDICTION_QUEUE_SQLITE_PATH)
+    return None
+
+
+def endpoint_scorer(sagemaker_runtime, endpoint_name):
+    """
+    A score_texts function that sends one batch of texts to the SageMaker endpoint,
+    to target_model if it is a multi-model endpoint, with the job's inference parameters if any.
+    """
+    def score_texts(texts, target_model=None, parameters=None):
+        kwargs = {'TargetModel': target_model} if target_model else {}
+        response = sagemaker_runtime.invoke_endpoint(
+            EndpointName=endpoint_name,
+            ContentType="application/json",
+            Body=json.dumps({"inputs": texts, "parameters": parameters} if parameters else {"inputs": texts}),
+            **kwargs
+        )
+        return json.loads(response["Body"].read().decode())
+    return score_texts
+
+
+def drain_queue(queue, score_texts, batch_size, should_continue=lambda: True, page_size=100, queue_key=None, cache=None):
+    """
+    Scores the jobs queued for one endpoint until there are none left or should_continue() returns False.
+    Returns (jobs completed, jobs failed).
+    """
+    completed = failed = 0
+    while should_continue():
+        jobs = [job for job in queue.list_queued(limit=page_size, queue_key=queue_key) if queue.claim(job['jobId'])]
+        if not jobs:
+            break
+        done, errored = score_jobs(queue, jobs, score_texts, batch_size, cache=cache)
+        completed += done
+        failed += errored
+    return completed, failed
+
+
+def score_jobs(queue, jobs, score_texts, batch_size, cache=None):
+    """
+    Scores already-claimed jobs and stores their results. Texts from several jobs for the same
+    target model (per text, for a job split between A/B variants) and parameters are packed into
+    endpoint calls of up to batch_size texts, and score_texts(texts, target_model, parameters)
+    must return one prediction per text. A failed call fails only the jobs that had texts in it.
+    Results of jobs with cacheVersions are also stored in cache, a PredictionCache.
+    Returns (jobs completed, jobs failed).
+    """
+    predictions = {job['jobId']: [None] * len(job['texts']) for job in jobs}
+    errors = {}
+    groups = {}
+    for job in jobs:
+        target_models = job.get('targetModels') or [job.get('targetModel')] * len(job['texts'])
+        parameters = job.get('parameters') or None
+        for index, text in enumerate(job['texts']):
+            key = (target_models[index], json.dumps(parameters, sort_keys=True))
+            groups.setdefault(key, (target_models[index], parameters, []))[2].append((job['jobId'], index, text))
+    chunks = [(target_model, parameters, flat[start:start + batch_size])
+              for target_model, parameters, flat in groups.values() for start in range(0, len(flat), batch_size)]
+    for target_model, parameters, chunk in chunks:
+        chunk = [entry for entry in chunk if entry[0] not in errors]
+        if not chunk:
+            continue
+        try:
+            scored = score_texts([text for _, _, text in chunk], target_model, parameters)
+            if not isinstance(scored, list) or len(scored) != len(chunk):
+                raise ValueError(f"Expected {len(chunk)} predictions.")
+        except Exception as e:
+            print(f"ERROR scoring queued chunk of {len(chunk)} texts: {str(e)}")
+            for job_id, _, _ in chunk:
+                errors[job_id] = str(e)
+            continue
+        for (job_id, index, _), prediction in zip(chunk, scored):
+            predictions[job_id][index] = prediction
+
+    for job in jobs:
+        if job['jobId'] in errors:
+            queue.fail(job['jobId'], errors[job['jobId']])
+            continue
+        queue.complete(job['jobId'], predictions[job['jobId']])
+        if cache is not None and job.get('cacheVersions'):
+            cache_results(cache, job, predictions[job['jobId']])
+    return len(jobs) - len(errors), len(errors)
+
+
+def cache_results(cache, job, predictions):
+    """Stores a scored job's predictions in the prediction cache, so the same reviews are not queued again."""
+    by_version = {}
+    for text, version, prediction in zip(job['texts'], job['cacheVersions'], predictions):
+        by_version.setdefault(version, {})[text] = prediction
+    try:
+        for version, entries in by_version.items():
+            cache.put_many(entries, version)
+    except Exception as e:
+        # The results are stored on the job already; a cache miss only costs a later endpoint call
+        print(f"Could not cache the results of job {job['jobId']}: {str(e)}")
@@ -0,0 +1,65 @@
+import os
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from start_strategies import START_STRATEGY, PREWARM_THRESHOLD, launch_endpoint, start_probability
+from model_state import transition_state
+from model_registry import all_routes
+from instrumentation import instrumented, count
+from aws_clients import get_client, get_table
+
+# Get environment variables
+TABLE_NAME = os.environ.get('DYNAMODB_TABLE_NAME')
+INSTANCE_TYPE = os.environ.get('INSTANCE_TYPE')
+# Start this far ahead of a likely /start, roughly one cold start
+PREWARM_LEAD_MINUTES = int(os.environ.get('PREWARM_LEAD_MINUTES', '15'))
+
+@instrumented('prewarm')
+def lambda_handler(event, context):
+    """
+    Triggered by an EventBridge schedule (e.g. rate(15 minutes)).
+    Starts each endpoint in the model registry ahead of time when its /start history says a
+    user is likely to ask for it soon. The normal 30-minute idle shutdown applies, so a wrong
+    guess costs at most one idle window.
+    """
+    try:
+        target_time = datetime.now(timezone.utc) + timedelta(minutes=PREWARM_LEAD_MINUTES)
+        results = {route['stateId']: prewarm(route, target_time) for route in all_routes()}
+        count('prewarmed', sum(result['prewarmed'] for result in results.values()))
+        return {'statusCode': 200, 'body': json.dumps(results)}
+
+    except Exception as e:
+        print(f"FATAL ERROR: {str(e)}")
+        raise e
+
+def prewarm(route, target_time):
+    """Starts one endpoint if a start in the target hour is likely and it is STOPPED."""
+    model_id = route['stateId']
+    table = get_table(TABLE_NAME)
+    probability = start_probability(table, model_id, target_time)
+    print(f"{model_id}: start probability for {target_time.strftime('%a %H:00')} UTC: {probability:.2f} (threshold {PREWARM_THRESHOLD})")
+
+    if probability < PREWARM_THRESHOLD:
+        return {'prewarmed': False, 'probability': probability}
+
+    # --- Same race-safe transition as start-model-service.py ---
+    start_requested_at = time.time()
+    won, state = transition_state(
+        table, model_id, 'CREATING', from_status='STOPPED',
+        startRequestedAt=int(start_requested_at), startStrategy=START_STRATEGY, prewarmed=True,
+        sagemakerModelName=route['sagemakerModelName']
+    )
+    if not won:
+        print(f"{model_id}: endpoint is {state.get('endpointStatus')}, not STOPPED. Nothing to pre-warm.")
+        return {'prewarmed': False, 'probability': probability}
+
+    try:
+        endpoint_name, in_service = launch_endpoint(get_client('sagemaker'), route['sagemakerModelName'], INSTANCE_TYPE,
+                                                    name_prefix=route['namePrefix'], model_id=model_id)
+    except Exception:
+        transition_state(table, model_id, 'STOPPED', from_status='CREATING')
+        raise
+    # Users who hit /start while this ran are in the subscriber shards, which this does not touch
+    transition_state(table, model_id, 'IN_SERVICE' if in_service else None, endpointName=endpoint_name)
+    print(f"Pre-warming endpoint {endpoint_name}.")
+    return {'prewarmed': True, 'probability': probability}
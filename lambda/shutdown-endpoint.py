@@ -1,27 +1,27 @@
 import os
 import json
-import boto3
 from botocore.exceptions import ClientError
+from model_state import transition_state
+from instrumentation import instrumented, span, log_event
+from aws_clients import get_client, get_table
 
 # Get environment variables
 TABLE_NAME = os.environ.get('DYNAMODB_TABLE_NAME')
 MODEL_ID = os.environ.get('MODEL_ID')
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
-sagemaker_client = boto3.client('sagemaker')
-table = dynamodb.Table(TABLE_NAME)
-
+@instrumented('shutdown')
 def lambda_handler(event, context):
     """
     Triggered by a one-time schedule from EventBridge Scheduler.
     Deletes the specified SageMaker endpoint and updates the state in DynamoDB.
     """
     try:
-        print(f"Received event: {json.dumps(event)}")
+        log_event(event)
         
         # The EventBridge schedule passes the endpoint name in the event payload
         endpoint_name = event.get('endpoint_name')
+        # Schedules created before multi-model routing carry only the endpoint name
+        model_id = event.get('model_id') or MODEL_ID
         
         if not endpoint_name:
             print("ERROR: No endpoint_name found in the event payload.")
@@ -31,7 +31,8 @@ def lambda_handler(event, context):
 
         # --- 1. Delete the SageMaker Endpoint ---
         try:
-            sagemaker_client.delete_endpoint(EndpointName=endpoint_name)
+            with span('deleteEndpoint'):
+                get_client('sagemaker').delete_endpoint(EndpointName=endpoint_name)
             print(f"Successfully initiated deletion for endpoint: {endpoint_name}")
         except ClientError as e:
             # If the endpoint is already gone, that's okay.
@@ -42,16 +43,10 @@ def lambda_handler(event, context):
         
         # --- 2. Update DynamoDB State to STOPPED ---
         # This makes the system available for the next user.
-        table.update_item(
-            Key={'modelId': MODEL_ID},
-            # Clear the endpointName AND the scheduleName
-            UpdateExpression="SET endpointStatus = :status, endpointName = :name, scheduleName = :name",
-            ExpressionAttributeValues={
-                ':status': 'STOPPED',
-                ':name': None 
-            }
-        )        
-        print(f"Successfully updated DynamoDB status to STOPPED for modelId: {MODEL_ID}")
+        # Clear the endpointName AND the scheduleName
+        with span('transition'):
+            transition_state(get_table(TABLE_NAME), model_id, 'STOPPED', endpointName=None, scheduleName=None)
+        print(f"Successfully updated DynamoDB status to STOPPED for modelId: {model_id}")
 
         return {'statusCode': 200, 'body': json.dumps('Shutdown process complete.')}
 
@@ -1,24 +1,22 @@
 import os
 import json
-import boto3
 import time
 from botocore.exceptions import ClientError
+from start_strategies import START_STRATEGY, launch_endpoint, record_start_request, record_time_to_in_service
+from model_state import get_model_state, transition_state, add_subscriber
+from model_registry import resolve_model, UnknownModelError
+from instrumentation import instrumented, span, set_property
+from aws_clients import get_client, get_table
 
 # Get environment variables
 TABLE_NAME = os.environ.get('DYNAMODB_TABLE_NAME')
-MODEL_ID = os.environ.get('MODEL_ID')
-SAGEMAKER_MODEL_NAME = os.environ.get('SAGEMAKER_MODEL_NAME')
 SAGEMAKER_ROLE_ARN = os.environ.get('SAGEMAKER_ROLE_ARN')
 INSTANCE_TYPE = os.environ.get('INSTANCE_TYPE')
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
-sagemaker_client = boto3.client('sagemaker')
-table = dynamodb.Table(TABLE_NAME)
-
+@instrumented('start')
 def lambda_handler(event, context):
     """
-    Handles a request to start the SageMaker model endpoint.
+    Handles a request to start the SageMaker model endpoint, for the optional "model" in the body.
     Manages state via DynamoDB to prevent race conditions and handle subscriptions.
     """
     try:
@@ -30,94 +28,86 @@ def lambda_handler(event, context):
         if not user_name or not user_phone:
             return api_gateway_response(400, {'error': 'Name and phone number are required.'})
 
-        # Get the current state of our model from DynamoDB
-        response = table.get_item(Key={'modelId': MODEL_ID})
-        state = response.get('Item', {})
-        status = state.get('endpointStatus', 'STOPPED')
+        try:
+            route = resolve_model(body.get('model'))
+        except UnknownModelError as e:
+            return api_gateway_response(404, {'error': str(e)})
+        # Models on the multi-model endpoint share its state item, so starting any of them starts it
+        model_id = route['stateId']
+        # Built on first use; the SageMaker client is only needed when this request launches the endpoint
+        table = get_table(TABLE_NAME)
+
+        # Every /start is kept as history for the predictive pre-warm (prewarm-endpoint.py)
+        try:
+            with span('historyRecord'):
+                record_start_request(table, model_id)
+        except ClientError as e:
+            print(f"Could not record start request: {e}")
 
+        # Get the current state of our model. Reads don't contend with each other,
+        # so only requests that see STOPPED go on to write to the state item.
+        with span('stateRead'):
+            state = get_model_state(table, model_id, max_age=0)
+        status = state.get('endpointStatus', 'STOPPED')
         print(f"Current model status: {status}")
-        
+        set_property('ModelStatus', status)
+
         # --- STATE MACHINE LOGIC ---
+        won = False
+        start_requested_at = time.time()
+        if status == 'STOPPED':
+            print("Model is stopped. Attempting to start deployment.")
+            # One conditional write claims the start (STOPPED -> CREATING), or returns the
+            # current state if another invocation got there first
+            with span('transition'):
+                won, state = transition_state(
+                    table, model_id, 'CREATING', from_status='STOPPED',
+                    startRequestedAt=int(start_requested_at), startStrategy=START_STRATEGY, prewarmed=False,
+                    sagemakerModelName=route['sagemakerModelName']
+                )
+            set_property('WonStart', won)
+            status = state.get('endpointStatus', 'STOPPED')
+
+        if won:
+            # This invocation "won the race"
+            print("Successfully set status to CREATING. Starting endpoint deployment.")
+            try:
+                # 1. Bring up the endpoint with the configured start strategy
+                with span('launch'):
+                    endpoint_name, in_service = launch_endpoint(get_client('sagemaker'), route['sagemakerModelName'], INSTANCE_TYPE,
+                                                                name_prefix=route['namePrefix'], model_id=model_id)
+            except Exception:
+                # Don't leave the model stuck in CREATING when nothing is being created
+                transition_state(table, model_id, 'STOPPED', from_status='CREATING')
+                raise
 
-        if status == 'IN_SERVICE':
+            if in_service:
+                # A serverless endpoint that is already up: no IN_SERVICE event will follow, so nobody needs an SMS
+                transition_state(table, model_id, 'IN_SERVICE', endpointName=endpoint_name)
+                # The endpoint is up either way; a failed timing write must not turn this into a 500
+                try:
+                    record_time_to_in_service(table, model_id, START_STRATEGY, time.time() - start_requested_at)
+                except Exception as e:
+                    print(f"Could not record time to InService: {e}")
+                return api_gateway_response(200, {'message': 'Model is already running and ready for analysis.'})
+
+            # 2. Save the endpoint name and subscribe the user who started it
+            transition_state(table, model_id, endpointName=endpoint_name)
+            with span('subscribe'):
+                add_subscriber(table, model_id, user_name, user_phone)
+            return api_gateway_response(200, {'message': 'Model deployment started. You will receive an SMS when it is ready.'})
+
+        elif status == 'IN_SERVICE':
             print("Model is already running.")
             return api_gateway_response(200, {'message': 'Model is already running and ready for analysis.'})
 
         elif status == 'CREATING':
             print("Model is already creating. Adding user to subscriber list.")
-            # Add this user to the list of subscribers to be notified
-            table.update_item(
-                Key={'modelId': MODEL_ID},
-                UpdateExpression="SET subscribers = list_append(subscribers, :i)",
-                ExpressionAttributeValues={':i': [{'name': user_name, 'phone': user_phone}]},
-            )
+            # Subscribers live in their own sharded items, so this does not contend with other /start calls
+            with span('subscribe'):
+                add_subscriber(table, model_id, user_name, user_phone)
             return api_gateway_response(200, {'message': 'Model is starting up. You will receive an SMS when it is ready.'})
 
-        elif status == 'STOPPED':
-            print("Model is stopped. Attempting to start deployment.")
-            # Use a conditional update to prevent a race condition.
-            # We only proceed if the status is still 'STOPPED'.
-            try:
-                table.update_item(
-                    Key={'modelId': MODEL_ID},
-                    UpdateExpression="SET endpointStatus = :new_status",
-                    ConditionExpression="endpointStatus = :current_status",
-                    ExpressionAttributeValues={
-                        ':new_status': 'CREATING',
-                        ':current_status': 'STOPPED'
-                    }
-                )
-                
-                # If the conditional update succeeded, this invocation "won the race"
-                print("Successfully set status to CREATING. Starting endpoint deployment.")
-                
-                # Generate a unique name for the endpoint and its config
-                timestamp = str(int(time.time()))
-                endpoint_config_name = f'sentiment-model-config-{timestamp}'
-                endpoint_name = f'sentiment-model-endpoint-{timestamp}'
-
-                # 1. Create Endpoint Configuration
-                sagemaker_client.create_endpoint_config(
-                    EndpointConfigName=endpoint_config_name,
-                    ProductionVariants=[{
-                        'VariantName': 'AllTraffic',
-                        'ModelName': SAGEMAKER_MODEL_NAME,
-                        'InstanceType': INSTANCE_TYPE,
-                        'InitialInstanceCount': 1
-                    }]
-                )
-                
-                # 2. Create the Endpoint
-                sagemaker_client.create_endpoint(
-                    EndpointName=endpoint_name,
-                    EndpointConfigName=endpoint_config_name
-                )
-                
-                # 3. Update DynamoDB with the new endpoint name and the first subscriber
-                table.update_item(
-                    Key={'modelId': MODEL_ID},
-                    UpdateExpression="SET endpointName = :en, subscribers = :s",
-                    ExpressionAttributeValues={
-                        ':en': endpoint_name,
-                        ':s': [{'name': user_name, 'phone': user_phone}]
-                    }
-                )
-                
-                return api_gateway_response(200, {'message': 'Model deployment started. You will receive an SMS when it is ready.'})
-
-            except ClientError as e:
-                # If the conditional check fails, another invocation "won the race"
-                if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
-                    print("Lost race condition. Another process is starting the model. Subscribing user.")
-                    # Add this user to the subscriber list created by the other process
-                    table.update_item(
-                        Key={'modelId': MODEL_ID},
-                        UpdateExpression="SET subscribers = list_append(subscribers, :i)",
-                        ExpressionAttributeValues={':i': [{'name': user_name, 'phone': user_phone}]},
-                    )
-                    return api_gateway_response(200, {'message': 'Model is starting up. You will receive an SMS when it is ready.'})
-                else:
-                    raise # Re-raise other errors
         else:
             # Handle other states like STOPPING if necessary
             return api_gateway_response(503, {'message': f'Model is in an unavailable state: {status}. Please try again later.'})
@@ -0,0 +1,154 @@
+import os
+import time
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError
+from model_registry import DEFAULT_NAME_PREFIX
+
+# How the endpoint is brought up on a cold start:
+#   on-demand          a new timestamped endpoint config and endpoint on every start, deleted at shutdown (the original behaviour)
+#   persistent-config  one long-lived endpoint config reused by every start; only the endpoint is created and deleted
+#   serverless         one long-lived serverless endpoint. It scales to zero by itself, so it is created once and never deleted
+START_STRATEGY = os.environ.get('START_STRATEGY', 'on-demand')
+STRATEGIES = ('on-demand', 'persistent-config', 'serverless')
+
+PERSISTENT_ENDPOINT_CONFIG_NAME = os.environ.get('PERSISTENT_ENDPOINT_CONFIG_NAME', 'sentiment-model-config-persistent')
+SERVERLESS_ENDPOINT_CONFIG_NAME = os.environ.get('SERVERLESS_ENDPOINT_CONFIG_NAME', 'sentiment-model-config-serverless')
+SERVERLESS_ENDPOINT_NAME = os.environ.get('SERVERLESS_ENDPOINT_NAME', 'sentiment-model-endpoint-serverless')
+SERVERLESS_MEMORY_MB = int(os.environ.get('SERVERLESS_MEMORY_MB', '4096'))
+SERVERLESS_MAX_CONCURRENCY = int(os.environ.get('SERVERLESS_MAX_CONCURRENCY', '5'))
+
+# Predictive pre-warm: how far back /start history counts, and how likely a start must be to pre-warm
+START_HISTORY_LOOKBACK_DAYS = int(os.environ.get('START_HISTORY_LOOKBACK_DAYS', '28'))
+PREWARM_THRESHOLD = float(os.environ.get('PREWARM_THRESHOLD', '0.5'))
+WEEK_SECONDS = 7 * 24 * 3600
+# Each start's time-to-InService is its own item, removed by the table's TTL on expiresAt after this many days
+START_TIMINGS_TTL_DAYS = int(os.environ.get('START_TIMINGS_TTL_DAYS', '90'))
+
+# (model_id, slot, week) starts this execution environment has already recorded
+_recorded_starts = set()
+
+
+def launch_endpoint(sagemaker_client, model_name, instance_type, strategy=None, name_prefix=DEFAULT_NAME_PREFIX, model_id=None):
+    """
+    Starts the endpoint with the given strategy (START_STRATEGY by default).
+    Returns (endpoint_name, in_service): in_service is True when a serverless endpoint
+    was already up, in which case no IN_SERVICE event will follow.
+    Endpoints and configs are named after name_prefix, and tagged with model_id (the state
+    item's key) so the IN_SERVICE event tells the scheduler which model came up.
+    """
+    strategy = strategy or START_STRATEGY
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown START_STRATEGY '{strategy}'. Expected one of {STRATEGIES}.")
+    tags = {'Tags': [{'Key': 'modelId', 'Value': model_id}]} if model_id else {}
+
+    if strategy == 'serverless':
+        endpoint_name = _resource_name(SERVERLESS_ENDPOINT_NAME, name_prefix, 'endpoint-serverless')
+        endpoint_config_name = _resource_name(SERVERLESS_ENDPOINT_CONFIG_NAME, name_prefix, 'config-serverless')
+        ensure_endpoint_config(sagemaker_client, endpoint_config_name, {
+            'VariantName': 'AllTraffic',
+            'ModelName': model_name,
+            'ServerlessConfig': {'MemorySizeInMB': SERVERLESS_MEMORY_MB, 'MaxConcurrency': SERVERLESS_MAX_CONCURRENCY},
+        })
+        try:
+            endpoint = sagemaker_client.describe_endpoint(EndpointName=endpoint_name)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ValidationException':
+                raise
+            # First start ever: create the endpoint, which then stays for good
+            print(f"Creating serverless endpoint {endpoint_name}.")
+            sagemaker_client.create_endpoint(EndpointName=endpoint_name, EndpointConfigName=endpoint_config_name, **tags)
+            return endpoint_name, False
+        if endpoint['EndpointStatus'] == 'Failed':
+            raise RuntimeError(f"Serverless endpoint {endpoint_name} is in a Failed state.")
+        return endpoint_name, endpoint['EndpointStatus'] == 'InService'
+
+    variant = {
+        'VariantName': 'AllTraffic',
+        'ModelName': model_name,
+        'InstanceType': instance_type,
+        'InitialInstanceCount': 1
+    }
+    timestamp = str(int(time.time()))
+    endpoint_name = f'{name_prefix}-endpoint-{timestamp}'
+    if strategy == 'persistent-config':
+        endpoint_config_name = _resource_name(PERSISTENT_ENDPOINT_CONFIG_NAME, name_prefix, 'config-persistent')
+        ensure_endpoint_config(sagemaker_client, endpoint_config_name, variant)
+    else:
+        endpoint_config_name = f'{name_prefix}-config-{timestamp}'
+        sagemaker_client.create_endpoint_config(EndpointConfigName=endpoint_config_name, ProductionVariants=[variant])
+
+    sagemaker_client.create_endpoint(EndpointName=endpoint_name, EndpointConfigName=endpoint_config_name, **tags)
+    return endpoint_name, False
+
+
+def _resource_name(configured_name, name_prefix, suffix):
+    """The configured name for the default model's endpoint, '<name_prefix>-<suffix>' for any other model."""
+    return configured_name if name_prefix == DEFAULT_NAME_PREFIX else f'{name_prefix}-{suffix}'
+
+
+def ensure_endpoint_config(sagemaker_client, endpoint_config_name, variant):
+    """Creates the named endpoint config unless it already exists. Delete it to pick up a new model or size."""
+    try:
+        sagemaker_client.describe_endpoint_config(EndpointConfigName=endpoint_config_name)
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ValidationException':
+            raise
+        print(f"Creating endpoint config {endpoint_config_name}.")
+        sagemaker_client.create_endpoint_config(EndpointConfigName=endpoint_config_name, ProductionVariants=[variant])
+
+
+def start_slot(at):
+    """The hour-of-week (UTC) a start falls in, e.g. 'mon-14'."""
+    return at.astimezone(timezone.utc).strftime('%a-%H').lower()
+
+
+def record_start_request(table, model_id, now=None):
+    """
+    Adds the week of a /start request to its hour-of-week history item (modelId '<model_id>#starts#<slot>').
+    Only which weeks had a start matters, so the item holds a set of week numbers: it grows by one
+    entry per week at most, and a warm Lambda skips the write once it has recorded the week.
+    """
+    now = now or datetime.now(timezone.utc)
+    slot, week = start_slot(now), int(now.timestamp() // WEEK_SECONDS)
+    if (model_id, slot, week) in _recorded_starts:
+        return
+    table.update_item(
+        Key={'modelId': f"{model_id}#starts#{slot}"},
+        UpdateExpression="ADD startWeeks :w",
+        ExpressionAttributeValues={':w': {week}}
+    )
+    _recorded_starts.add((model_id, slot, week))
+
+
+def start_probability(table, model_id, at, lookback_days=None):
+    """
+    Share of the past weeks (within the lookback) that had at least one /start in the same hour-of-week as `at`.
+    With the default 28 days, a slot used in 2 of the last 4 weeks scores 0.5.
+    """
+    lookback_days = lookback_days or START_HISTORY_LOOKBACK_DAYS
+    weeks = max(1, lookback_days // 7)
+    response = table.get_item(Key={'modelId': f"{model_id}#starts#{start_slot(at)}"})
+    start_weeks = response.get('Item', {}).get('startWeeks', set())
+
+    # A slot never spans a week boundary, so a start k weeks back is exactly k week numbers back
+    current_week = int(at.timestamp() // WEEK_SECONDS)
+    weeks_with_start = {current_week - int(w) for w in start_weeks} & set(range(1, weeks + 1))
+    return len(weeks_with_start) / weeks
+
+
+def record_time_to_in_service(table, model_id, strategy, seconds, prewarmed=False):
+    """
+    Writes one start's time-to-InService as its own '<model_id>#start-timings#<ms>' item, for comparing
+    strategies. One item per start keeps every write small, where a single growing list would
+    eventually hit the 400 KB item limit; the items expire after START_TIMINGS_TTL_DAYS.
+    """
+    print(f"Time to InService: {seconds:.1f}s (strategy: {strategy}, prewarmed: {prewarmed})")
+    now = time.time()
+    table.put_item(Item={
+        'modelId': f"{model_id}#start-timings#{int(now * 1000)}",
+        'strategy': strategy,
+        'seconds': int(round(seconds)),
+        'prewarmed': prewarmed,
+        'at': int(now),
+        'expiresAt': int(now + START_TIMINGS_TTL_DAYS * 86400),
+    })
@@ -0,0 +1,73 @@
+import time
+import argparse
+import threading
+import statistics
+
+import requests
+
+SAMPLE_REVIEWS = [
+    "This is the best musical instrument I have ever owned. The quality is outstanding and the sound is perfect.",
+    "The guitar arrived with a huge crack in the body. It's unplayable and the support has been useless.",
+    "It's okay for the price, but the tuning pegs feel a little cheap and it doesn't stay in tune very well.",
+    "Wow, just wow! I am blown away by the rich tone of this piano.",
+]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_level(url, concurrency, requests_per_worker):
+    """Runs `concurrency` workers that each send requests back to back. Returns latencies and wall time."""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def worker(worker_id):
+        session = requests.Session() # One pooled connection per worker
+        local = []
+        for i in range(requests_per_worker):
+            review = SAMPLE_REVIEWS[(worker_id + i) % len(SAMPLE_REVIEWS)]
+            start = time.perf_counter()
+            try:
+                response = session.post(url, json={"inputs": review}, timeout=30)
+                response.raise_for_status()
+                local.append(time.perf_counter() - start)
+            except requests.exceptions.RequestException:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), errors[0], time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the local inference server (or any /invocations URL).")
+    parser.add_argument("--url", type=str, default="http://localhost:8080/invocations")
+    parser.add_argument("--concurrency", type=str, default="1,4,16,64", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests-per-worker", type=int, default=50)
+    args = parser.parse_args()
+
+    # Warm up so model loading and the first allocations don't count
+    requests.post(args.url, json={"inputs": SAMPLE_REVIEWS[0]}, timeout=60).raise_for_status()
+
+    print(f"{'concurrency':>12}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+    for concurrency in [int(c) for c in args.concurrency.split(',')]:
+        latencies, errors, wall = run_level(args.url, concurrency, args.requests_per_worker)
+        ms = [l * 1000 for l in latencies]
+        print(f"{concurrency:>12}{len(ms):>10}{errors:>8}{len(ms) / wall:>10.1f}"
+              f"{percentile(ms, 50):>10.1f}{percentile(ms, 95):>10.1f}{percentile(ms, 99):>10.1f}"
+              f"{(statistics.mean(ms) if ms else 0):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import queue
+import argparse
+import threading
+import sys
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import torch
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+# Long-review windowing is shared with the SageMaker inference handler
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sagemaker'))
+from long_text import AGGREGATION, AGGREGATIONS, score_windows, summarize
+
+# --- CONFIGURATION ---
+# MODEL_DIR is the directory written by train.py (trainer.save_model + tokenizer.save_pretrained),
+# e.g. the extracted contents of the training job's model.tar.gz.
+MODEL_DIR = os.environ.get('MODEL_DIR', './model')
+# Micro-batches count reviews; each forward pass is capped at WINDOW_BATCH_SIZE windows (long_text.py)
+MAX_BATCH_TEXTS = int(os.environ.get('MAX_BATCH_TEXTS', '32'))
+MAX_BATCH_DELAY_MS = float(os.environ.get('MAX_BATCH_DELAY_MS', '5'))
+INFERENCE_WORKERS = int(os.environ.get('INFERENCE_WORKERS', '2'))
+MAX_LENGTH = int(os.environ.get('MAX_LENGTH', '512'))
+
+
+class SentimentModel:
+    """Wraps the fine-tuned model and tokenizer for CPU inference."""
+
+    def __init__(self, model_dir, max_length=MAX_LENGTH):
+        print(f"Loading model from {model_dir}...")
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+        self.model.eval()
+        self.max_length = max_length
+        self.id2label = self.model.config.id2label
+
+    def score_windows(self, texts):
+        """
+        Scores every overlapping max_length window of every text, batched together.
+        Returns the windows per text; long_text.summarize turns them into a prediction.
+        """
+        return score_windows(self.model, self.tokenizer, texts, max_length=self.max_length)
+
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching: request threads enqueue single texts and wait on a Future,
+    while a pool of worker threads drains the queue into batches of up to MAX_BATCH_TEXTS texts,
+    waiting at most MAX_BATCH_DELAY_MS for a batch to fill.
+    """
+
+    def __init__(self, predict_fn, max_batch_texts=MAX_BATCH_TEXTS, max_delay_ms=MAX_BATCH_DELAY_MS, workers=INFERENCE_WORKERS):
+        self.predict_fn = predict_fn
+        self.max_batch_texts = max_batch_texts
+        self.max_delay = max_delay_ms / 1000.0
+        self.requests = queue.Queue()
+        self.stats = {'batches': 0, 'items': 0}
+        self._stats_lock = threading.Lock()
+        self.workers = [threading.Thread(target=self._run, daemon=True, name=f'inference-{i}') for i in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, texts):
+        """Queues texts and returns one Future per text."""
+        futures = []
+        for text in texts:
+            future = Future()
+            self.requests.put((text, future))
+            futures.append(future)
+        return futures
+
+    def _collect(self):
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch_texts:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                predictions = self.predict_fn([text for text, _ in batch])
+                for (_, future), prediction in zip(batch, predictions):
+                    future.set_result(prediction)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            with self._stats_lock:
+                self.stats['batches'] += 1
+                self.stats['items'] += len(batch)
+
+
+def make_handler(batcher, batcher_labels):
+    class InferenceHandler(BaseHTTPRequestHandler):
+        """Implements the SageMaker container contract: GET /ping and POST /invocations."""
+
+        def do_GET(self):
+            if self.path == '/ping':
+                self._send(200, {'status': 'ok'})
+            elif self.path == '/stats':
+                with batcher._stats_lock:
+                    stats = dict(batcher.stats)
+                stats['avg_batch_size'] = round(stats['items'] / stats['batches'], 2) if stats['batches'] else 0
+                self._send(200, stats)
+            else:
+                self._send(404, {'error': 'Not found.'})
+
+        def do_POST(self):
+            if self.path not in ('/invocations', '/predict'):
+                self._send(404, {'error': 'Not found.'})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                inputs = body.get('inputs')
+                parameters = body.get('parameters') or {}
+                aggregation = parameters.get('aggregation', AGGREGATION)
+                return_chunks = bool(parameters.get('return_chunks'))
+            except (ValueError, AttributeError):
+                self._send(400, {'error': 'Body must be JSON of the form {"inputs": ..., "parameters": {...}}.'})
+                return
+            if aggregation not in AGGREGATIONS:
+                self._send(400, {'error': f'aggregation must be one of {", ".join(AGGREGATIONS)}.'})
+                return
+
+            texts = inputs if isinstance(inputs, list) else [inputs]
+            if not texts or not all(isinstance(t, str) and t for t in texts):
+                self._send(400, {'error': 'inputs must be a non-empty string or list of strings.'})
+                return
+
+            try:
+                # Windows are scored in shared micro-batches; each request aggregates its own
+                predictions = [summarize(future.result(), batcher_labels, aggregation, return_chunks)
+                               for future in batcher.submit(texts)]
+            except Exception as e:
+                print(f"ERROR: Inference failed: {str(e)}")
+                self._send(500, {'error': 'Inference failed.'})
+                return
+            self._send(200, predictions)
+
+        def _send(self, status_code, body_object):
+            payload = json.dumps(body_object).encode('utf-8')
+            self.send_response(status_code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            # The default handler logs every request to stderr, which costs more than inference for short texts
+            pass
+
+    return InferenceHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Self-hosted CPU inference server for the sentiment model.")
+    parser.add_argument("--model-dir", type=str, default=MODEL_DIR)
+    parser.add_argument("--host", type=str, default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get('PORT', '8080')))
+    parser.add_argument("--max-batch-texts", type=int, default=MAX_BATCH_TEXTS, help="Reviews per micro-batch")
+    parser.add_argument("--max-batch-delay-ms", type=float, default=MAX_BATCH_DELAY_MS)
+    parser.add_argument("--workers", type=int, default=INFERENCE_WORKERS)
+    parser.add_argument("--torch-threads", type=int, default=None, help="Intra-op threads per forward pass")
+    args = parser.parse_args()
+
+    if args.torch_threads:
+        torch.set_num_threads(args.torch_threads)
+
+    model = SentimentModel(args.model_dir)
+    batcher = MicroBatcher(model.score_windows, args.max_batch_texts, args.max_batch_delay_ms, args.workers)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(batcher, model.id2label))
+    print(f"Serving on http://{args.host}:{args.port} ({args.max_batch_texts} texts per batch, "
+          f"delay {args.max_batch_delay_ms}ms, {args.workers} workers)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# Offline scoring of whole parquet datasets, e.g. processed-data/ partitions, with the model
+# written by train.py. Each input row group becomes one output file with the input columns plus
+# sentiment_label, sentiment_score and sentiment_windows. Output files are written atomically,
+# so a rerun with the same --output-dir skips every row group that is already done.
+#
+#   python batch_score.py --model-dir ./model --input-dir ./processed-data --output-dir ./scored
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import torch
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+from long_text import (AGGREGATION, AGGREGATIONS, MAX_WINDOWS_PER_REVIEW, WINDOW_STRIDE,
+                       score_tokenized, summarize, tokenize_windows)
+from streaming_data import list_parquet_files, review_full_text
+
+REPORT_FILE = 'batch-score-report.json'
+
+# Set in each tokenizer worker by init_worker
+_worker = {}
+
+
+def init_worker(model_dir, max_length, stride, max_windows):
+    os.environ['TOKENIZERS_PARALLELISM'] = 'false'  # the pool already uses every core
+    _worker['tokenizer'] = AutoTokenizer.from_pretrained(model_dir)
+    _worker['options'] = {'max_length': max_length, 'stride': stride, 'max_windows': max_windows}
+
+
+def tokenize_chunk(texts):
+    return tokenize_windows(_worker['tokenizer'], texts, **_worker['options'])
+
+
+def row_group_texts(table):
+    """The text to score for each row: review_full_text if present, else title and text as in training."""
+    if 'review_full_text' in table.column_names:
+        return [text or '' for text in table.column('review_full_text').to_pylist()]
+    titles = table.column('title').to_pylist() if 'title' in table.column_names else [None] * table.num_rows
+    texts = table.column('text').to_pylist() if 'text' in table.column_names else [None] * table.num_rows
+    return [review_full_text(title, text) if (title or text) else '' for title, text in zip(titles, texts)]
+
+
+def output_path(output_dir, input_dir, path, row_group):
+    """<output-dir>/<input path without .parquet>/row-group-00000.parquet, so partitions keep their names."""
+    relative = os.path.splitext(os.path.relpath(path, input_dir))[0]
+    return os.path.join(output_dir, relative, f"row-group-{row_group:05d}.parquet")
+
+
+def list_units(input_dir, output_dir):
+    """Every (input file, row group, output file) of the dataset, and how many are already scored."""
+    units, done = [], 0
+    for path in list_parquet_files(input_dir):
+        for row_group in range(pq.ParquetFile(path).num_row_groups):
+            target = output_path(output_dir, input_dir, path, row_group)
+            if os.path.exists(target):
+                done += 1
+            else:
+                units.append((path, row_group, target))
+    return units, done
+
+
+def write_atomically(table, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temporary = f"{target}.tmp"
+    pq.write_table(table, temporary, compression='snappy')
+    os.replace(temporary, target)
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def score(args):
+    units, done = list_units(args.input_dir, args.output_dir)
+    print(f"{len(units)} row groups to score, {done} already done in {args.output_dir}")
+
+    # Spawned rather than forked, so the workers don't inherit torch's thread pools
+    pool = ProcessPoolExecutor(max_workers=args.num_proc, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=init_worker,
+                               initargs=(args.model_dir, args.max_length, args.stride, args.max_windows))
+    torch.set_num_threads(args.threads)
+    tokenizer = AutoTokenizer.from_pretrained(args.model_dir)
+    model = AutoModelForSequenceClassification.from_pretrained(args.model_dir).eval()
+    id2label = model.config.id2label
+
+    def submit(unit):
+        path, row_group, target = unit
+        table = pq.ParquetFile(path).read_row_group(row_group)
+        texts = row_group_texts(table)
+        chunks = [texts[i:i + args.tokenize_chunk_size] for i in range(0, len(texts), args.tokenize_chunk_size)]
+        return unit, table, texts, [pool.submit(tokenize_chunk, chunk) for chunk in chunks]
+
+    rows, started = 0, time.perf_counter()
+    try:
+        # Row groups are tokenized up to --prefetch ahead, while the model scores the current one
+        pending = deque()
+        remaining = iter(units)
+        for unit in remaining:
+            pending.append(submit(unit))
+            if len(pending) > args.prefetch:
+                break
+        while pending:
+            (path, row_group, target), table, texts, futures = pending.popleft()
+            next_unit = next(remaining, None)
+            if next_unit:
+                pending.append(submit(next_unit))
+
+            windows, offset = [], 0
+            for future in futures:
+                chunk_windows = future.result()
+                for window in chunk_windows:
+                    window['text_index'] += offset
+                windows.extend(chunk_windows)
+                offset += args.tokenize_chunk_size
+            scored = score_tokenized(model, tokenizer, windows, len(texts), args.batch_size)
+
+            predictions = [summarize(w, id2label, args.aggregation) if text else None for w, text in zip(scored, texts)]
+            table = table.append_column('sentiment_label', pa.array([p and p['label'] for p in predictions], pa.string()))
+            table = table.append_column('sentiment_score', pa.array([p and p['score'] for p in predictions], pa.float32()))
+            table = table.append_column('sentiment_windows', pa.array([len(w) if text else None for w, text in zip(scored, texts)], pa.int32()))
+            write_atomically(table, target)
+
+            rows += table.num_rows
+            elapsed = time.perf_counter() - started
+            print(f"{os.path.relpath(target, args.output_dir)}: {table.num_rows} rows, "
+                  f"{rows / elapsed:.1f} rows/s overall, peak RSS {peak_rss_mb():.0f} MB")
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - started
+    report = {
+        'rows': rows,
+        'rowGroups': len(units),
+        'skippedRowGroups': done,
+        'seconds': round(elapsed, 2),
+        'rowsPerSecond': round(rows / elapsed, 1) if elapsed else 0,
+        'peakRssMb': round(peak_rss_mb()),
+        'peakWorkerRssMb': round(peak_rss_mb(resource.RUSAGE_CHILDREN)),
+        'aggregation': args.aggregation,
+        'maxLength': args.max_length,
+        'maxWindows': args.max_windows,
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+    with open(os.path.join(args.output_dir, REPORT_FILE), 'w') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-dir", type=str, required=True)
+    parser.add_argument("--input-dir", type=str, required=True)
+    parser.add_argument("--output-dir", type=str, required=True)
+    parser.add_argument("--batch-size", type=int, default=128, help="windows per forward pass")
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--stride", type=int, default=WINDOW_STRIDE)
+    parser.add_argument("--max-windows", type=int, default=MAX_WINDOWS_PER_REVIEW)
+    parser.add_argument("--aggregation", type=str, default=AGGREGATION, choices=AGGREGATIONS)
+    parser.add_argument("--num-proc", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="tokenizer processes")
+    parser.add_argument("--threads", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="torch threads")
+    parser.add_argument("--tokenize-chunk-size", type=int, default=1000, help="rows per tokenizer task")
+    parser.add_argument("--prefetch", type=int, default=1, help="row groups tokenized ahead of the model")
+    score(parser.parse_args())
@@ -0,0 +1,212 @@
+import argparse
+import glob
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+from datasets import Dataset
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+
+def export_onnx(model, tokenizer, output_path, opset=14):
+    """
+    Exports the classifier to ONNX with dynamic batch and sequence axes,
+    so the graph accepts padded-per-batch inputs of any length up to the model maximum.
+    """
+    model.eval()
+    sample = tokenizer(["a short sample review"], return_tensors="pt")
+    torch.onnx.export(
+        model,
+        (sample["input_ids"], sample["attention_mask"]),
+        output_path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "logits": {0: "batch"},
+        },
+        opset_version=opset,
+        do_constant_folding=True,
+    )
+
+
+def quantize_int8(onnx_path, output_path):
+    """Dynamic (weight-only, activations quantized at runtime) int8 quantization. Needs no calibration data."""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    quantize_dynamic(onnx_path, output_path, weight_type=QuantType.QInt8)
+
+
+def load_eval_split(training_dir, seed, max_samples):
+    """Rebuilds the held-out split exactly as train.py does (same file, same test_size, same seed)."""
+    eval_dir = os.path.join(training_dir, 'split=eval')
+    if os.path.isdir(eval_dir):
+        # The Glue job's partitioned output already carries the eval split
+        eval_dataset = Dataset.from_parquet(sorted(glob.glob(os.path.join(eval_dir, '**', '*.parquet'), recursive=True)))
+        if max_samples and len(eval_dataset) > max_samples:
+            eval_dataset = eval_dataset.shuffle(seed=seed).select(range(max_samples))
+        return list(eval_dataset['review_full_text']), np.array(eval_dataset['label'])
+
+    df = pd.read_parquet(os.path.join(training_dir, 'sentiment-train-data-sampled.parquet'),
+                         columns=['review_full_text', 'sentiment'])
+    df.rename(columns={'sentiment': 'label'}, inplace=True)
+    eval_dataset = Dataset.from_pandas(df).train_test_split(test_size=0.1, seed=seed)['test']
+    if max_samples and len(eval_dataset) > max_samples:
+        eval_dataset = eval_dataset.select(range(max_samples))
+    return list(eval_dataset['review_full_text']), np.array(eval_dataset['label'])
+
+
+class TorchRunner:
+    def __init__(self, model):
+        self.model = model.eval()
+
+    def logits(self, encoded):
+        with torch.inference_mode():
+            return self.model(input_ids=torch.from_numpy(encoded["input_ids"]),
+                              attention_mask=torch.from_numpy(encoded["attention_mask"])).logits.numpy()
+
+
+class OnnxRunner:
+    def __init__(self, path, threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def logits(self, encoded):
+        return self.session.run(["logits"], {"input_ids": encoded["input_ids"],
+                                             "attention_mask": encoded["attention_mask"]})[0]
+
+
+def predict_all(runner, tokenizer, texts, batch_size, max_length):
+    predictions = []
+    for start in range(0, len(texts), batch_size):
+        encoded = tokenizer(texts[start:start + batch_size], padding=True, truncation=True,
+                            max_length=max_length, return_tensors="np")
+        encoded = {k: v.astype(np.int64) for k, v in encoded.items()}
+        predictions.append(runner.logits(encoded).argmax(axis=-1))
+    return np.concatenate(predictions)
+
+
+def measure_latency(runner, tokenizer, texts, batch_size, max_length, iterations):
+    """Returns latency percentiles in milliseconds for scoring `batch_size` texts at a time."""
+    batches = [[texts[j % len(texts)] for j in range(i * batch_size, (i + 1) * batch_size)] for i in range(iterations)]
+    encoded_batches = []
+    for batch in batches:
+        encoded = tokenizer(batch, padding=True, truncation=True, max_length=max_length, return_tensors="np")
+        encoded_batches.append({k: v.astype(np.int64) for k, v in encoded.items()})
+
+    runner.logits(encoded_batches[0]) # warm-up
+    timings = []
+    for encoded in encoded_batches:
+        start = time.perf_counter()
+        runner.logits(encoded)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'p50_ms': round(float(np.percentile(timings, 50)), 2),
+        'p95_ms': round(float(np.percentile(timings, 95)), 2),
+        'mean_ms': round(float(np.mean(timings)), 2),
+    }
+
+
+def files_size_mb(paths):
+    return round(sum(os.path.getsize(p) for p in paths) / (1024 * 1024), 1)
+
+
+def main(args):
+    output_dir = args.output_dir or os.path.join(args.model_dir, 'onnx')
+    os.makedirs(output_dir, exist_ok=True)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    # --- 1. Load the PyTorch artifact written by train.py ---
+    print(f"Loading model from {args.model_dir}...")
+    tokenizer = AutoTokenizer.from_pretrained(args.model_dir)
+    model = AutoModelForSequenceClassification.from_pretrained(args.model_dir)
+
+    # --- 2. Export ONNX and quantize ---
+    fp32_path = os.path.join(output_dir, 'model.onnx')
+    int8_path = os.path.join(output_dir, 'model-int8.onnx')
+    print(f"Exporting ONNX graph to {fp32_path}...")
+    export_onnx(model, tokenizer, fp32_path, opset=args.opset)
+    print(f"Quantizing to dynamic int8 at {int8_path}...")
+    quantize_int8(fp32_path, int8_path)
+    # The tokenizer travels with the ONNX files so the directory can be served on its own
+    tokenizer.save_pretrained(output_dir)
+    model.config.save_pretrained(output_dir)
+
+    # --- 3. Accuracy parity on the held-out eval split ---
+    print("Loading held-out eval split...")
+    texts, labels = load_eval_split(args.training_dir, args.seed, args.eval_samples)
+
+    weight_files = [os.path.join(args.model_dir, f) for f in os.listdir(args.model_dir)
+                    if f.endswith(('.bin', '.safetensors'))]
+    variants = {
+        'pytorch-fp32': (TorchRunner(model), weight_files),
+        'onnx-fp32': (OnnxRunner(fp32_path, args.threads), [fp32_path]),
+        'onnx-int8': (OnnxRunner(int8_path, args.threads), [int8_path]),
+    }
+
+    report = {'eval_samples': len(texts), 'max_length': args.max_length, 'variants': {}}
+    reference = None
+    for name, (runner, files) in variants.items():
+        print(f"Evaluating {name}...")
+        predictions = predict_all(runner, tokenizer, texts, args.eval_batch_size, args.max_length)
+        if reference is None:
+            reference = predictions
+        report['variants'][name] = {
+            'size_mb': files_size_mb(files),
+            'accuracy': round(float((predictions == labels).mean()), 4),
+            'agreement_with_pytorch': round(float((predictions == reference).mean()), 4),
+            'latency': {
+                f'batch_{batch_size}': measure_latency(runner, tokenizer, texts, batch_size, args.max_length, args.latency_iterations)
+                for batch_size in args.latency_batch_sizes
+            },
+        }
+
+    # --- 4. Report ---
+    baseline_accuracy = report['variants']['pytorch-fp32']['accuracy']
+    report['passed'] = all(
+        baseline_accuracy - v['accuracy'] <= args.max_accuracy_drop for v in report['variants'].values()
+    )
+    report_path = os.path.join(output_dir, 'export-report.json')
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'variant':<14}{'size MB':>9}{'accuracy':>10}{'agree':>8}" +
+          ''.join(f"{f'b{b} p50 ms':>12}{f'b{b} p95 ms':>12}" for b in args.latency_batch_sizes))
+    for name, v in report['variants'].items():
+        print(f"{name:<14}{v['size_mb']:>9}{v['accuracy']:>10.4f}{v['agreement_with_pytorch']:>8.4f}" +
+              ''.join(f"{v['latency'][f'batch_{b}']['p50_ms']:>12}{v['latency'][f'batch_{b}']['p95_ms']:>12}"
+                      for b in args.latency_batch_sizes))
+    print(f"\nReport saved to {report_path}")
+
+    if not report['passed']:
+        print(f"ERROR: An exported variant lost more than {args.max_accuracy_drop:.2%} accuracy.")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    # Run after training on the extracted model.tar.gz, e.g.
+    #   python export_onnx.py --model-dir ./model --training-dir ./train-data-sampled
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-dir", type=str, default=os.environ.get("SM_MODEL_DIR"))
+    parser.add_argument("--training-dir", type=str, default=os.environ.get("SM_CHANNEL_TRAINING"))
+    parser.add_argument("--output-dir", type=str, default=None, help="Defaults to <model-dir>/onnx")
+    parser.add_argument("--seed", type=int, default=42, help="Must match the --seed used by train.py")
+    parser.add_argument("--eval-samples", type=int, default=2000)
+    parser.add_argument("--eval-batch-size", type=int, default=32)
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--latency-batch-sizes", type=lambda s: [int(b) for b in s.split(',')], default=[1, 8])
+    parser.add_argument("--latency-iterations", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=None, help="CPU threads, e.g. the vCPU count of the target instance")
+    parser.add_argument("--opset", type=int, default=14)
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.01)
+
+    args, _ = parser.parse_known_args()
+
+    main(args)
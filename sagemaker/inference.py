@@ -0,0 +1,32 @@
+# Custom handler for the Hugging Face inference container. train.py copies this file and
+# long_text.py into model.tar.gz under code/, and the container then uses them in place of its
+# default pipeline, which truncates every review at max_length tokens.
+#
+# Request:  {"inputs": str | [str], "parameters": {"aggregation": "last", "return_chunks": true}}
+# Response: [{"label", "score"}, ...] as before, plus "windows" and "chunks" when return_chunks is set.
+import os
+
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+from long_text import AGGREGATION, predict_long
+
+MAX_LENGTH = int(os.environ.get('MAX_LENGTH', '512'))
+
+
+def model_fn(model_dir):
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+    model.eval()
+    return model, tokenizer
+
+
+def predict_fn(data, model_and_tokenizer):
+    model, tokenizer = model_and_tokenizer
+    inputs = data.get('inputs')
+    parameters = data.get('parameters') or {}
+    texts = inputs if isinstance(inputs, list) else [inputs]
+    return predict_long(
+        model, tokenizer, texts, max_length=MAX_LENGTH,
+        strategy=parameters.get('aggregation', AGGREGATION),
+        return_chunks=bool(parameters.get('return_chunks')),
+    )
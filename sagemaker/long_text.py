@@ -0,0 +1,131 @@
+import os
+
+import torch
+
+# Reviews longer than max_length tokens are split into overlapping windows instead of truncated.
+# Consecutive windows share WINDOW_STRIDE tokens, so a sentence cut at one window's edge is whole in the next.
+WINDOW_STRIDE = int(os.environ.get('WINDOW_STRIDE', '128'))
+# Caps the windows scored per review, which bounds its latency. The first and last windows are kept,
+# since long reviews tend to open with context and close with the verdict. 1 restores plain truncation.
+MAX_WINDOWS_PER_REVIEW = int(os.environ.get('MAX_WINDOWS_PER_REVIEW', '16'))
+# Windows per forward pass. Windows from every review in a batch are scored together, shortest first.
+WINDOW_BATCH_SIZE = int(os.environ.get('WINDOW_BATCH_SIZE', '64'))
+# How window scores become one prediction per review:
+#   mean      average of the window probabilities
+#   weighted  average weighted by each window's token count, so a short final window counts less
+#   max       the single most confident window decides
+#   last      the final window decides, for reviews that end with the verdict
+AGGREGATION = os.environ.get('AGGREGATION', 'mean')
+AGGREGATIONS = ('mean', 'weighted', 'max', 'last')
+
+
+def select_windows(window_ids, max_windows):
+    """Keeps the first and last windows of a review when it has more than max_windows."""
+    if len(window_ids) <= max_windows:
+        return window_ids
+    head = (max_windows + 1) // 2
+    return window_ids[:head] + window_ids[len(window_ids) - (max_windows - head):]
+
+
+def tokenize_windows(tokenizer, texts, max_length=512, stride=WINDOW_STRIDE, max_windows=MAX_WINDOWS_PER_REVIEW):
+    """
+    Splits each text into windows of at most max_length tokens. Returns the selected windows of
+    every text as {'text_index', 'input_ids', 'attention_mask', 'tokens', 'start', 'end'}, where
+    start/end are the character offsets of the window in the text. Needs no model, so it can run
+    in a worker process.
+    """
+    encoded = tokenizer(texts, truncation=True, max_length=max_length, stride=stride,
+                        return_overflowing_tokens=True, return_offsets_mapping=True)
+    windows_per_text = [[] for _ in texts]
+    for window_id, text_index in enumerate(encoded['overflow_to_sample_mapping']):
+        windows_per_text[text_index].append(window_id)
+
+    windows = []
+    for text_index, window_ids in enumerate(windows_per_text):
+        for window_id in select_windows(window_ids, max_windows):
+            spans = [(s, e) for s, e in encoded['offset_mapping'][window_id] if e > s]  # special tokens map to (0, 0)
+            windows.append({
+                'text_index': text_index,
+                'input_ids': encoded['input_ids'][window_id],
+                'attention_mask': encoded['attention_mask'][window_id],
+                'tokens': sum(encoded['attention_mask'][window_id]),
+                'start': spans[0][0] if spans else 0,
+                'end': spans[-1][1] if spans else 0,
+            })
+    return windows
+
+
+def score_tokenized(model, tokenizer, windows, text_count, window_batch_size=WINDOW_BATCH_SIZE):
+    """
+    Scores windows from tokenize_windows in forward passes of window_batch_size, shortest first.
+    Returns, per text, a list of windows: {'probabilities', 'tokens', 'start', 'end'}.
+    """
+    # Sorting by length keeps the padding in each forward pass small
+    order = sorted(range(len(windows)), key=lambda i: windows[i]['tokens'])
+    probabilities = [None] * len(windows)
+    for start in range(0, len(order), window_batch_size):
+        indices = order[start:start + window_batch_size]
+        batch = tokenizer.pad({
+            'input_ids': [windows[i]['input_ids'] for i in indices],
+            'attention_mask': [windows[i]['attention_mask'] for i in indices],
+        }, return_tensors='pt')
+        with torch.inference_mode():
+            logits = model(**batch).logits
+        for i, row in zip(indices, torch.softmax(logits, dim=-1).tolist()):
+            probabilities[i] = row
+
+    results = [[] for _ in range(text_count)]
+    for window, window_probabilities in zip(windows, probabilities):
+        results[window['text_index']].append({
+            'probabilities': window_probabilities,
+            'tokens': window['tokens'],
+            'start': window['start'],
+            'end': window['end'],
+        })
+    return results
+
+
+def score_windows(model, tokenizer, texts, max_length=512, stride=WINDOW_STRIDE,
+                  max_windows=MAX_WINDOWS_PER_REVIEW, window_batch_size=WINDOW_BATCH_SIZE):
+    """
+    Splits each text into windows of at most max_length tokens and scores every window.
+    Returns, per text, a list of windows: {'probabilities', 'tokens', 'start', 'end'}.
+    """
+    windows = tokenize_windows(tokenizer, texts, max_length, stride, max_windows)
+    return score_tokenized(model, tokenizer, windows, len(texts), window_batch_size)
+
+
+def aggregate(windows, strategy=AGGREGATION):
+    """Combines the window probabilities of one review into one probability vector."""
+    if strategy not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation '{strategy}'. Expected one of {AGGREGATIONS}.")
+    if strategy == 'last':
+        return windows[-1]['probabilities']
+    if strategy == 'max':
+        return max(windows, key=lambda w: max(w['probabilities']))['probabilities']
+    weights = [w['tokens'] if strategy == 'weighted' else 1 for w in windows]
+    total = sum(weights)
+    return [sum(w['probabilities'][label] * weight for w, weight in zip(windows, weights)) / total
+            for label in range(len(windows[0]['probabilities']))]
+
+
+def summarize(windows, id2label, strategy=AGGREGATION, return_chunks=False):
+    """
+    One prediction in the Hugging Face container's shape, {label, score}, with the window
+    count and per-window detail ({label, score, start, end}) when return_chunks is set.
+    """
+    def labelled(probabilities):
+        label_id = max(range(len(probabilities)), key=probabilities.__getitem__)
+        return {'label': id2label[label_id], 'score': probabilities[label_id]}
+
+    prediction = labelled(aggregate(windows, strategy))
+    if return_chunks:
+        prediction['windows'] = len(windows)
+        prediction['chunks'] = [dict(labelled(w['probabilities']), start=w['start'], end=w['end']) for w in windows]
+    return prediction
+
+
+def predict_long(model, tokenizer, texts, max_length=512, strategy=AGGREGATION, return_chunks=False, **window_options):
+    """score_windows + summarize for a list of texts."""
+    return [summarize(windows, model.config.id2label, strategy, return_chunks)
+            for windows in score_windows(model, tokenizer, texts, max_length, **window_options)]
@@ -0,0 +1,77 @@
+import argparse
+import random
+import statistics
+import tempfile
+import time
+
+import torch
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+from long_text import AGGREGATIONS, score_windows, summarize
+from smoke_benchmark import build_tiny_model
+
+PRAISE = ["The tone is warm and rich.", "It stays in tune for weeks.", "Shipping was fast and the box was intact.",
+          "The finish looks great on stage.", "My teacher loved the sound.", "The case is sturdy and well padded."]
+COMPLAINTS = ["After a month the neck warped and the strings buzz on every fret.",
+              "Then the pickup died and support refused the return. Avoid this one.",
+              "Sadly it cracked at the bridge and is now unplayable. Very disappointed."]
+
+
+def build_reviews(count, sentences, seed=0):
+    """Long reviews that praise the product for many sentences and end with the real verdict, a complaint."""
+    rng = random.Random(seed)
+    return [' '.join(rng.choices(PRAISE, k=sentences) + [rng.choice(COMPLAINTS)]) for _ in range(count)]
+
+
+def run(model, tokenizer, reviews, max_length, max_windows, strategy, batch_size):
+    """Scores the reviews in batches. Returns per-review latencies, windows per review and predictions."""
+    latencies, windows, predictions = [], [], []
+    for start in range(0, len(reviews), batch_size):
+        batch = reviews[start:start + batch_size]
+        began = time.perf_counter()
+        scored = score_windows(model, tokenizer, batch, max_length=max_length, max_windows=max_windows)
+        elapsed = time.perf_counter() - began
+        latencies.extend([elapsed] * len(batch))
+        windows.extend(len(w) for w in scored)
+        predictions.extend(summarize(w, model.config.id2label, strategy) for w in scored)
+    return latencies, windows, predictions
+
+
+def main(args):
+    torch.set_num_threads(args.threads)
+    with tempfile.TemporaryDirectory() as workdir:
+        model_dir = args.model_dir
+        if not model_dir:
+            # No trained model: latency and window counts are still meaningful, accuracy is not
+            model_dir = workdir
+            build_tiny_model(model_dir)
+        tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        model = AutoModelForSequenceClassification.from_pretrained(model_dir).eval()
+
+    reviews = build_reviews(args.reviews, args.sentences)
+    tokens = statistics.mean(len(ids) for ids in tokenizer(reviews)['input_ids'])
+    print(f"{len(reviews)} reviews of ~{tokens:.0f} tokens, max_length {args.max_length}, batch {args.batch_size}")
+    print(f"{'mode':<22}{'windows':>9}{'p50 ms':>9}{'p95 ms':>9}{'negative':>10}")
+
+    # max_windows=1 is plain truncation, as before
+    modes = [('truncate', 1, 'mean')] + [(strategy, args.max_windows, strategy) for strategy in AGGREGATIONS]
+    for name, max_windows, strategy in modes:
+        latencies, windows, predictions = run(model, tokenizer, reviews, args.max_length, max_windows,
+                                              strategy, args.batch_size)
+        latencies.sort()
+        negative = sum(p['label'] == args.negative_label for p in predictions) / len(predictions)
+        print(f"{name:<22}{statistics.mean(windows):>9.1f}{latencies[len(latencies) // 2] * 1000:>9.1f}"
+              f"{latencies[int(len(latencies) * 0.95)] * 1000:>9.1f}{negative:>10.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-dir", type=str, default=None, help="trained model; a tiny random model if omitted")
+    parser.add_argument("--reviews", type=int, default=64)
+    parser.add_argument("--sentences", type=int, default=120, help="sentences of praise before the complaint")
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--max-windows", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=8, help="reviews per request")
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--negative-label", type=str, default="LABEL_0")
+    main(parser.parse_args())
@@ -0,0 +1,109 @@
+import argparse
+import itertools
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+from transformers import DistilBertConfig, DistilBertForSequenceClassification, DistilBertTokenizerFast
+
+WORDS = ["great", "sound", "guitar", "broken", "string", "love", "cheap", "tone", "piano", "perfect",
+         "terrible", "tuning", "quality", "returned", "amazing", "noise", "case", "strap", "pedal", "drum"]
+
+
+def build_tiny_model(model_dir):
+    """Writes a randomly initialized two-layer DistilBERT and a matching tokenizer, so no download is needed."""
+    vocab_path = os.path.join(model_dir, 'vocab.txt')
+    os.makedirs(model_dir, exist_ok=True)
+    with open(vocab_path, 'w') as f:
+        f.write('\n'.join(['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]', '.'] + WORDS) + '\n')
+    tokenizer = DistilBertTokenizerFast(vocab_file=vocab_path)
+    tokenizer.save_pretrained(model_dir)
+
+    config = DistilBertConfig(vocab_size=tokenizer.vocab_size, dim=32, n_layers=2, n_heads=2,
+                              hidden_dim=64, max_position_embeddings=512, num_labels=2)
+    DistilBertForSequenceClassification(config).save_pretrained(model_dir)
+
+
+def build_tiny_dataset(training_dir, rows):
+    """Writes a sentiment-train-data-sampled.parquet with random reviews of varying length."""
+    os.makedirs(training_dir, exist_ok=True)
+    rng = random.Random(0)
+    df = pd.DataFrame({
+        'review_full_text': [' '.join(rng.choices(WORDS, k=rng.randint(3, 60))) + '.' for _ in range(rows)],
+        'sentiment': [rng.randint(0, 1) for _ in range(rows)],
+    })
+    df.to_parquet(os.path.join(training_dir, 'sentiment-train-data-sampled.parquet'))
+
+
+def main(args):
+    options = {
+        'fp16': [False, True],
+        'bf16': [False, True],
+        'gradient-accumulation-steps': [1, 2],
+        'dataloader-num-workers': [0, 2],
+        'gradient-checkpointing': [False, True],
+        'torch-compile': [False, True] if not args.skip_compile else [False],
+        'dynamic-padding': [False, True],
+    }
+    combinations = [dict(zip(options, values)) for values in itertools.product(*options.values())]
+    # fp16 and bf16 are mutually exclusive
+    combinations = [c for c in combinations if not (c['fp16'] and c['bf16'])]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        model_name = os.path.join(workdir, 'tiny-distilbert')
+        training_dir = os.path.join(workdir, 'data')
+        build_tiny_model(model_name)
+        build_tiny_dataset(training_dir, args.rows)
+
+        train_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'train.py')
+        results = []
+        print(f"Running {len(combinations)} combinations on {args.rows} rows...")
+        for i, combination in enumerate(combinations):
+            run_dir = os.path.join(workdir, f'run-{i}')
+            command = [
+                sys.executable, train_script,
+                '--model-name', model_name,
+                '--training-dir', training_dir,
+                '--model-dir', os.path.join(run_dir, 'model'),
+                '--output-data-dir', os.path.join(run_dir, 'output'),
+                '--epochs', '1',
+                '--train-batch-size', '8',
+                '--eval-batch-size', '8',
+                '--warmup-steps', '0',
+                '--max-length', '64',
+                '--tokenized-cache-dir', os.path.join(workdir, 'tokenized-cache'),
+            ]
+            for name, value in combination.items():
+                command += [f'--{name}', str(value)]
+
+            start = time.perf_counter()
+            completed = subprocess.run(command, capture_output=True, text=True)
+            elapsed = time.perf_counter() - start
+            ok = completed.returncode == 0 and os.path.exists(os.path.join(run_dir, 'model', 'config.json'))
+            results.append((combination, ok, elapsed))
+            flags = ' '.join(f"{k}={v}" for k, v in combination.items())
+            print(f"{'PASS' if ok else 'FAIL'} {elapsed:6.1f}s  {flags}")
+            if not ok:
+                print(completed.stdout[-2000:])
+                print(completed.stderr[-2000:])
+
+    failed = [r for r in results if not r[1]]
+    print(f"\n{len(results) - len(failed)}/{len(results)} combinations passed.")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    # CPU-runnable: fp16/bf16 fall back to full precision without a suitable GPU,
+    # so this checks that every option combination parses, trains and saves end to end.
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=128)
+    parser.add_argument("--skip-compile", action="store_true", help="torch.compile is slow to warm up on CPU")
+
+    args = parser.parse_args()
+
+    main(args)
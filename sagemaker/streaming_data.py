@@ -0,0 +1,153 @@
+import glob
+import os
+import random
+import zlib
+
+import pyarrow.parquet as pq
+import torch
+from torch.utils.data import IterableDataset, get_worker_info
+
+
+def to_sentiment(rating):
+    """Ratings of 1, 2 or 3 are negative (0) and 4 or 5 are positive (1), as in Data-Exploration.ipynb."""
+    return 0 if int(float(rating)) <= 3 else 1
+
+
+def is_eval_row(text, eval_percent):
+    """Stable hash split, so a review lands in the same split on every pass and every run."""
+    return zlib.crc32(text.encode('utf-8')) % 100 < eval_percent
+
+
+def list_parquet_files(data_dir):
+    files = sorted(glob.glob(os.path.join(data_dir, '**', '*.parquet'), recursive=True))
+    if not files:
+        raise FileNotFoundError(f"No parquet files found under {data_dir}")
+    return files
+
+
+def review_full_text(title, text):
+    """Joins a review's title and text the way the training data does."""
+    return f"{title or ''}. {text or ''}"
+
+
+def iter_reviews(files, batch_size=1024):
+    """
+    Lazily yields (review_full_text, label) from the Glue output (rating, title, text),
+    one record batch at a time, so only a row group's worth of data is in memory.
+    """
+    for path in files:
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=['rating', 'title', 'text']):
+            columns = batch.to_pydict()
+            for rating, title, text in zip(columns['rating'], columns['title'], columns['text']):
+                if rating is None or not (title or text):
+                    continue
+                yield review_full_text(title, text), to_sentiment(rating)
+
+
+def shuffle_buffer(records, buffer_size, rng):
+    """Approximate shuffle with bounded memory: keep buffer_size records and emit a random one per input."""
+    buffer = []
+    for record in records:
+        if len(buffer) < buffer_size:
+            buffer.append(record)
+            continue
+        index = rng.randrange(buffer_size)
+        yield buffer[index]
+        buffer[index] = record
+    rng.shuffle(buffer)
+    yield from buffer
+
+
+def balance_classes(records, rng):
+    """
+    Downsamples the majority class on the fly: each record is kept with probability
+    (count of the rarest class seen so far) / (count of its own class seen so far).
+    Needs only a counter per class, not a pass over the data.
+    """
+    seen = {0: 0, 1: 0}
+    for text, label in records:
+        seen[label] += 1
+        rarest = min(seen.values()) or 1
+        if rng.random() < rarest / seen[label]:
+            yield text, label
+
+
+class StreamingReviewDataset(IterableDataset):
+    """
+    Streams the full processed-data/ corpus for training: parquet row groups are read lazily,
+    mapped to (text, label), optionally class-balanced, shuffled through a bounded buffer and
+    tokenized in batches on the fly. DataLoader workers each read a disjoint subset of files.
+    """
+
+    def __init__(self, data_dir, tokenize_function, shuffle_buffer_size=10000, balance=False,
+                 eval_percent=0, tokenize_batch_size=256, seed=42):
+        self.files = list_parquet_files(data_dir)
+        self.tokenize_function = tokenize_function
+        self.shuffle_buffer_size = shuffle_buffer_size
+        self.balance = balance
+        self.eval_percent = eval_percent
+        self.tokenize_batch_size = tokenize_batch_size
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        # Called by the Trainer at the start of every epoch so each pass uses a different file order
+        self.epoch = epoch
+
+    def _worker_files(self):
+        worker = get_worker_info()
+        files = list(self.files)
+        random.Random(self.seed + self.epoch).shuffle(files)
+        if worker is None:
+            return files, self.seed + self.epoch
+        return files[worker.id::worker.num_workers], self.seed + self.epoch * 1000 + worker.id
+
+    def __iter__(self):
+        files, seed = self._worker_files()
+        rng = random.Random(seed)
+
+        records = ((text, label) for text, label in iter_reviews(files) if not is_eval_row(text, self.eval_percent))
+        if self.balance:
+            records = balance_classes(records, rng)
+        if self.shuffle_buffer_size > 1:
+            records = shuffle_buffer(records, self.shuffle_buffer_size, rng)
+
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) == self.tokenize_batch_size:
+                yield from self._tokenize(batch)
+                batch = []
+        if batch:
+            yield from self._tokenize(batch)
+
+    def _tokenize(self, batch):
+        texts, labels = zip(*batch)
+        tokens = self.tokenize_function({'review_full_text': list(texts)})
+        for i, label in enumerate(labels):
+            yield {'input_ids': tokens['input_ids'][i], 'attention_mask': tokens['attention_mask'][i], 'label': label}
+
+
+class EvalSample(torch.utils.data.Dataset):
+    """A bounded, in-memory eval set taken from the rows the hash split reserves for evaluation."""
+
+    def __init__(self, data_dir, tokenize_function, eval_percent, max_samples):
+        texts, labels = [], []
+        for text, label in iter_reviews(list_parquet_files(data_dir)):
+            if is_eval_row(text, eval_percent):
+                texts.append(text)
+                labels.append(label)
+                if len(texts) >= max_samples:
+                    break
+        tokens = tokenize_function({'review_full_text': texts}) if texts else {'input_ids': [], 'attention_mask': []}
+        self.rows = [
+            {'input_ids': ids, 'attention_mask': mask, 'label': label}
+            for ids, mask, label in zip(tokens['input_ids'], tokens['attention_mask'], labels)
+        ]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        return self.rows[index]
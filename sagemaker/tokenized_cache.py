@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+import shutil
+
+from datasets import Dataset, load_from_disk
+
+# On SageMaker, /opt/ml/checkpoints is synced to the estimator's checkpoint_s3_uri,
+# so a cache written there is restored at the start of the next training job.
+SAGEMAKER_CACHE_DIR = '/opt/ml/checkpoints/tokenized-cache'
+LOCAL_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'sentiment-tokenized')
+
+
+def default_cache_dir():
+    if os.environ.get('TOKENIZED_CACHE_DIR'):
+        return os.environ['TOKENIZED_CACHE_DIR']
+    return SAGEMAKER_CACHE_DIR if os.path.isdir('/opt/ml/checkpoints') else LOCAL_CACHE_DIR
+
+
+def file_sha256(path, chunk_size=8 * 1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def data_fingerprint(data_files):
+    """
+    A single file is hashed by content. For a list of files (e.g. the Glue job's partitioned
+    output) the paths and sizes are hashed instead: Spark gives every write new part-file names,
+    so a rewrite still changes the fingerprint without reading gigabytes of data.
+    """
+    if isinstance(data_files, str):
+        return file_sha256(data_files)
+    digest = hashlib.sha256()
+    for path in sorted(data_files):
+        digest.update(f"{path}:{os.path.getsize(path)}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def cache_key(data_files, tokenizer_name, max_length, **options):
+    """Everything that changes the tokenized output must be part of the key."""
+    parts = {'data': data_fingerprint(data_files), 'tokenizer': tokenizer_name, 'max_length': max_length, **options}
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()[:24]
+
+
+def load_or_tokenize(data_files, tokenize_function, key, cache_dir=None, num_proc=None):
+    """
+    Returns the tokenized dataset for data_files (one parquet path or a list of them),
+    memory-mapped from the Arrow cache when a previous run already produced it. Otherwise reads the parquet straight into Arrow
+    (no pandas copy), tokenizes it with num_proc worker processes and saves it to the cache.
+    """
+    cache_dir = cache_dir or default_cache_dir()
+    cached_path = os.path.join(cache_dir, key)
+
+    if os.path.isdir(cached_path):
+        print(f"Loading tokenized dataset from cache: {cached_path}")
+        return load_from_disk(cached_path)
+
+    print(f"No tokenized cache at {cached_path}. Tokenizing with {num_proc or 1} process(es)...")
+    dataset = Dataset.from_parquet(data_files)
+    if 'sentiment' in dataset.column_names:
+        # Need to do this as the tokenizer will look to use the label column as the target values.
+        dataset = dataset.rename_column('sentiment', 'label')
+    extra_columns = [c for c in dataset.column_names if c not in ('label', 'review_full_text')]
+    tokenized = dataset.map(
+        tokenize_function,
+        batched=True,
+        num_proc=num_proc,
+        # The raw text isn't needed after tokenization, so don't store it twice
+        remove_columns=['review_full_text'] + extra_columns,
+    )
+
+    # Write to a temporary directory first so a crashed run never leaves a half-written cache entry
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_path = f"{cached_path}.tmp-{os.getpid()}"
+    tokenized.save_to_disk(temp_path)
+    try:
+        os.rename(temp_path, cached_path)
+    except OSError:
+        # Another run finished the same entry first
+        shutil.rmtree(temp_path, ignore_errors=True)
+    print(f"Saved tokenized dataset to cache: {cached_path}")
+    return load_from_disk(cached_path)
@@ -1,43 +1,165 @@
 import argparse
+import glob
 import os
-import pandas as pd
-from datasets import Dataset
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, TrainingArguments, Trainer
+import shutil
+import time
+from transformers import AutoTokenizer, AutoModelForSequenceClassification, TrainingArguments, Trainer, TrainerCallback, DataCollatorWithPadding
 import torch
+from tokenized_cache import cache_key, load_or_tokenize
+from streaming_data import StreamingReviewDataset, EvalSample
+
+
+def str2bool(value):
+    """SageMaker passes every hyperparameter as a string, so 'False' must not be truthy."""
+    if isinstance(value, bool):
+        return value
+    return value.lower() in ('true', '1', 'yes', 'y')
+
+
+class ThroughputCallback(TrainerCallback):
+    """
+    Reports wall time and tokens per second for every training epoch.
+    Counts both real tokens (attention_mask) and processed tokens (including padding),
+    so the effect of dynamic padding and length grouping is visible in the logs.
+    """
+
+    def __init__(self):
+        self.real_tokens = 0
+        self.padded_tokens = 0
+        self.epoch_start = None
+
+    def count(self, inputs):
+        self.padded_tokens += inputs['input_ids'].numel()
+        self.real_tokens += int(inputs['attention_mask'].sum())
+
+    def on_epoch_begin(self, args, state, control, **kwargs):
+        self.real_tokens = 0
+        self.padded_tokens = 0
+        self.epoch_start = time.perf_counter()
+
+    def on_epoch_end(self, args, state, control, **kwargs):
+        elapsed = time.perf_counter() - self.epoch_start
+        efficiency = self.real_tokens / self.padded_tokens if self.padded_tokens else 0
+        print(f"Epoch {state.epoch:.0f}: {elapsed:.1f}s, {self.real_tokens / elapsed:.0f} tokens/s "
+              f"({self.padded_tokens / elapsed:.0f} incl. padding, {efficiency:.1%} of processed tokens are real)")
+
+
+class StreamEpochCallback(TrainerCallback):
+    """Gives a streaming dataset a new file order and shuffle seed for every pass."""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def on_epoch_begin(self, args, state, control, **kwargs):
+        self.dataset.set_epoch(int(state.epoch or 0))
+
+
+class ThroughputTrainer(Trainer):
+    """Trainer that feeds every training batch to a ThroughputCallback."""
+
+    def __init__(self, *args, throughput=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.throughput = throughput
+
+    def training_step(self, model, inputs, *args, **kwargs):
+        if self.throughput is not None:
+            self.throughput.count(inputs)
+        return super().training_step(model, inputs, *args, **kwargs)
+
+
+def list_split_files(training_dir, split):
+    files = sorted(glob.glob(os.path.join(training_dir, f'split={split}', '**', '*.parquet'), recursive=True))
+    if not files:
+        raise FileNotFoundError(f"No parquet files found under {training_dir}/split={split}")
+    return files
+
+
+def resolve_precision(args):
+    """
+    Returns the (fp16, bf16) flags to use. Falls back to full precision, with a warning,
+    when the device can't run the requested mode (e.g. bf16 on a T4, or anything on CPU).
+    """
+    if args.fp16 and args.bf16:
+        raise ValueError("Choose at most one of --fp16 and --bf16.")
+    if args.fp16 and not torch.cuda.is_available():
+        print("WARNING: fp16 requires a CUDA GPU. Training in full precision.")
+        return False, False
+    if args.bf16 and not (torch.cuda.is_available() and torch.cuda.is_bf16_supported()):
+        print("WARNING: bf16 is not supported on this device. Training in full precision.")
+        return False, False
+    return args.fp16, args.bf16
+
 
 def train(args):
     """
     Main training function.  Handles training of the model on the given path.
     """
-    # --- 1. Load Data ---
-    print("Loading processed data...")
-    # The training data is mounted by SageMaker in the path specified by the 'training' channel.
-    input_data_path = os.path.join(args.training_dir, 'sentiment-train-data-sampled.parquet')
-    df = pd.read_parquet(input_data_path)
+    if args.streaming:
+        if args.max_steps <= 0:
+            raise ValueError("--max-steps is required with --streaming, since a stream has no length.")
+        if args.group_by_length:
+            print("WARNING: group-by-length needs the length of every row up front and is ignored when streaming.")
+            args.group_by_length = False
 
-    # Need to do this as the tokenizer will look to use the label column as the target values.
-    df.rename(columns={'sentiment': 'label'}, inplace=True)
-
-    
-    # Convert pandas DataFrame to Hugging Face Dataset
-    dataset = Dataset.from_pandas(df)
-    
-    # --- 2. Preprocess and Tokenize Data ---
-    print("Tokenizing data...")
+    # --- 1. Preprocess and Tokenize Data ---
     # Load the tokenizer for the pre-trained model
     tokenizer = AutoTokenizer.from_pretrained(args.model_name)
 
     def tokenize_function(examples):
-        # The tokenizer will pad and truncate the text to a standard length
-        return tokenizer(examples['review_full_text'], padding="max_length", truncation=True)
+        if args.dynamic_padding:
+            # Only truncate here; the data collator pads each batch to its longest review
+            tokens = tokenizer(examples['review_full_text'], truncation=True, max_length=args.max_length)
+        else:
+            # The tokenizer will pad and truncate the text to a standard length
+            tokens = tokenizer(examples['review_full_text'], padding="max_length", truncation=True, max_length=args.max_length)
+        if args.group_by_length:
+            # Precomputed so the length-grouped sampler doesn't have to measure every row itself
+            tokens['length'] = [sum(mask) for mask in tokens['attention_mask']]
+        return tokens
 
-    # Apply the tokenizer to the entire dataset
-    tokenized_datasets = dataset.map(tokenize_function, batched=True)
-    
-    # Split the dataset into training and testing sets
-    train_test_split = tokenized_datasets.train_test_split(test_size=0.1)
-    train_dataset = train_test_split['train']
-    eval_dataset = train_test_split['test']
+    if args.streaming:
+        # --- 2. Stream the full processed-data/ corpus ---
+        # Rows are read, labelled and tokenized lazily, so memory use doesn't depend on the corpus size.
+        print(f"Streaming training data from {args.streaming_data_dir}...")
+        train_dataset = StreamingReviewDataset(
+            args.streaming_data_dir, tokenize_function,
+            shuffle_buffer_size=args.shuffle_buffer_size,
+            balance=args.class_balance,
+            eval_percent=args.eval_percent,
+            seed=args.seed,
+        )
+        eval_dataset = EvalSample(args.streaming_data_dir, tokenize_function, args.eval_percent, args.streaming_eval_samples)
+        print(f"Training on {len(train_dataset.files)} parquet files, evaluating on {len(eval_dataset)} held-out reviews.")
+    elif os.path.isdir(os.path.join(args.training_dir, 'split=train')):
+        # --- 2. Load the Glue job's partitioned output ---
+        # The job has already labelled, cleaned and split the reviews (training-data/split=.../sentiment=.../bucket=...),
+        # so each split is tokenized as-is and there is no split to compute here.
+        tokenized = {}
+        for split in ('train', 'eval'):
+            split_files = list_split_files(args.training_dir, split)
+            key = cache_key(split_files, args.model_name, args.max_length,
+                            dynamic_padding=args.dynamic_padding, group_by_length=args.group_by_length)
+            tokenized[split] = load_or_tokenize(split_files, tokenize_function, key,
+                                                cache_dir=args.tokenized_cache_dir, num_proc=args.num_proc)
+        train_dataset = tokenized['train']
+        eval_dataset = tokenized['eval']
+        print(f"Loaded {len(train_dataset)} training and {len(eval_dataset)} eval reviews from the partitioned layout.")
+    else:
+        # --- 2. Load the sampled training file ---
+        # The training data is mounted by SageMaker in the path specified by the 'training' channel.
+        input_data_path = os.path.join(args.training_dir, 'sentiment-train-data-sampled.parquet')
+
+        # Apply the tokenizer to the entire dataset, or reuse the Arrow cache from a previous run on the same data
+        key = cache_key(input_data_path, args.model_name, args.max_length,
+                        dynamic_padding=args.dynamic_padding, group_by_length=args.group_by_length)
+        tokenized_datasets = load_or_tokenize(input_data_path, tokenize_function, key,
+                                              cache_dir=args.tokenized_cache_dir, num_proc=args.num_proc)
+
+        # Split the dataset into training and testing sets
+        # The seed makes the held-out split reproducible, so export_onnx.py can check accuracy on the same rows
+        train_test_split = tokenized_datasets.train_test_split(test_size=0.1, seed=args.seed)
+        train_dataset = train_test_split['train']
+        eval_dataset = train_test_split['test']
 
     # --- 3. Load Pre-trained Model ---
     print("Loading pre-trained model...")
@@ -49,6 +171,11 @@ def train(args):
     model.to(device)
     print(f"Using device: {device}")
 
+    fp16, bf16 = resolve_precision(args)
+    if args.gradient_checkpointing:
+        # Trades extra forward compute for activation memory, allowing larger batches
+        model.gradient_checkpointing_enable()
+
 
     # --- 4. Set up Trainer ---
     print("Setting up training arguments...")
@@ -56,27 +183,49 @@ def train(args):
     training_args = TrainingArguments(
         output_dir=args.model_dir,          # Output directory for the trained model
         num_train_epochs=args.epochs,       # Number of times to iterate over the training data
+        max_steps=args.max_steps,           # Overrides epochs when > 0 (required when streaming)
         per_device_train_batch_size=args.train_batch_size,
         per_device_eval_batch_size=args.eval_batch_size,
         warmup_steps=args.warmup_steps,
         weight_decay=0.01,
         logging_dir=f"{args.output_data_dir}/logs",
-        evaluation_strategy="epoch",        # Evaluate performance at the end of each epoch
+        evaluation_strategy="steps" if args.streaming else "epoch", # A stream has no epochs to evaluate at
+        eval_steps=args.eval_steps,
         save_total_limit=1,
+        group_by_length=args.group_by_length, # Batch reviews of similar length together
+        length_column_name="length",
+        fp16=fp16,                          # Mixed precision (T4 / V100 and newer)
+        bf16=bf16,                          # Mixed precision (A10G / A100 and newer)
+        gradient_accumulation_steps=args.gradient_accumulation_steps,
+        dataloader_num_workers=args.dataloader_num_workers,
+        dataloader_pin_memory=torch.cuda.is_available(),
+        torch_compile=args.torch_compile,
+        seed=args.seed,
     )
 
+    # Pad per batch instead of to max_length (pad_to_multiple_of=8 keeps shapes tensor-core friendly)
+    data_collator = DataCollatorWithPadding(tokenizer, pad_to_multiple_of=8) if args.dynamic_padding else None
+    throughput = ThroughputCallback()
+    callbacks = [throughput]
+    if args.streaming:
+        callbacks.append(StreamEpochCallback(train_dataset))
+
     # The Trainer class from Hugging Face handles the entire training loop
-    trainer = Trainer(
+    trainer = ThroughputTrainer(
         model=model,
         args=training_args,
         train_dataset=train_dataset,
         eval_dataset=eval_dataset,
+        data_collator=data_collator,
+        callbacks=callbacks,
+        throughput=throughput,
     )
 
     # --- 5. Train Model ---
-    print("Starting model training...")
+    print(f"Starting model training (dynamic padding: {args.dynamic_padding}, group by length: {args.group_by_length})...")
+    start = time.perf_counter()
     trainer.train()
-    print("Training complete.")
+    print(f"Training complete in {time.perf_counter() - start:.1f}s.")
 
 
     # --- 6. Save Model ---
@@ -85,6 +234,13 @@ def train(args):
     trainer.save_model(args.model_dir)
     tokenizer.save_pretrained(args.model_dir)
 
+    # The inference container runs code/inference.py from model.tar.gz when present,
+    # which scores long reviews in overlapping windows instead of truncating them
+    code_dir = os.path.join(args.model_dir, 'code')
+    os.makedirs(code_dir, exist_ok=True)
+    for file_name in ('inference.py', 'long_text.py'):
+        shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), file_name), code_dir)
+
 
 if __name__ == "__main__":
     # This block gets executed when the script is run.
@@ -97,10 +253,32 @@ if __name__ == "__main__":
     parser.add_argument("--eval-batch-size", type=int, default=8)
     parser.add_argument("--warmup-steps", type=int, default=500)
     parser.add_argument("--model-name", type=str, default="distilbert-base-uncased")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--dynamic-padding", type=str2bool, default=False)
+    parser.add_argument("--group-by-length", type=str2bool, default=False)
+    parser.add_argument("--fp16", type=str2bool, default=False)
+    parser.add_argument("--bf16", type=str2bool, default=False)
+    parser.add_argument("--gradient-accumulation-steps", type=int, default=1)
+    parser.add_argument("--dataloader-num-workers", type=int, default=0)
+    parser.add_argument("--gradient-checkpointing", type=str2bool, default=False)
+    parser.add_argument("--torch-compile", type=str2bool, default=False)
+    parser.add_argument("--tokenized-cache-dir", type=str, default=None)
+    parser.add_argument("--num-proc", type=int, default=os.cpu_count())
+    parser.add_argument("--max-steps", type=int, default=-1)
+    parser.add_argument("--eval-steps", type=int, default=500)
+
+    # Streaming mode: train on the full Glue output instead of the sampled file
+    parser.add_argument("--streaming", type=str2bool, default=False)
+    parser.add_argument("--shuffle-buffer-size", type=int, default=10000)
+    parser.add_argument("--class-balance", type=str2bool, default=False)
+    parser.add_argument("--eval-percent", type=int, default=1)
+    parser.add_argument("--streaming-eval-samples", type=int, default=5000)
 
     # SageMaker environment variables
     parser.add_argument("--model-dir", type=str, default=os.environ.get("SM_MODEL_DIR"))
     parser.add_argument("--training-dir", type=str, default=os.environ.get("SM_CHANNEL_TRAINING"))
+    parser.add_argument("--streaming-data-dir", type=str, default=os.environ.get("SM_CHANNEL_PROCESSED"))
     parser.add_argument("--output-data-dir", type=str, default=os.environ.get("SM_OUTPUT_DATA_DIR"))
     
     args, _ = parser.parse_known_args()
@@ -1,21 +1,62 @@
+import os
+import io
 import streamlit as st
 import requests
+import pandas as pd
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
 import re
 import time
 
 # --- CONFIGURATION ---
 # IMPORTANT: Replace this with the Invoke URL of your API Gateway deployment (Stage: v1)
-API_GATEWAY_URL = "https://z8eof5hub5.execute-api.us-east-1.amazonaws.com/v1"
+API_GATEWAY_URL = os.environ.get("API_GATEWAY_URL", "https://z8eof5hub5.execute-api.us-east-1.amazonaws.com/v1")
+# Optional: URL of a self-hosted inference server (local-inference/server.py), e.g. http://localhost:8080
+# When set, predictions go straight to it and the model is always considered running.
+LOCAL_INFERENCE_URL = os.environ.get("LOCAL_INFERENCE_URL")
+# Optional: which model in the backend's MODEL_REGISTRY to use, e.g. "electronics". The backend's default when unset.
+MODEL_KEY = os.environ.get("MODEL_KEY")
+MODEL_PARAMS = {"model": MODEL_KEY} if MODEL_KEY else {}
+# /status answers are shared by every open tab for this many seconds
+STATUS_CACHE_SECONDS = int(os.environ.get("STATUS_CACHE_SECONDS", "30"))
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get("REQUEST_TIMEOUT_SECONDS", "30"))
+
+# Bulk mode: reviews are sent BULK_BATCH_SIZE at a time as /predict batches, BULK_MAX_WORKERS requests in flight
+BULK_BATCH_SIZE = int(os.environ.get("BULK_BATCH_SIZE", "100"))  # the backend accepts up to MAX_BATCH_ITEMS (1000)
+BULK_MAX_WORKERS = int(os.environ.get("BULK_MAX_WORKERS", "4"))
+BULK_MAX_ROWS = int(os.environ.get("BULK_MAX_ROWS", "10000"))
+BULK_MAX_ATTEMPTS = int(os.environ.get("BULK_MAX_ATTEMPTS", "3"))
+# Columns tried, in order, as the review text of an uploaded file
+TEXT_COLUMNS = ("review_full_text", "text", "review", "reviewText")
 
 # --- API HELPER FUNCTIONS ---
 
-def get_model_status():
-    """Calls the /status endpoint to check if the model is running."""
+@st.cache_resource
+def get_http_session():
+    """One pooled session for the whole app, so calls reuse connections instead of opening one each."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=max(BULK_MAX_WORKERS, 10))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+@st.cache_data(ttl=STATUS_CACHE_SECONDS, show_spinner=False)
+def fetch_model_status():
+    """Calls the /status endpoint. Cached across sessions; errors are raised, so they are never cached."""
+    session = get_http_session()
+    if LOCAL_INFERENCE_URL:
+        return session.get(f"{LOCAL_INFERENCE_URL}/ping", timeout=5).ok
+    response = session.get(f"{API_GATEWAY_URL}/status", params=MODEL_PARAMS, timeout=REQUEST_TIMEOUT_SECONDS)
+    response.raise_for_status()  # Raise an exception for bad status codes
+    return response.json().get('is_running', False)
+
+def get_model_status(refresh=False):
+    """Checks if the model is running. refresh skips the shared cache, e.g. for the Refresh Status button."""
+    if refresh:
+        fetch_model_status.clear()
     try:
-        response = requests.get(f"{API_GATEWAY_URL}/status")
-        response.raise_for_status()  # Raise an exception for bad status codes
-        return response.json().get('is_running', False)
+        return fetch_model_status()
     except requests.exceptions.RequestException as e:
         st.error(f"Error checking model status: {e}")
         return False
@@ -23,8 +64,8 @@ def get_model_status():
 def start_model_service(name, phone):
     """Calls the /start endpoint to deploy the model."""
     try:
-        payload = {"name": name, "phone": phone}
-        response = requests.post(f"{API_GATEWAY_URL}/start", json=payload)
+        payload = {"name": name, "phone": phone, **MODEL_PARAMS}
+        response = get_http_session().post(f"{API_GATEWAY_URL}/start", json=payload, timeout=REQUEST_TIMEOUT_SECONDS)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -34,14 +75,87 @@ def start_model_service(name, phone):
 def get_prediction(text):
     """Calls the /predict endpoint to get a sentiment prediction."""
     try:
-        payload = {"text": text}
-        response = requests.post(f"{API_GATEWAY_URL}/predict", json=payload)
+        session = get_http_session()
+        if LOCAL_INFERENCE_URL:
+            response = session.post(f"{LOCAL_INFERENCE_URL}/invocations", json={"inputs": text}, timeout=REQUEST_TIMEOUT_SECONDS)
+            response.raise_for_status()
+            return response.json()
+        payload = {"text": text, **MODEL_PARAMS}
+        response = session.post(f"{API_GATEWAY_URL}/predict", json=payload, timeout=REQUEST_TIMEOUT_SECONDS)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
         st.error(f"Error getting prediction: {e}")
         return None
 
+def label_name(prediction):
+    return "POSITIVE" if prediction['label'] == 'LABEL_1' else "NEGATIVE"
+
+def predict_texts(texts):
+    """
+    Scores one batch of texts in a single request. Returns one {'status', 'prediction' or 'error'}
+    per text. Throttling, 5xx and connection errors are retried with backoff; predictions are
+    idempotent, so a retry is safe.
+    """
+    session = get_http_session()
+    for attempt in range(1, BULK_MAX_ATTEMPTS + 1):
+        try:
+            if LOCAL_INFERENCE_URL:
+                response = session.post(f"{LOCAL_INFERENCE_URL}/invocations", json={"inputs": texts}, timeout=REQUEST_TIMEOUT_SECONDS)
+            else:
+                response = session.post(f"{API_GATEWAY_URL}/predict", json={"texts": texts, **MODEL_PARAMS}, timeout=REQUEST_TIMEOUT_SECONDS)
+            if response.status_code == 429 or response.status_code >= 500:
+                reason = f"HTTP {response.status_code}"
+            elif response.status_code == 202:
+                # The endpoint is starting again and the backend queued the batch
+                return [{'status': 'error', 'error': 'The model is starting; try again once it is in service.'}] * len(texts)
+            else:
+                response.raise_for_status()
+                if LOCAL_INFERENCE_URL:
+                    return [{'status': 'ok', 'prediction': prediction} for prediction in response.json()]
+                return response.json()['results']
+        except requests.exceptions.HTTPError as e:
+            return [{'status': 'error', 'error': str(e)}] * len(texts)
+        except requests.exceptions.RequestException as e:
+            reason = str(e)
+        if attempt < BULK_MAX_ATTEMPTS:
+            time.sleep(0.5 * 2 ** (attempt - 1))
+    return [{'status': 'error', 'error': reason}] * len(texts)
+
+def read_reviews_file(uploaded_file):
+    """Reads an uploaded CSV or parquet file into a DataFrame."""
+    if uploaded_file.name.lower().endswith(".parquet"):
+        return pd.read_parquet(io.BytesIO(uploaded_file.getvalue()))
+    return pd.read_csv(uploaded_file)
+
+def score_dataframe(df, column, progress):
+    """
+    Scores df[column] in batches of BULK_BATCH_SIZE with BULK_MAX_WORKERS concurrent requests,
+    updating the progress bar as batches finish. Returns a copy of df with the sentiment columns added.
+    """
+    texts = ["" if pd.isna(text) else str(text).strip() for text in df[column]]
+    results = [{'status': 'error', 'error': 'Empty review.'} if not text else None for text in texts]
+    pending = [index for index, text in enumerate(texts) if text]
+    batches = [pending[i:i + BULK_BATCH_SIZE] for i in range(0, len(pending), BULK_BATCH_SIZE)]
+
+    done = 0
+    progress.progress(0.0, text=f"Scored 0 of {len(pending)} reviews")
+    with ThreadPoolExecutor(max_workers=BULK_MAX_WORKERS) as executor:
+        futures = {executor.submit(predict_texts, [texts[index] for index in batch]): batch for batch in batches}
+        # Streamlit calls stay on this thread; the workers only make the requests
+        for future in as_completed(futures):
+            batch = futures[future]
+            for index, result in zip(batch, future.result()):
+                results[index] = result
+            done += len(batch)
+            progress.progress(done / len(pending), text=f"Scored {done} of {len(pending)} reviews")
+
+    scored = df.copy()
+    scored['sentiment_label'] = [label_name(r['prediction']) if r['status'] == 'ok' else None for r in results]
+    scored['sentiment_score'] = [r['prediction']['score'] if r['status'] == 'ok' else None for r in results]
+    scored['sentiment_error'] = [r.get('error') for r in results]
+    return scored
+
 # --- STREAMLIT UI ---
 
 st.set_page_config(page_title="Sentiment Analyzer", layout="wide")
@@ -69,7 +183,7 @@ def draw_status_indicator():
             st.write("") # for vertical alignment
             if st.button("Refresh Status"):
                 with st.spinner("Checking status..."):
-                    st.session_state.model_status = get_model_status()
+                    st.session_state.model_status = get_model_status(refresh=True)
                     st.rerun()
 
 draw_status_indicator()
@@ -91,7 +205,7 @@ if st.session_state.model_status:
             with st.spinner("Analyzing..."):
                 prediction_result = get_prediction(user_input)
                 if prediction_result:
-                    label = "POSITIVE" if prediction_result[0]['label'] == 'LABEL_1' else "NEGATIVE"
+                    label = label_name(prediction_result[0])
                     score = prediction_result[0]['score']
 
                     if label == "POSITIVE":
@@ -100,7 +214,45 @@ if st.session_state.model_status:
                         st.error(f"Prediction: **{label}** (Confidence: {score:.2%})")
         else:
             st.warning("Please enter some text to analyze.")
-            
+
+    # --- BULK INTERFACE ---
+    st.header("Analyze a File of Reviews")
+    uploaded_file = st.file_uploader(f"Upload a CSV or parquet file of reviews (up to {BULK_MAX_ROWS:,} rows):", type=["csv", "parquet"])
+    if uploaded_file:
+        try:
+            reviews = read_reviews_file(uploaded_file)
+        except Exception as e:
+            st.error(f"Could not read {uploaded_file.name}: {e}")
+            reviews = None
+
+        if reviews is not None and reviews.empty:
+            st.warning("The file has no rows.")
+        elif reviews is not None:
+            columns = list(reviews.columns)
+            default = next((columns.index(c) for c in TEXT_COLUMNS if c in columns), 0)
+            column = st.selectbox("Review text column:", columns, index=default)
+            if len(reviews) > BULK_MAX_ROWS:
+                st.warning(f"Only the first {BULK_MAX_ROWS:,} of {len(reviews):,} rows will be scored.")
+                reviews = reviews.head(BULK_MAX_ROWS)
+
+            if st.button(f"Analyze {len(reviews):,} Reviews"):
+                started = time.time()
+                scored = score_dataframe(reviews, column, st.progress(0.0))
+                # Kept in the session so the results survive the rerun the download button triggers
+                st.session_state.bulk_results = (uploaded_file.name, scored, time.time() - started)
+
+    if st.session_state.get('bulk_results'):
+        file_name, scored, seconds = st.session_state.bulk_results
+        failed = int(scored['sentiment_error'].notna().sum())
+        positive = int((scored['sentiment_label'] == "POSITIVE").sum())
+        st.success(f"Scored {len(scored) - failed:,} of {len(scored):,} reviews from {file_name} in {seconds:.1f}s: "
+                   f"{positive:,} positive, {len(scored) - failed - positive:,} negative.")
+        if failed:
+            st.warning(f"{failed:,} reviews could not be scored; see the sentiment_error column.")
+        st.dataframe(scored.head(100))
+        st.download_button("Download Results (CSV)", scored.to_csv(index=False).encode("utf-8"),
+                           file_name=f"{os.path.splitext(file_name)[0]}-sentiment.csv", mime="text/csv")
+
 else:
     # --- START-UP INTERFACE (If model is stopped) ---
     st.header("Start the Sentiment Model")